@@ -0,0 +1,99 @@
+"""Outfit advisor latency (p50/p99) against the fake OpenRouter provider.
+
+Start the fake provider first (from the backend directory):
+
+    uvicorn bench.fake_openrouter:app --port 8765
+
+then run:
+
+    python bench/advisor_latency.py
+
+`analyze_outfit` is called directly: `--requests` sequential calls (p50,
+p99, mean) and then `--concurrent` calls at once (wall time).  The result
+cache is disabled and history records are dropped.  The hedge delay
+defaults to 0.4 s, matching the fake provider's 10x scaled-down timings.
+
+To compare with another revision of the router, pass its file:
+
+    git show <rev>:backend/routers/outfit_advisor.py > /tmp/outfit_advisor_old.py
+    python bench/advisor_latency.py --module /tmp/outfit_advisor_old.py
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def load_router(path):
+    spec = importlib.util.spec_from_file_location("bench_outfit_advisor", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    async def drop_record(*args, **kwargs):
+        return {"id": "bench"}
+
+    module.create_outfit_advice = drop_record
+    module._APPAREL_CSV_PATH = os.path.join(BACKEND, "utils", "apparel_only.csv")
+    return module
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8765")
+    parser.add_argument("--module", default=os.path.join(BACKEND, "routers", "outfit_advisor.py"))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrent", type=int, default=20)
+    parser.add_argument("--hedge-delay", default="0.4")
+    args = parser.parse_args()
+
+    for name, value in {
+        "MONGODB_URL": "mongodb://127.0.0.1:1",
+        "JWT_SECRET_KEY": "bench",
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_MODEL": "primary",
+        "OPENROUTER_FALLBACK_MODEL": "fallback",
+        "OUTFIT_ADVICE_CACHE_TTL_SECONDS": "0",
+    }.items():
+        os.environ.setdefault(name, value)
+    os.environ["OPENROUTER_BASE_URL"] = args.base_url
+    os.environ["OPENROUTER_HEDGE_DELAY_SECONDS"] = args.hedge_delay
+
+    from models.schemas import OutfitAdvisorRequest
+    router = load_router(args.module)
+
+    async def call(i):
+        started = time.perf_counter()
+        response = await router.analyze_outfit(OutfitAdvisorRequest(description=f"request-{i}"), email="bench@example.com")
+        assert b"suitability_score" in response.body, response.body
+        return time.perf_counter() - started
+
+    latencies = [await call(i) for i in range(args.requests)]
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(args.concurrent)))
+    wall = time.perf_counter() - started
+
+    print(args.module)
+    print(f"  {args.requests} sequential: p50 {percentile(latencies, 0.5):.0f} ms  "
+          f"p99 {percentile(latencies, 0.99):.0f} ms  mean {statistics.mean(latencies) * 1000:.0f} ms")
+    print(f"  {args.concurrent} concurrent: {wall * 1000:.0f} ms wall")
+    if hasattr(router, "get_provider_stats"):
+        stats = router.get_provider_stats()
+        print(f"  provider: {({k: v for k, v in stats.items() if k not in ('cache', 'batch')})}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""Cold-start time of `import main`.
+
+Imports the app in fresh interpreters (dummy credentials, no network or
+database needed) and reports the import time and the whole process run
+time.  `--importtime N` also lists the N slowest modules by cumulative
+import time (from `python -X importtime`).
+
+    python bench/cold_start.py --runs 5 --importtime 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMMY_ENV = {
+    "MONGODB_URL": "mongodb://127.0.0.1:1",
+    "JWT_SECRET_KEY": "bench",
+    "CLOUDINARY_CLOUD_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+    "ROBOFLOW_API_KEY": "bench",
+    "OPENROUTER_API_KEY": "bench",
+}
+IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def run(extra_args=()):
+    env = {**os.environ, **DUMMY_ENV}
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, *extra_args, "-c", IMPORT_MAIN], cwd=BACKEND, env=env,
+                          capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    import_seconds = float(proc.stdout.strip().splitlines()[-1])
+    return import_seconds, wall, proc.stderr
+
+
+def slowest_imports(stderr, count, max_depth=2):
+    """Modules with the largest cumulative import time, down to `max_depth` levels below main"""
+    rows = []
+    for line in stderr.splitlines():
+        fields = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # one space after the bar, then two more per nesting level
+        name = fields[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if 0 < depth <= max_depth:
+            rows.append((int(fields[1]), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N")
+    args = parser.parse_args()
+
+    imports, walls = [], []
+    for _ in range(args.runs):
+        import_seconds, wall, _ = run()
+        imports.append(import_seconds)
+        walls.append(wall)
+    print(f"import main: median {statistics.median(imports) * 1000:.0f} ms  "
+          f"min {min(imports) * 1000:.0f} ms  max {max(imports) * 1000:.0f} ms  ({args.runs} runs)")
+    print(f"process:     median {statistics.median(walls) * 1000:.0f} ms")
+
+    if args.importtime:
+        _, _, stderr = run(("-X", "importtime"))
+        print("slowest imports under main (cumulative):")
+        for cumulative_us, name in slowest_imports(stderr, args.importtime):
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
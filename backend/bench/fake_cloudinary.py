@@ -0,0 +1,167 @@
+"""Fake Cloudinary Upload and Admin API for offline benchmarks and checks.
+
+Speaks the parts of the API the backend uses, as sent by the Python SDK or
+by a client doing a signed direct upload:
+
+- `POST /v1_1/{cloud}/{resource_type}/upload`: single requests and chunked
+  `upload_large` parts (`Content-Range` plus `X-Unique-Upload-Id`).  Every
+  request must carry `FAKE_CLOUDINARY_API_KEY` and a valid signature of its
+  parameters (made with `FAKE_CLOUDINARY_API_SECRET`) and a timestamp under
+  an hour old.  Images whose format is not in a signed `allowed_formats` are
+  rejected.  The response carries the response signature checked by
+  /uploads/complete.
+- `GET /v1_1/{cloud}/resources/{resource_type}/upload/{public_id}` (Admin
+  API, basic auth): the stored asset, or 404.
+- `POST /v1_1/{cloud}/{resource_type}/destroy`
+
+Parts are appended to a file under `FAKE_CLOUDINARY_ROOT`.  `/stats` reports
+upload, part and byte counts and the largest request body seen, which shows
+whether the client chunked.
+
+    uvicorn bench.fake_cloudinary:app --port 8766
+
+Point the SDK (and the signed upload URL) at it with
+`CLOUDINARY_UPLOAD_PREFIX=http://127.0.0.1:8766`.
+"""
+import base64
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+from cloudinary.utils import api_sign_request
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+FAKE_CLOUDINARY_ROOT = os.getenv("FAKE_CLOUDINARY_ROOT") or tempfile.mkdtemp(prefix="fake_cloudinary_")
+FAKE_CLOUDINARY_API_KEY = os.getenv("FAKE_CLOUDINARY_API_KEY", "bench")
+FAKE_CLOUDINARY_API_SECRET = os.getenv("FAKE_CLOUDINARY_API_SECRET", "bench")
+SIGNATURE_MAX_AGE_SECONDS = 3600
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+# sent with a signed request but not covered by the signature
+_UNSIGNED_FIELDS = {"file", "api_key", "signature", "resource_type", "cloud_name"}
+
+app = FastAPI()
+# public id -> stored asset (the upload response without "existing")
+_assets = {}
+_counters = {"uploads": 0, "parts": 0, "bytes": 0, "max_part_bytes": 0, "rejected": 0}
+
+
+def _flag(value) -> bool:
+    return str(value or "").lower() in ("1", "true")
+
+
+def _error(message, status_code=400):
+    _counters["rejected"] += 1
+    return JSONResponse({"error": {"message": message}}, status_code=status_code)
+
+
+def _check_signature(form):
+    """Error message for a request the real API would refuse, else None"""
+    if form.get("api_key") != FAKE_CLOUDINARY_API_KEY:
+        return "Invalid api_key"
+    params = {k: v for k, v in form.multi_items() if k not in _UNSIGNED_FIELDS}
+    if form.get("signature") != api_sign_request(params, FAKE_CLOUDINARY_API_SECRET):
+        return "Invalid Signature"
+    if not str(params.get("timestamp", "")).isdigit() or time.time() - int(params["timestamp"]) > SIGNATURE_MAX_AGE_SECONDS:
+        return "Stale request"
+    return None
+
+
+def _image_info(path):
+    """(format, width, height) of a stored image; format None when it is not one"""
+    try:
+        with Image.open(path) as image:
+            fmt = {"jpeg": "jpg"}.get(image.format.lower(), image.format.lower())
+            return fmt, image.width, image.height
+    except Exception:
+        return None, None, None
+
+
+def _response_signature(public_id, version):
+    return api_sign_request({"public_id": public_id, "version": version}, FAKE_CLOUDINARY_API_SECRET)
+
+
+@app.get("/stats")
+async def stats():
+    return {**_counters, "assets": len(_assets)}
+
+
+@app.post("/v1_1/{cloud_name}/{resource_type}/upload")
+async def upload(cloud_name: str, resource_type: str, request: Request):
+    form = await request.form()
+    error = _check_signature(form)
+    if error:
+        return _error(error, 401)
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        return _error("Missing required parameter - file")
+    part = _CONTENT_RANGE.fullmatch(request.headers.get("content-range", ""))
+    upload_id = request.headers.get("x-unique-upload-id") or uuid.uuid4().hex
+    path = os.path.join(FAKE_CLOUDINARY_ROOT, f"{upload_id}.part")
+
+    offset = int(part.group(1)) if part else 0
+    with open(path, "ab" if offset else "wb") as out:
+        shutil.copyfileobj(upload.file, out)
+        size = out.tell()
+    _counters["parts"] += 1
+    _counters["bytes"] += size - offset
+    _counters["max_part_bytes"] = max(_counters["max_part_bytes"], size - offset)
+    if part and int(part.group(2)) + 1 < int(part.group(3)):
+        return {"done": False, "bytes": size}
+
+    fmt, width, height = _image_info(path) if resource_type == "image" else (None, None, None)
+    if resource_type == "image" and fmt is None:
+        os.remove(path)
+        return _error("Invalid image file")
+    allowed = [f for f in (form.get("allowed_formats") or "").split(",") if f]
+    if allowed and fmt not in allowed:
+        os.remove(path)
+        return _error(f"Image file format {fmt} not allowed")
+
+    name = form.get("public_id") or uuid.uuid4().hex[:20]
+    public_id = f"{form['folder']}/{name}" if form.get("folder") else name
+    if public_id in _assets and not _flag(form.get("overwrite")):
+        os.remove(path)
+        return {**_assets[public_id], "existing": True}
+    os.replace(path, os.path.join(FAKE_CLOUDINARY_ROOT, upload_id))
+    _counters["uploads"] += 1
+    version = int(time.time())
+    _assets[public_id] = {
+        "public_id": public_id,
+        "version": version,
+        "signature": _response_signature(public_id, version),
+        "resource_type": resource_type,
+        "type": "upload",
+        "format": fmt,
+        "width": width,
+        "height": height,
+        "bytes": size,
+        "secure_url": f"https://res.cloudinary.com/{cloud_name}/{resource_type}/upload/v{version}/{public_id}"
+                      + (f".{fmt}" if fmt else ""),
+    }
+    return _assets[public_id]
+
+
+@app.get("/v1_1/{cloud_name}/resources/{resource_type}/upload/{public_id:path}")
+async def resource(cloud_name: str, resource_type: str, public_id: str, request: Request):
+    expected = base64.b64encode(f"{FAKE_CLOUDINARY_API_KEY}:{FAKE_CLOUDINARY_API_SECRET}".encode()).decode()
+    if request.headers.get("authorization") != f"Basic {expected}":
+        return _error("Invalid credentials", 401)
+    asset = _assets.get(public_id)
+    if asset is None or asset["resource_type"] != resource_type:
+        return _error(f"Resource not found - {public_id}", 404)
+    return {k: v for k, v in asset.items() if k != "signature"}
+
+
+@app.post("/v1_1/{cloud_name}/{resource_type}/destroy")
+async def destroy(cloud_name: str, resource_type: str, request: Request):
+    form = await request.form()
+    error = _check_signature(form)
+    if error:
+        return _error(error, 401)
+    asset = _assets.pop(form.get("public_id"), None)
+    return {"result": "ok" if asset else "not found"}
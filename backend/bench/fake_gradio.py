@@ -0,0 +1,135 @@
+"""Fake Gradio try-on Space for offline load tests.
+
+Speaks the parts of the Gradio queue protocol (sse_v3) the backend uses:
+`/config`, `/info`, `/upload`, `/queue/join`, `/queue/data` and `/file=`.
+The `/tryon` endpoint takes `FAKE_GRADIO_DELAY` seconds per prediction
+(default 2) and runs at most `FAKE_GRADIO_CONCURRENCY` at once (default 2),
+like a Space with a fixed number of GPU workers; waiting jobs get queue
+estimation messages.  The result image is the uploaded person image.
+
+    uvicorn bench.fake_gradio:app --port 7861
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from typing import List
+
+FAKE_GRADIO_DELAY = float(os.getenv("FAKE_GRADIO_DELAY", "2"))
+FAKE_GRADIO_CONCURRENCY = int(os.getenv("FAKE_GRADIO_CONCURRENCY", "2"))
+HEARTBEAT_SECONDS = 15
+
+app = FastAPI()
+
+_slots = asyncio.Semaphore(FAKE_GRADIO_CONCURRENCY)
+# uploaded inputs and produced outputs, by path
+_files = {}
+# session hash -> queue of messages for its /queue/data stream
+_streams = {}
+_counters = {"joined": 0, "completed": 0, "waiting": 0, "running": 0, "max_running": 0}
+
+PARAMETERS = [
+    {"parameter_name": "person_img", "parameter_has_default": False},
+    {"parameter_name": "garment_img", "parameter_has_default": False},
+    {"parameter_name": "seed", "parameter_has_default": True, "parameter_default": 0},
+    {"parameter_name": "randomize_seed", "parameter_has_default": True, "parameter_default": True},
+]
+
+
+@app.get("/config")
+async def config():
+    return {
+        "protocol": "sse_v3",
+        "components": [{"id": 1, "type": "image"}, {"id": 2, "type": "image"},
+                       {"id": 3, "type": "number"}, {"id": 4, "type": "checkbox"}],
+        "dependencies": [{"id": 0, "api_name": "tryon", "inputs": [1, 2, 3, 4]}],
+    }
+
+
+@app.get("/info")
+async def info():
+    return {"named_endpoints": {"/tryon": {"parameters": PARAMETERS}}}
+
+
+@app.get("/stats")
+async def stats():
+    return _counters
+
+
+@app.post("/upload")
+async def upload(files: List[UploadFile] = File(...)):
+    paths = []
+    for file in files:
+        path = f"uploads/{uuid.uuid4().hex}/{file.filename}"
+        _files[path] = await file.read()
+        paths.append(path)
+    return paths
+
+
+@app.get("/file={path:path}")
+async def download(path: str):
+    data = _files.pop(path, None)
+    if data is None:
+        raise HTTPException(status_code=404)
+    return Response(data, media_type="image/jpeg")
+
+
+def _emit(session_hash, message):
+    _streams.setdefault(session_hash, asyncio.Queue()).put_nowait(message)
+
+
+async def _run(base_url, session_hash, event_id, data):
+    _counters["waiting"] += 1
+    _emit(session_hash, {"msg": "estimation", "event_id": event_id, "rank": _counters["waiting"] - 1,
+                         "queue_size": _counters["waiting"], "rank_eta": FAKE_GRADIO_DELAY})
+    async with _slots:
+        _counters["waiting"] -= 1
+        _counters["running"] += 1
+        _counters["max_running"] = max(_counters["max_running"], _counters["running"])
+        _emit(session_hash, {"msg": "process_starts", "event_id": event_id})
+        await asyncio.sleep(FAKE_GRADIO_DELAY)
+        _counters["running"] -= 1
+    person = data[0] or {}
+    output = f"outputs/{event_id}.jpg"
+    _files[output] = _files.pop(person.get("path"), b"")
+    _files.pop((data[1] or {}).get("path"), None)
+    _counters["completed"] += 1
+    _emit(session_hash, {"msg": "process_completed", "event_id": event_id, "success": True, "output": {"data": [
+        {"path": output, "url": f"{base_url}file={output}", "orig_name": "result.jpg",
+         "meta": {"_type": "gradio.FileData"}},
+        data[2],
+        "fake try-on",
+    ]}})
+    _emit(session_hash, {"msg": "close_stream"})
+
+
+@app.post("/queue/join")
+async def join(request: Request):
+    body = await request.json()
+    event_id = uuid.uuid4().hex
+    _counters["joined"] += 1
+    asyncio.create_task(_run(str(request.base_url), body["session_hash"], event_id, body["data"]))
+    return {"event_id": event_id}
+
+
+@app.get("/queue/data")
+async def queue_data(session_hash: str):
+    messages = _streams.setdefault(session_hash, asyncio.Queue())
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(messages.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    message = {"msg": "heartbeat"}
+                yield f"data: {json.dumps(message)}\n\n"
+                if message["msg"] == "close_stream":
+                    break
+        finally:
+            _streams.pop(session_hash, None)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
@@ -0,0 +1,78 @@
+"""Fake OpenRouter chat-completions provider for the outfit advisor benchmark.
+
+Answers `/chat/completions` with a fixed, valid advice JSON.  Latency is
+deterministic per request (from a hash of the description), with times
+scaled down 10x from what we see in production:
+
+- fallback model (`FAKE_FALLBACK_MODEL`, default "fallback"): 100 ms
+- primary model: 70% answer in 30-75 ms, 20% stall for 1.2 s and 10%
+  reject the request with HTTP 400
+
+Streaming requests (`"stream": true`) get the answer as SSE deltas.
+
+    uvicorn bench.fake_openrouter:app --port 8765
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_FALLBACK_MODEL = os.getenv("FAKE_FALLBACK_MODEL", "fallback")
+
+ANSWER = json.dumps({
+    "suitability_score": 80,
+    "recommendation": "recommended",
+    "explanation": "The colours work together and the cut suits the occasion.",
+    "improvement_suggestions": "Add a belt.",
+    "better_outfit_idea": "Dark jeans with a white shirt.",
+})
+
+app = FastAPI()
+_counters = {"requests": 0, "rejected": 0, "stalled": 0}
+
+
+@app.head("/")
+async def head():
+    return {}
+
+
+@app.get("/stats")
+async def stats():
+    return _counters
+
+
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _counters["requests"] += 1
+    text = body["messages"][0]["content"][0]["text"]
+    match = re.search(r"Description: (.*)", text)
+    request_id = match.group(1) if match else text
+    roll = int(hashlib.sha256(request_id.encode()).hexdigest(), 16) % 100
+    if body["model"] == FAKE_FALLBACK_MODEL:
+        await asyncio.sleep(0.1)
+    elif roll < 10:
+        _counters["rejected"] += 1
+        return JSONResponse({"error": {"message": "Developer instruction is not enabled"}}, status_code=400)
+    elif roll < 30:
+        _counters["stalled"] += 1
+        await asyncio.sleep(1.2)
+    else:
+        await asyncio.sleep(0.03 + (roll % 10) * 0.005)
+
+    if not body.get("stream"):
+        return {"model": body["model"], "choices": [{"message": {"content": ANSWER}}]}
+
+    async def stream():
+        yield ": OPENROUTER PROCESSING\n\n"
+        for i in range(0, len(ANSWER), 8):
+            await asyncio.sleep(0.005)
+            chunk = {"model": body["model"], "choices": [{"delta": {"content": ANSWER[i:i + 8]}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
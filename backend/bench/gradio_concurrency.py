@@ -0,0 +1,81 @@
+"""Concurrent in-flight predictions through one AsyncGradioClient.
+
+Start the fake Space with enough GPU slots that it is not the bottleneck:
+
+    FAKE_GRADIO_DELAY=1 FAKE_GRADIO_CONCURRENCY=64 uvicorn bench.fake_gradio:app --port 7861
+
+then run (from the backend directory):
+
+    python bench/gradio_concurrency.py --concurrency 1 8 32 64
+
+For each level, `n` predictions (each uploading two in-memory images) are
+started at once from a single event loop.  With predictions awaited on the
+loop instead of blocking a thread each, the wall time stays close to one
+prediction's delay and the thread count does not grow with `n`.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gradio_async import AsyncGradioClient, GradioFile  # noqa: E402
+
+
+async def run_level(client, concurrency, image):
+    peak_threads = threading.active_count()
+    done = asyncio.Event()
+
+    async def watch_threads():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    async def one(i):
+        started = time.perf_counter()
+        result = await client.predict(
+            person_img=GradioFile(image, f"person_{i}.jpg"),
+            garment_img=GradioFile(image, f"garment_{i}.jpg"),
+            seed=i, randomize_seed=False, api_name="/tryon",
+        )
+        assert result[0]["data"] == image
+        return time.perf_counter() - started
+
+    watcher = asyncio.create_task(watch_threads())
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+    wall = time.perf_counter() - started
+    done.set()
+    await watcher
+    return {
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "mean_latency_s": round(sum(latencies) / len(latencies), 2),
+        "predictions_per_s": round(concurrency / wall, 1),
+        "peak_threads": peak_threads,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:7861/")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--image-kb", type=int, default=200)
+    args = parser.parse_args()
+
+    image = os.urandom(args.image_kb * 1024)
+    client = AsyncGradioClient(args.url, max_connections=max(args.concurrency) * 2)
+    try:
+        await client.connect()
+        for level in args.concurrency:
+            print(await run_level(client, level, image))
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""End-to-end check of signed direct uploads against the fake Cloudinary.
+
+Start the fake first (from the backend directory):
+
+    uvicorn bench.fake_cloudinary:app --port 8766
+
+then run:
+
+    python bench/signed_upload.py
+
+The /uploads router runs in-process with its media-asset records in memory.
+Each case signs an upload, POSTs the file plus the signed fields to the
+returned `upload_url` like a browser would, and completes it.  Besides the
+happy path, the script checks that a changed public id, a format outside
+`allowed_formats`, a forged response signature and an oversized image are
+refused.
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+from datetime import datetime
+
+import httpx
+from PIL import Image
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+EMAIL = "bench@example.com"
+
+
+def image_bytes(fmt, side=64, noise=False):
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)) if noise \
+        else Image.new("RGB", (side, side), (200, 120, 80))
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    return buf.getvalue()
+
+
+class MemoryAssets:
+    """In-memory stand-in for the media_assets collection"""
+
+    def __init__(self):
+        self.records = {}
+
+    async def create_pending_upload(self, email, kind, public_id, expires_at):
+        self.records[(public_id, email)] = {
+            "id": public_id, "email": email, "kind": kind, "public_id": public_id,
+            "status": "pending", "expires_at": expires_at, "created_at": datetime.utcnow(),
+        }
+        return self.records[(public_id, email)]
+
+    async def get_media_asset(self, public_id, email):
+        return self.records.get((public_id, email))
+
+    async def complete_media_asset(self, public_id, email, asset_data):
+        record = self.records.get((public_id, email))
+        if not record or record["status"] != "pending":
+            return None
+        record.update(asset_data, status="ready")
+        return record
+
+
+async def direct_upload(http, uploads, filename, data, tamper=None):
+    """Sign, upload to the provider and complete; returns (step, status, detail)"""
+    from fastapi import HTTPException
+    from models.schemas import SignedUploadRequest, UploadCompleteRequest
+
+    signed = (await uploads.sign_upload(SignedUploadRequest(kind="outfit_advisor", filename=filename), EMAIL)).model_dump()
+    fields = {k: str(signed[k]) for k in ("api_key", "folder", "public_id", "timestamp", "allowed_formats", "signature")}
+    if tamper == "public_id":
+        fields["public_id"] += "_other"
+    resp = await http.post(signed["upload_url"], data=fields, files={"file": (filename, data)})
+    if resp.status_code != 200:
+        return "upload", resp.status_code, resp.json()["error"]["message"]
+    stored = resp.json()
+    if tamper == "response_signature":
+        stored["signature"] = "0" * 40
+    try:
+        asset = await uploads.complete_upload(UploadCompleteRequest(**stored), EMAIL)
+    except HTTPException as e:
+        return "complete", e.status_code, e.detail
+    return "complete", 200, asset.image_url
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--fake-cloudinary", default="http://127.0.0.1:8766")
+    args = parser.parse_args()
+
+    for name, value in {
+        "MONGODB_URL": "mongodb://127.0.0.1:1",
+        "JWT_SECRET_KEY": "bench",
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+        "SIGNED_UPLOAD_MAX_MB": "1",
+    }.items():
+        os.environ.setdefault(name, value)
+    # routes the SDK (Admin API calls) and the signed upload URL to the fake
+    os.environ["CLOUDINARY_UPLOAD_PREFIX"] = args.fake_cloudinary
+
+    from routers import uploads
+    store = MemoryAssets()
+    for helper in ("create_pending_upload", "get_media_asset", "complete_media_asset"):
+        setattr(uploads, helper, getattr(store, helper))
+
+    cases = [
+        ("signed upload", ("photo.jpg", image_bytes("JPEG")), None, ("complete", 200)),
+        ("changed public id", ("photo.jpg", image_bytes("JPEG")), "public_id", ("upload", 401)),
+        ("format not allowed", ("anim.gif", image_bytes("GIF")), None, ("upload", 400)),
+        ("forged response signature", ("photo.png", image_bytes("PNG")), "response_signature", ("complete", 400)),
+        ("over SIGNED_UPLOAD_MAX_MB", ("big.png", image_bytes("PNG", side=1024, noise=True)), None, ("complete", 413)),
+    ]
+    failed = 0
+    async with httpx.AsyncClient(timeout=30) as http:
+        for label, (filename, data), tamper, expected in cases:
+            step, status, detail = await direct_upload(http, uploads, filename, data, tamper)
+            ok = (step, status) == expected
+            failed += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label}: {step} -> {status} ({detail})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Peak memory of `upload_media_stream` per storage backend.
+
+Streams `--size-mb` of random bytes (in 64 KB chunks, like the avatar
+download) into storage and reports the peak Python heap growth measured
+with tracemalloc.  `cloudinary` goes to the fake Upload API, so start it
+first (from the backend directory):
+
+    uvicorn bench.fake_cloudinary:app --port 8766
+
+then run:
+
+    python bench/storage_memory.py --backends local cloudinary cloudinary-upload --size-mb 40
+
+`cloudinary-upload` hands the same spooled file to `cloudinary.uploader.upload`
+in one request, as `CloudinaryStorage.put` used to.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+CHUNK_BYTES = 64 * 1024
+
+
+async def random_chunks(size):
+    block = os.urandom(CHUNK_BYTES)
+    for _ in range(size // CHUNK_BYTES):
+        yield block
+        await asyncio.sleep(0)
+
+
+async def measure(name, size, storage):
+    import cloudinary.uploader
+
+    if name == "cloudinary-upload":
+        # the spool as upload_media_stream builds it, read whole by upload()
+        spool = tempfile.SpooledTemporaryFile(max_size=storage.UPLOAD_SPOOL_MAX_BYTES)
+        async for chunk in random_chunks(size):
+            spool.write(chunk)
+        spool.seek(0)
+        put = lambda: asyncio.to_thread(cloudinary.uploader.upload, spool, folder="bench", resource_type="raw")
+    else:
+        storage._storage = storage.LocalStorage(tempfile.mkdtemp(prefix="bench_media_")) if name == "local" \
+            else storage.CloudinaryStorage()
+        put = lambda: storage.upload_media_stream(random_chunks(size), folder="bench", resource_type="raw")
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    result = await put()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "backend": name,
+        "stored_bytes": result.get("bytes"),
+        "seconds": round(elapsed, 2),
+        "peak_heap_mb": round((peak - baseline) / (1024 * 1024), 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--backends", nargs="+", default=["local", "cloudinary"],
+                        choices=["local", "cloudinary", "cloudinary-upload"])
+    parser.add_argument("--size-mb", type=int, default=40)
+    parser.add_argument("--fake-cloudinary", default="http://127.0.0.1:8766")
+    args = parser.parse_args()
+
+    for name, value in {
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+    }.items():
+        os.environ.setdefault(name, value)
+    import cloudinary
+    import storage
+    cloudinary.config(upload_prefix=args.fake_cloudinary)
+
+    size = args.size_mb * 1024 * 1024
+    for name in args.backends:
+        print(await measure(name, size, storage))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""Try-on API for the offline benchmarks.
+
+Serves `main.app` without MongoDB or Cloudinary: the try-on router's
+session/cache helpers are replaced by an in-memory store, media goes to a
+temporary local directory and authentication is bypassed.  Run it from the
+backend directory:
+
+    uvicorn bench.tryon_app:app --port 8100
+
+Generation goes to GRADIO_TRYON_URLS (default: `bench/fake_gradio.py` on
+port 7861).  GET /bench/memory reports the process' current and peak RSS;
+POST /bench/memory/reset restarts the peak.
+"""
+import os
+import sys
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+BENCH_EMAIL = "bench@example.com"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name, value in {
+    "MONGODB_URL": "mongodb://127.0.0.1:1",
+    "JWT_SECRET_KEY": "bench",
+    "CLOUDINARY_CLOUD_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+    "ROBOFLOW_API_KEY": "bench",
+    "OPENROUTER_API_KEY": "bench",
+    "STORAGE_BACKEND": "local",
+    "MEDIA_ROOT": tempfile.mkdtemp(prefix="bench-media-"),
+    "STORAGE_CACHE_MAX_MB": "0",
+    "GRADIO_TRYON_URLS": "http://127.0.0.1:7861/",
+    "TRYON_PREGENERATE_ENABLED": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+from main import app  # noqa: E402
+from models.schemas import TryOnSessionInDB  # noqa: E402
+from routers import tryon  # noqa: E402
+from routers.auth import verify_token  # noqa: E402
+from utils.image_pipeline import shutdown_image_pipeline  # noqa: E402
+
+
+class MemorySessions:
+    """In-memory stand-in for the try-on session and result-cache collections"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.cache = {}
+
+    async def create_tryon_session(self, email, session, status=None):
+        record = TryOnSessionInDB(email=email, status=status, **session.dict())
+        record.id = uuid.uuid4().hex
+        self.sessions[record.id] = record
+        return record
+
+    async def get_tryon_session_by_id(self, session_id, email):
+        record = self.sessions.get(session_id)
+        return record if record and record.email == email else None
+
+    async def update_tryon_session_result(self, session_id, email, result_image_url):
+        record = await self.get_tryon_session_by_id(session_id, email)
+        if record:
+            record.result_image_url = result_image_url
+            record.completed_at = datetime.utcnow()
+        return record
+
+    async def update_tryon_session_status(self, session_id, email, status, **fields):
+        record = await self.get_tryon_session_by_id(session_id, email)
+        if not record:
+            return False
+        record.status = status
+        for key, value in fields.items():
+            if hasattr(record, key):
+                setattr(record, key, value)
+        if status == "running":
+            record.started_at = datetime.utcnow()
+        elif status in ("done", "failed"):
+            record.completed_at = datetime.utcnow()
+        return True
+
+    async def get_tryon_cache_entry(self, cache_key):
+        return self.cache.get(cache_key)
+
+    async def put_tryon_cache_entry(self, cache_key, entry):
+        self.cache[cache_key] = entry
+
+
+store = MemorySessions()
+for helper in ("create_tryon_session", "get_tryon_session_by_id", "update_tryon_session_result",
+               "update_tryon_session_status", "get_tryon_cache_entry", "put_tryon_cache_entry"):
+    setattr(tryon, helper, getattr(store, helper))
+
+app.dependency_overrides[verify_token] = lambda: BENCH_EMAIL
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # only what the try-on path needs (no MongoDB, no upstream warm-up)
+    await tryon.tryon_queue.start()
+    yield
+    await tryon.tryon_queue.stop()
+    await tryon.tryon_backends.stop()
+    shutdown_image_pipeline()
+
+app.router.lifespan_context = lifespan
+
+
+def _proc_status_kb(field):
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+
+@app.get("/bench/memory")
+async def bench_memory():
+    return {"rss_kb": _proc_status_kb("VmRSS"), "peak_rss_kb": _proc_status_kb("VmHWM")}
+
+
+@app.post("/bench/memory/reset")
+async def bench_memory_reset():
+    # Linux: writing 5 to clear_refs resets the peak RSS (VmHWM) to the current RSS
+    with open("/proc/self/clear_refs", "w") as fh:
+        fh.write("5")
+    return await bench_memory()
@@ -0,0 +1,97 @@
+"""Load test for the queued try-on path against a fake Gradio Space.
+
+Start both servers first (from the backend directory):
+
+    FAKE_GRADIO_DELAY=2 uvicorn bench.fake_gradio:app --port 7861
+    uvicorn bench.tryon_app:app --port 8100
+
+then run, e.g.:
+
+    python bench/tryon_load.py --jobs 20
+
+All jobs are posted at once.  The script reports how long POST /api/try-on
+takes to answer (it only enqueues), /health latency while the jobs run
+(the event loop must stay responsive), session status counts and the time
+until every session is done or failed.
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import httpx
+from PIL import Image
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+
+def small_jpeg(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (384, 512), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+async def probe_health(client, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8100")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    person = small_jpeg((180, 140, 120))
+    limits = httpx.Limits(max_connections=args.jobs + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300, limits=limits) as client:
+        stop = asyncio.Event()
+        health = []
+        prober = asyncio.create_task(probe_health(client, stop, health))
+        post_latency = []
+
+        async def run_job(i):
+            files = {
+                "person_image": ("person.jpg", person, "image/jpeg"),
+                # distinct garments so no job is answered from the result cache
+                "cloth_image": (f"cloth_{i}.jpg", small_jpeg((i % 256, 60, 200)), "image/jpeg"),
+            }
+            started = time.perf_counter()
+            resp = await client.post("/api/try-on", files=files)
+            post_latency.append(time.perf_counter() - started)
+            resp.raise_for_status()
+            session_id = resp.json()["session_id"]
+            while True:
+                session = (await client.get(f"/api/try-on/sessions/{session_id}")).json()
+                if session.get("status") in ("done", "failed"):
+                    return session["status"], time.perf_counter() - started
+                await asyncio.sleep(args.poll_interval)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_job(i) for i in range(args.jobs)))
+        total = time.perf_counter() - started
+        stop.set()
+        await prober
+        metrics = (await client.get("/metrics")).json()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"jobs: {args.jobs}  statuses: {statuses}  all finished in {total:.1f} s")
+    print(f"POST /api/try-on   p50 {percentile(post_latency, 0.5)} ms  p99 {percentile(post_latency, 0.99)} ms")
+    print(f"job end-to-end     p50 {percentile([t for _, t in results], 0.5)} ms  "
+          f"p99 {percentile([t for _, t in results], 0.99)} ms")
+    print(f"GET /health (load) p50 {percentile(health, 0.5)} ms  p99 {percentile(health, 0.99)} ms  "
+          f"max {percentile(health, 1.0)} ms")
+    print(f"tryon_queue: {metrics['tryon_queue']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Peak memory of the API process under concurrent try-on uploads.
+
+Start the bench app first (from the backend directory):
+
+    uvicorn bench.tryon_app:app --port 8100
+
+then run, e.g.:
+
+    python bench/tryon_memory.py --concurrency 1 4 16 --image-mb 8
+
+For each concurrency level the script resets the server's peak RSS, posts
+that many /api/try-on requests at once (person + garment image of about
+`--image-mb` each, random noise so they do not compress) and reports the
+peak RSS increase, per request and relative to the bytes uploaded.
+Generation is not needed for this measurement; without a fake Gradio
+server the queued jobs simply fail.
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+
+import httpx
+from PIL import Image
+
+
+def noise_jpeg(target_mb: float) -> bytes:
+    """A JPEG of roughly `target_mb` (noise defeats compression)"""
+    side = 512
+    while True:
+        image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+        buf = io.BytesIO()
+        image.save(buf, "JPEG", quality=95)
+        if buf.tell() >= target_mb * 1024 * 1024 or side >= 8192:
+            return buf.getvalue()
+        side = int(side * 1.4)
+
+
+async def run_level(client, concurrency, person, cloth):
+    await client.post("/bench/memory/reset")
+    before = (await client.get("/bench/memory")).json()
+
+    async def one(i):
+        files = {
+            "person_image": (f"person_{i}.jpg", person, "image/jpeg"),
+            "cloth_image": (f"cloth_{i}.jpg", cloth, "image/jpeg"),
+        }
+        # randomize_seed avoids the result cache; every request does the full ingest
+        resp = await client.post("/api/try-on", files=files, data={"randomize_seed": "true"})
+        return resp.status_code
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(one(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = (await client.get("/bench/memory")).json()
+    growth_mb = (after["peak_rss_kb"] - before["rss_kb"]) / 1024
+    uploaded_mb = concurrency * (len(person) + len(cloth)) / (1024 * 1024)
+    return {
+        "concurrency": concurrency,
+        "statuses": sorted(set(statuses)),
+        "seconds": round(elapsed, 2),
+        "peak_growth_mb": round(growth_mb, 1),
+        "per_request_mb": round(growth_mb / concurrency, 1),
+        "growth_per_uploaded_mb": round(growth_mb / uploaded_mb, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8100")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--image-mb", type=float, default=8)
+    args = parser.parse_args()
+
+    person = noise_jpeg(args.image_mb)
+    cloth = noise_jpeg(args.image_mb)
+    print(f"images: {len(person) / 1e6:.1f} MB + {len(cloth) / 1e6:.1f} MB per request")
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300) as client:
+        for level in args.concurrency:
+            print(await run_level(client, level, person, cloth))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
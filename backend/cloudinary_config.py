@@ -1,5 +1,9 @@
 import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+import cloudinary.utils
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +21,25 @@ CLOUDINARY_BASE_FOLDER = "virtual_wardrobe"
 WARDROBE_ITEM_FOLDER = f"{CLOUDINARY_BASE_FOLDER}/wardrobe_item_images"
 OUTFIT_ADVISOR_FOLDER = f"{CLOUDINARY_BASE_FOLDER}/outfit_advisor_images"
 TRYON_IMAGE_FOLDER = f"{CLOUDINARY_BASE_FOLDER}/tryon_images"
+PROFILE_PHOTO_FOLDER = f"{CLOUDINARY_BASE_FOLDER}/profile_photos"
+AVATAR_IMAGE_FOLDER = f"{CLOUDINARY_BASE_FOLDER}/avatar_images"
+
+# Folders that clients may upload into directly with a signed request (only
+# kinds whose completed asset the API actually consumes)
+UPLOAD_FOLDERS = {
+    "outfit_advisor": OUTFIT_ADVISOR_FOLDER,
+    "profile": PROFILE_PHOTO_FOLDER,
+}
+# Formats accepted for direct uploads (bound into the signature) and the size
+# cap checked against the provider's record of the asset on completion
+SIGNED_UPLOAD_ALLOWED_FORMATS = os.getenv("SIGNED_UPLOAD_ALLOWED_FORMATS", "jpg,png,webp,heic")
+SIGNED_UPLOAD_MAX_MB = int(os.getenv("SIGNED_UPLOAD_MAX_MB", "10"))
+SIGNED_UPLOAD_MAX_BYTES = SIGNED_UPLOAD_MAX_MB * 1024 * 1024
+# Signed upload parameters are only honoured for this long (Cloudinary itself
+# rejects signatures older than one hour)
+SIGNED_UPLOAD_TTL_SECONDS = int(os.getenv("SIGNED_UPLOAD_TTL_SECONDS", "600"))
+# Overridable so a local fake storage server can stand in for Cloudinary
+CLOUDINARY_UPLOAD_URL = os.getenv("CLOUDINARY_UPLOAD_URL")
 
 def get_wardrobe_item_folder():
     """Get the folder path for wardrobe item images"""
@@ -29,3 +52,166 @@ def get_outfit_advisor_folder():
 def get_tryon_image_folder():
     """Get the folder path for try-on images"""
     return TRYON_IMAGE_FOLDER
+
+def get_profile_photo_folder():
+    """Get the folder path for profile photos"""
+    return PROFILE_PHOTO_FOLDER
+
+def get_avatar_image_folder():
+    """Get the folder path for avatar images"""
+    return AVATAR_IMAGE_FOLDER
+
+def sign_upload_params(folder, public_id, timestamp):
+    """Build the parameter set a client needs for a signed direct upload.
+
+    The signature binds `folder`, `public_id`, `timestamp` and
+    `allowed_formats`, so the client cannot write outside the folder/name the
+    API chose for it or upload a file type it does not accept.
+    """
+    config = cloudinary.config()
+    params = {
+        "folder": folder,
+        "public_id": public_id,
+        "timestamp": timestamp,
+        "allowed_formats": SIGNED_UPLOAD_ALLOWED_FORMATS,
+    }
+    signature = cloudinary.utils.api_sign_request(params, config.api_secret)
+    return {
+        **params,
+        "signature": signature,
+        "api_key": config.api_key,
+        "cloud_name": config.cloud_name,
+        "upload_url": CLOUDINARY_UPLOAD_URL or cloudinary.utils.cloudinary_api_url("upload", resource_type="image"),
+    }
+
+def verify_upload_signature(public_id, version, signature):
+    """Check the signature Cloudinary returned for a finished upload"""
+    return cloudinary.utils.verify_api_response_signature(public_id, version, signature)
+
+def fetch_uploaded_asset(public_id):
+    """Provider-side metadata (bytes, format, size) of an uploaded image.
+
+    The sizes a client echoes to /uploads/complete are not covered by the
+    response signature, so limits are checked against this record instead.
+    """
+    return cloudinary.api.resource(public_id, resource_type="image")
+
+def delete_uploaded_asset(public_id):
+    """Remove a direct upload that was rejected on completion"""
+    return cloudinary.uploader.destroy(public_id, resource_type="image")
+
+def build_delivery_url(public_id, version, fmt):
+    """Secure delivery URL for an uploaded image"""
+    url, _ = cloudinary.utils.cloudinary_url(public_id, version=version, format=fmt, secure=True, resource_type="image")
+    return url
+
+
+# Responsive delivery variants.  Every variant is requested with automatic
+# format (WebP/AVIF where the browser supports it) and automatic quality, so
+# list views never download the full-resolution original.
+IMAGE_VARIANTS = {
+    "thumb": "c_fill,g_auto,w_160,h_160",
+    "small": "c_limit,w_320",
+    "medium": "c_limit,w_640",
+    "large": "c_limit,w_1280",
+}
+DEFAULT_LIST_VARIANT = "small"
+# Query-parameter pattern accepted by list endpoints (`?variant=`)
+IMAGE_VARIANT_PATTERN = f"^(original|{'|'.join(IMAGE_VARIANTS)})$"
+_UPLOAD_MARKER = "/image/upload/"
+# one transformation segment, e.g. "f_auto,q_auto,c_limit,w_320"
+_TRANSFORMATION_KEYS = (
+    "a|ac|af|ar|b|bo|br|c|co|cs|d|dl|dn|dpr|du|e|eo|f|fl|fn|fps|g|h|if|ki|l|o|p|pg|q|r|so|sp|t|u|vc|vs|w|x|y|z"
+)
+_TRANSFORMATION_SEGMENT = re.compile(rf"^(?:{_TRANSFORMATION_KEYS})_[^,/]+(?:,(?:{_TRANSFORMATION_KEYS})_[^,/]+)*$")
+# image fields of favorite/style-feed cards
+CARD_IMAGE_FIELDS = ("image_url", "image", "result_image_url")
+
+def original_image_url(url):
+    """Strip any transformation segments from a Cloudinary image URL.
+
+    URLs already pointing at a variant (e.g. a list view's small rendition
+    saved back by a client) map to the stored original; other URLs are
+    returned unchanged.
+    """
+    if not url or "res.cloudinary.com" not in url or _UPLOAD_MARKER not in url:
+        return url
+    head, tail = url.split(_UPLOAD_MARKER, 1)
+    segments = tail.split("/")
+    while len(segments) > 1 and _TRANSFORMATION_SEGMENT.match(segments[0]):
+        segments.pop(0)
+    return f"{head}{_UPLOAD_MARKER}{'/'.join(segments)}"
+
+# public id and version of an asset in an original (untransformed) delivery URL
+_VERSIONED_ASSET = re.compile(r"^v(\d+)/(.+?)(?:\.[A-Za-z0-9]+)?$")
+
+def image_asset_identity(url):
+    """Identify the stored image behind a delivery URL without fetching it.
+
+    Versioned URLs for this Cloudinary account name an immutable asset
+    (re-uploading gives a new version), so `asset:<public_id>:<version>`
+    identifies the content under any transformation or format.  Returns
+    None for other URLs.
+    """
+    original = original_image_url(url)
+    if not original or _UPLOAD_MARKER not in original:
+        return None
+    head, tail = original.split(_UPLOAD_MARKER, 1)
+    if head.rstrip("/").rsplit("/", 1)[-1] != cloudinary.config().cloud_name:
+        return None
+    match = _VERSIONED_ASSET.match(tail.split("?", 1)[0])
+    if not match:
+        return None
+    return f"asset:{match.group(2)}:{match.group(1)}"
+
+def build_image_url(url, variant="original"):
+    """Return the delivery URL of `url` for the given variant.
+
+    Only Cloudinary image URLs can be transformed; anything else (e.g.
+    Pollinations URLs) is returned unchanged.  Variants are always built
+    from the original, never on top of another transformation.
+    """
+    if not url or variant not in IMAGE_VARIANTS and variant != "original":
+        return url
+    if "res.cloudinary.com" not in url or _UPLOAD_MARKER not in url:
+        return url
+    url = original_image_url(url)
+    if variant == "original":
+        return url
+    head, tail = url.split(_UPLOAD_MARKER, 1)
+    return f"{head}{_UPLOAD_MARKER}f_auto,q_auto,{IMAGE_VARIANTS[variant]}/{tail}"
+
+def build_image_variants(url):
+    """Build every variant URL for `url`; returns None for non-Cloudinary URLs"""
+    if not url or "res.cloudinary.com" not in url or _UPLOAD_MARKER not in url:
+        return None
+    variants = {name: build_image_url(url, name) for name in IMAGE_VARIANTS}
+    variants["original"] = original_image_url(url)
+    return variants
+
+def pick_image_variant(url, variant=DEFAULT_LIST_VARIANT):
+    """Delivery URL of `variant` for `url`, built from the original.
+
+    Built on the fly rather than read from stored variants: records written
+    before variants were anchored to the original may hold stacked ones.
+    """
+    return build_image_url(url, variant)
+
+def apply_card_variant(card, variant=DEFAULT_LIST_VARIANT):
+    """Set `display_url` of a favorite/style-feed card to the requested variant of its image.
+
+    The card's own image fields keep the original URL, so a card saved back
+    by a client never stores a resized rendition.
+    """
+    if not isinstance(card, dict):
+        return card
+    display_field = None
+    for field in CARD_IMAGE_FIELDS:
+        if isinstance(card.get(field), str):
+            card[field] = original_image_url(card[field])
+            display_field = display_field or field
+    if display_field:
+        card["display_url"] = pick_image_variant(card[display_field], variant)
+        if card.get("image_variants"):
+            card["image_variants"] = build_image_variants(card[display_field])
+    return card
@@ -1,17 +1,49 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from routers import tryon, wardrobe, auth, apparel, favorites, style_feed, avatar, model3d
+from routers import tryon, wardrobe, auth, apparel, favorites, style_feed, avatar, model3d, uploads, media
 from database import connect_to_mongo, close_mongo_connection
+from models.database_ops import create_indexes, fail_interrupted_tryon_sessions, fail_interrupted_model3d_jobs
+from utils.image_pipeline import get_pipeline_stats, shutdown_image_pipeline
 import cloudinary_config
+from utils.upstreams import upstreams
+from utils.asset_store import asset_store
+from utils.upload_ingest import UploadLimitMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    startup_started = time.perf_counter()
     await connect_to_mongo()
+    await create_indexes()
+    interrupted = await fail_interrupted_tryon_sessions()
+    if interrupted:
+        print(f"⚠️ Marked {interrupted} interrupted try-on jobs as failed")
+    interrupted = await fail_interrupted_model3d_jobs()
+    if interrupted:
+        print(f"⚠️ Marked {interrupted} interrupted 3D jobs as failed")
+    await tryon.tryon_queue.start()
+    await model3d.model3d_queue.start()
+    await outfit_advisor.advice_batch_queue.start()
+    # upstream clients are created and connected in the background so the
+    # app serves /health right away, even when a Space is slow to answer
+    warm_task = asyncio.create_task(upstreams.warm_all())
+    upstreams.boot["startup_ms"] = round((time.perf_counter() - startup_started) * 1000, 1)
     yield
     # Shutdown
+    warm_task.cancel()
+    await tryon.tryon_pregenerator.stop()
+    await tryon.tryon_queue.stop()
+    await tryon.tryon_backends.stop()
+    await model3d.model3d_queue.stop()
+    await outfit_advisor.advice_batch_queue.stop()
+    await model3d.client.aclose()
+    await upstreams.close_all()
+    shutdown_image_pipeline()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -21,6 +53,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# oversize multipart uploads are refused before the body is parsed (inside CORS,
+# so the 413 still carries CORS headers)
+app.add_middleware(UploadLimitMiddleware)
+
 # Allow frontend to connect (development only - open to any origin)
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +73,8 @@ app.include_router(favorites.router, prefix="/api")
 app.include_router(style_feed.router, prefix="/api")
 app.include_router(auth.router)
 app.include_router(apparel.router, prefix="/api")
+# Signed direct-to-storage uploads
+app.include_router(uploads.router, prefix="/api")
 # Outfit advisor (LLM-backed)
 from routers import outfit_advisor
 app.include_router(outfit_advisor.router, prefix="/api")
@@ -44,8 +82,9 @@ app.include_router(outfit_advisor.router, prefix="/api")
 # 3D/video model generation endpoints (non-/api prefix)
 app.include_router(model3d.router)
 
-# serve generated 3D assets (mp4 + glb) under /avatars_3D
-app.mount("/avatars_3D", StaticFiles(directory="avatars_3D"), name="avatars_3D")
+# stored media (local storage backend / local disk cache) and generated 3D
+# assets (mp4 + glb) under /avatars_3D
+app.include_router(media.router)
 
 # Avatar and related routers (image generation moved into style_feed router)
 app.include_router(avatar.router, prefix="/api")
@@ -61,3 +100,23 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "database": "connected"}
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for the image pipeline, job queues and caches"""
+    return {
+        "image_pipeline": get_pipeline_stats(),
+        "tryon_queue": tryon.tryon_queue.stats(),
+        "tryon_cache": tryon.get_tryon_cache_stats(),
+        "tryon_pregeneration": tryon.tryon_pregenerator.stats(),
+        "tryon_backends": tryon.tryon_backends.stats(),
+        "style_image_cache": style_feed.get_image_cache_stats(),
+        "outfit_advisor": outfit_advisor.get_provider_stats(),
+        "outfit_advisor_batch_queue": outfit_advisor.advice_batch_queue.stats(),
+        "model3d_queue": model3d.model3d_queue.stats(),
+        "trellis_sessions": model3d.trellis_sessions.stats(),
+        "model3d_assets": asset_store.stats(),
+        "upstreams": upstreams.stats(),
+    }
+
+upstreams.boot["import_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
@@ -8,6 +8,7 @@ from models.schemas import (
     ProfileUpdate, WardrobeItemUpdate
 )
 from passlib.context import CryptContext
+from cloudinary_config import build_image_variants, original_image_url, CARD_IMAGE_FIELDS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -43,6 +44,17 @@ def convert_mongo_document(doc: Dict[str, Any], for_response: bool = False) -> D
 
     return doc
 
+async def create_indexes():
+    """Create the indexes used by cache/lookup collections (idempotent)"""
+    db = get_database()
+    await db.tryon_cache.create_index("key", unique=True)
+    await db.avatar_cache.create_index("key", unique=True)
+    await db.outfit_advisors.create_index([("cache_key", 1), ("created_at", -1)])
+    await db.media_assets.create_index([("public_id", 1), ("email", 1)])
+    await db.model3d_stage_cache.create_index("key", unique=True)
+    await db.model3d_assets.create_index("key", unique=True)
+    await db.model3d_assets.create_index("last_accessed_at")
+
 # User Operations
 async def create_user(user: UserCreate) -> UserInDB:
     """Create a new user in the database"""
@@ -128,9 +140,12 @@ async def create_wardrobe_item(email: str, item: WardrobeItemCreate) -> Wardrobe
     """Create a new wardrobe item"""
     db = get_database()
     
+    # a client may send back a resized rendition; always store the original
+    item_fields = {**item.dict(), "image_url": original_image_url(item.image_url)}
     item_data = WardrobeItemInDB(
         email=email,
-        **item.dict()
+        image_variants=build_image_variants(item_fields["image_url"]),
+        **item_fields
     )
     
     result = await db.wardrobe_items.insert_one(item_data.dict())
@@ -164,11 +179,27 @@ async def get_user_wardrobe_items(email: str, skip: int = 0, limit: int = 100) -
     
     return items
 
+async def get_wardrobe_items_by_ids(email: str, item_ids: List[str]) -> List[WardrobeItemInDB]:
+    """Get several of a user's wardrobe items in one query (unknown or malformed ids are skipped)"""
+    db = get_database()
+    object_ids = [ObjectId(item_id) for item_id in item_ids if ObjectId.is_valid(item_id)]
+    if not object_ids:
+        return []
+    items = []
+    cursor = db.wardrobe_items.find({"_id": {"$in": object_ids}, "email": email})
+    async for item_data in cursor:
+        item_data = convert_mongo_document(item_data)
+        items.append(WardrobeItemInDB(**item_data))
+    return items
+
 async def update_wardrobe_item(item_id: str, email: str, item_update: WardrobeItemUpdate) -> Optional[WardrobeItemInDB]:
     """Update wardrobe item"""
     db = get_database()
     
     update_data = {k: v for k, v in item_update.dict().items() if v is not None}
+    if "image_url" in update_data:
+        update_data["image_url"] = original_image_url(update_data["image_url"])
+        update_data["image_variants"] = build_image_variants(update_data["image_url"])
     update_data["updated_at"] = datetime.utcnow()
     
     result = await db.wardrobe_items.update_one(
@@ -219,12 +250,17 @@ async def search_wardrobe_items(
     return items
 
 # Try-On Session Operations
-async def create_tryon_session(email: str, session: TryOnSessionCreate) -> TryOnSessionInDB:
-    """Create a new try-on session"""
+async def create_tryon_session(email: str, session: TryOnSessionCreate, status: Optional[str] = None) -> TryOnSessionInDB:
+    """Create a new try-on session (`status` is set for queued try-on jobs)"""
     db = get_database()
     
     session_data = TryOnSessionInDB(
         email=email,
+        status=status,
+        image_variants={
+            "person": build_image_variants(session.person_image_url),
+            "cloth": build_image_variants(session.cloth_image_url),
+        },
         **session.dict()
     )
     
@@ -265,6 +301,7 @@ async def update_tryon_session_result(session_id: str, email: str, result_image_
     
     update_data = {
         "result_image_url": result_image_url,
+        "image_variants.result": build_image_variants(result_image_url),
         "completed_at": datetime.utcnow()
     }
     
@@ -277,6 +314,29 @@ async def update_tryon_session_result(session_id: str, email: str, result_image_
         return await get_tryon_session_by_id(session_id, email)
     return None
 
+async def update_tryon_session_status(session_id: str, email: str, status: str, **fields) -> bool:
+    """Record a try-on job state transition (plus any extra fields such as `error`)"""
+    db = get_database()
+    update_data = {"status": status, **fields}
+    if status == "running":
+        update_data["started_at"] = datetime.utcnow()
+    elif status in ("done", "failed"):
+        update_data["completed_at"] = datetime.utcnow()
+    result = await db.tryon_sessions.update_one(
+        {"_id": ObjectId(session_id), "email": email},
+        {"$set": update_data}
+    )
+    return result.modified_count > 0
+
+async def fail_interrupted_tryon_sessions() -> int:
+    """Mark jobs left queued/running by a previous process as failed"""
+    db = get_database()
+    result = await db.tryon_sessions.update_many(
+        {"status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "failed", "error": "interrupted by server restart", "completed_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
 async def delete_tryon_session(session_id: str, email: str) -> bool:
     """Delete try-on session"""
     db = get_database()
@@ -286,11 +346,156 @@ async def delete_tryon_session(session_id: str, email: str) -> bool:
     })
     return result.deleted_count > 0
 
-# Outfit Advisor operations
-async def create_outfit_advice(email: str, request_data: dict, result_data: dict) -> Optional[Dict[str, Any]]:
-    """Store an outfit advisor request + result for a user"""
+# Try-on result cache (deterministic runs keyed by image hashes + seed)
+async def get_tryon_cache_entry(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached try-on result for `cache_key`, counting the hit"""
     db = get_database()
-    record = {
+    doc = await db.tryon_cache.find_one_and_update(
+        {"key": cache_key},
+        {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}}
+    )
+    return convert_mongo_document(doc) if doc else None
+
+async def put_tryon_cache_entry(cache_key: str, entry: Dict[str, Any]) -> None:
+    """Store (or refresh) a try-on result in the cache collection"""
+    db = get_database()
+    await db.tryon_cache.update_one(
+        {"key": cache_key},
+        {"$set": {**entry, "key": cache_key, "updated_at": datetime.utcnow()},
+         "$setOnInsert": {"created_at": datetime.utcnow(), "hits": 0}},
+        upsert=True
+    )
+
+# Avatar generations keyed by prompt, reference image and seed
+async def get_avatar_cache_entry(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return the stored avatar for `cache_key`, counting the hit"""
+    db = get_database()
+    doc = await db.avatar_cache.find_one_and_update(
+        {"key": cache_key},
+        {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}}
+    )
+    return convert_mongo_document(doc) if doc else None
+
+async def put_avatar_cache_entry(cache_key: str, entry: Dict[str, Any]) -> None:
+    """Record a generated avatar (with its seed) so it can be served again"""
+    db = get_database()
+    await db.avatar_cache.update_one(
+        {"key": cache_key},
+        {"$set": {**entry, "key": cache_key, "updated_at": datetime.utcnow()},
+         "$setOnInsert": {"created_at": datetime.utcnow(), "hits": 0}},
+        upsert=True
+    )
+
+# 3D generation jobs (TRELLIS pipeline) and their per-stage result cache
+async def create_model3d_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert a 3D generation job record; returns it with its `id`"""
+    db = get_database()
+    doc = {**job, "created_at": datetime.utcnow()}
+    # insert_one adds the generated `_id` to `doc`
+    await db.model3d_jobs.insert_one(doc)
+    return convert_mongo_document(doc, for_response=True)
+
+async def get_model3d_job(job_id: str, email: str) -> Optional[Dict[str, Any]]:
+    """Return a user's 3D generation job by id"""
+    db = get_database()
+    try:
+        doc = await db.model3d_jobs.find_one({"_id": ObjectId(job_id), "email": email})
+    except Exception:
+        return None
+    return convert_mongo_document(doc, for_response=True) if doc else None
+
+async def update_model3d_job(job_id: str, **fields) -> bool:
+    """Record a 3D job state change; `status` transitions also stamp the time"""
+    db = get_database()
+    status = fields.get("status")
+    if status == "running":
+        fields["started_at"] = datetime.utcnow()
+    elif status in ("done", "failed"):
+        fields["completed_at"] = datetime.utcnow()
+    result = await db.model3d_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+    return result.modified_count > 0
+
+async def fail_interrupted_model3d_jobs() -> int:
+    """Mark 3D jobs left queued/running by a previous process as failed"""
+    db = get_database()
+    result = await db.model3d_jobs.update_many(
+        {"status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "failed", "error": "interrupted by server restart", "completed_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+async def get_model3d_stage_entry(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached output of one 3D pipeline stage, counting the hit"""
+    db = get_database()
+    doc = await db.model3d_stage_cache.find_one_and_update(
+        {"key": cache_key},
+        {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}}
+    )
+    return convert_mongo_document(doc) if doc else None
+
+async def put_model3d_stage_entry(cache_key: str, entry: Dict[str, Any]) -> None:
+    """Store (or refresh) the output of one 3D pipeline stage"""
+    db = get_database()
+    await db.model3d_stage_cache.update_one(
+        {"key": cache_key},
+        {"$set": {**entry, "key": cache_key, "updated_at": datetime.utcnow()},
+         "$setOnInsert": {"created_at": datetime.utcnow(), "hits": 0}},
+        upsert=True
+    )
+
+async def delete_model3d_stage_entry(cache_key: str) -> None:
+    """Drop a stage cache entry that turned out to be unusable"""
+    db = get_database()
+    await db.model3d_stage_cache.delete_one({"key": cache_key})
+
+async def delete_model3d_stage_entries_for_url(url: str) -> int:
+    """Drop stage cache entries whose output is the (evicted) asset at `url`"""
+    db = get_database()
+    result = await db.model3d_stage_cache.delete_many({"$or": [{"video_preview": url}, {"glb_url": url}, {"lod_urls": url}]})
+    return result.deleted_count
+
+# Content-addressed 3D asset index (owner, size, last access)
+async def upsert_model3d_asset(key: str, entry: Dict[str, Any], owner: Optional[str] = None) -> None:
+    """Register a stored asset (or refresh it when the same content is stored again)"""
+    db = get_database()
+    now = datetime.utcnow()
+    update = {
+        "$set": {**entry, "key": key, "last_accessed_at": now},
+        "$setOnInsert": {"created_at": now},
+    }
+    if owner:
+        update["$addToSet"] = {"owners": owner}
+    await db.model3d_assets.update_one({"key": key}, update, upsert=True)
+
+async def touch_model3d_asset(key: str) -> None:
+    """Record an access for LRU eviction"""
+    db = get_database()
+    await db.model3d_assets.update_one({"key": key}, {"$set": {"last_accessed_at": datetime.utcnow()}})
+
+async def get_model3d_assets_size() -> int:
+    """Total bytes of all indexed 3D assets"""
+    db = get_database()
+    async for doc in db.model3d_assets.aggregate([{"$group": {"_id": None, "bytes": {"$sum": "$size"}}}]):
+        return doc["bytes"]
+    return 0
+
+async def get_lru_model3d_assets(limit: int = 20) -> List[Dict[str, Any]]:
+    """Least recently accessed assets first"""
+    db = get_database()
+    cursor = db.model3d_assets.find({}).sort("last_accessed_at", 1).limit(limit)
+    return [convert_mongo_document(doc) async for doc in cursor]
+
+async def delete_model3d_asset(key: str) -> bool:
+    """Remove an asset from the index"""
+    db = get_database()
+    result = await db.model3d_assets.delete_one({"key": key})
+    return result.deleted_count > 0
+
+# Outfit Advisor operations
+def _outfit_advice_record(email: str, request_data: dict, result_data: dict,
+                          cache_key: Optional[str] = None, model: Optional[str] = None, **extra) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {
         "email": email,
         # request inputs
         "description": request_data.get("description"),
@@ -306,9 +511,18 @@ async def create_outfit_advice(email: str, request_data: dict, result_data: dict
         "explanation": result_data.get("explanation"),
         "improvement_suggestions": result_data.get("improvement_suggestions"),
         "better_outfit_idea": result_data.get("better_outfit_idea"),
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "cache_key": cache_key,
+        "model": model,
+        **extra,
+        "created_at": now,
+        "updated_at": now,
     }
+
+async def create_outfit_advice(email: str, request_data: dict, result_data: dict,
+                               cache_key: Optional[str] = None, model: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Store an outfit advisor request + result for a user (`cache_key` lets later identical requests reuse it)"""
+    db = get_database()
+    record = _outfit_advice_record(email, request_data, result_data, cache_key=cache_key, model=model)
     try:
         res = await db.outfit_advisors.insert_one(record)
         record["id"] = str(res.inserted_id)
@@ -320,6 +534,29 @@ async def create_outfit_advice(email: str, request_data: dict, result_data: dict
         print(f"[db] failed to create outfit_advice for email={email}: {e}")
         raise
 
+async def create_outfit_advice_many(email: str, entries: List[Dict[str, Any]]) -> List[str]:
+    """Store several outfit advisor results with one insert_many; returns the new ids in order.
+
+    Each entry holds `request_data`, `result_data` and optionally `cache_key`,
+    `model` and extra fields (e.g. `batch_id`, `wardrobe_item_id`).
+    """
+    if not entries:
+        return []
+    db = get_database()
+    records = [_outfit_advice_record(email, **entry) for entry in entries]
+    res = await db.outfit_advisors.insert_many(records)
+    print(f"[db] created {len(res.inserted_ids)} outfit_advice records for email={email}")
+    return [str(inserted_id) for inserted_id in res.inserted_ids]
+
+async def find_cached_outfit_advice(cache_key: str, since: datetime) -> Optional[Dict[str, Any]]:
+    """Newest outfit advisor record (any user) for `cache_key` created after `since`"""
+    db = get_database()
+    doc = await db.outfit_advisors.find_one(
+        {"cache_key": cache_key, "created_at": {"$gte": since}},
+        sort=[("created_at", -1)]
+    )
+    return convert_mongo_document(doc) if doc else None
+
 async def get_outfit_advice_by_id(record_id: str, email: str) -> Optional[Dict[str, Any]]:
     db = get_database()
     try:
@@ -366,6 +603,20 @@ async def create_favorite(email: str, fav_type: str, item: Dict[str, Any]) -> Op
     safe_item = dict(item) if isinstance(item, dict) else item
     if isinstance(safe_item, dict):
         safe_item.pop("text", None)
+        # cards come from list responses: keep the original image URLs, not the
+        # rendition picked for display, and rebuild the variants from them
+        safe_item.pop("display_url", None)
+        safe_item.pop("image_variants", None)
+        for field in CARD_IMAGE_FIELDS:
+            if isinstance(safe_item.get(field), str):
+                safe_item[field] = original_image_url(safe_item[field])
+        variants = build_image_variants(
+            safe_item.get("image_url") or safe_item.get("image") or safe_item.get("result_image_url")
+        )
+        if variants:
+            safe_item["image_variants"] = variants
+        # the style-feed card keeps its text
+        item = {**safe_item, "text": item["text"]} if "text" in item else safe_item
 
     record = {
         "email": email,
@@ -388,8 +639,8 @@ async def create_favorite(email: str, fav_type: str, item: Dict[str, Any]) -> Op
             traceback.print_exc()
     return record
 
-async def get_user_favorites(email: str, fav_type: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Return all favorite records for a user, optionally filtered by type"""
+async def get_user_favorites(email: str, fav_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return a user's favorite records (newest first), optionally filtered by type"""
     db = get_database()
     query = {"email": email}
     if fav_type:
@@ -397,6 +648,8 @@ async def get_user_favorites(email: str, fav_type: Optional[str] = None) -> List
 
     items = []
     cursor = db.favorites.find(query).sort("created_at", -1)
+    if limit:
+        cursor = cursor.limit(limit)
     async for doc in cursor:
         doc = convert_mongo_document(doc, for_response=True)
         items.append(doc)
@@ -452,6 +705,40 @@ async def get_user_style_feed(email: str) -> List[Dict[str, Any]]:
         items.append(doc)
     return items
 
+# Media asset operations (direct signed uploads)
+async def create_pending_upload(email: str, kind: str, public_id: str, expires_at: datetime) -> Dict[str, Any]:
+    """Record an issued signed upload so its completion can be verified later"""
+    db = get_database()
+    record = {
+        "email": email,
+        "kind": kind,
+        "public_id": public_id,
+        "status": "pending",
+        "expires_at": expires_at,
+        "created_at": datetime.utcnow(),
+    }
+    res = await db.media_assets.insert_one(record)
+    record["id"] = str(res.inserted_id)
+    return record
+
+async def get_media_asset(public_id: str, email: str) -> Optional[Dict[str, Any]]:
+    """Return the media asset registered for `public_id` (pending or ready)"""
+    db = get_database()
+    doc = await db.media_assets.find_one({"public_id": public_id, "email": email})
+    return convert_mongo_document(doc, for_response=True) if doc else None
+
+async def complete_media_asset(public_id: str, email: str, asset_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Mark a pending, unexpired upload as ready and store its delivery details"""
+    db = get_database()
+    now = datetime.utcnow()
+    result = await db.media_assets.update_one(
+        {"public_id": public_id, "email": email, "status": "pending", "expires_at": {"$gt": now}},
+        {"$set": {**asset_data, "status": "ready", "completed_at": now}}
+    )
+    if result.modified_count > 0:
+        return await get_media_asset(public_id, email)
+    return None
+
 # Statistics Operations
 async def get_user_statistics(email: str) -> Dict[str, Any]:
     """Get user statistics"""
@@ -129,6 +129,8 @@ class WardrobeItemInDB(BaseModel):
     color: Optional[str] = None
     brand: Optional[str] = None
     image_url: str
+    # responsive delivery URLs (thumb/small/medium/large/original) for image_url
+    image_variants: Optional[Dict[str, str]] = None
     classification_results: Optional[List[Dict[str, Any]]] = None
     teachable_results: Optional[List[Dict[str, Any]]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -145,12 +147,21 @@ class WardrobeItemResponse(BaseModel):
     color: Optional[str]
     brand: Optional[str]
     image_url: str
+    image_variants: Optional[Dict[str, str]] = None
+    # rendition chosen by list endpoints (`?variant=`); image_url stays the original
+    display_url: Optional[str] = None
     classification_results: Optional[List[Dict[str, Any]]]
     teachable_results: Optional[List[Dict[str, Any]]]
     created_at: datetime
     updated_at: datetime
 
 # Try-On Session Models
+class TryOnStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class TryOnSessionCreate(BaseModel):
     person_image_url: str
     cloth_image_url: str
@@ -168,8 +179,15 @@ class TryOnSessionInDB(BaseModel):
     person_image_url: str
     cloth_image_url: str
     result_image_url: Optional[str] = None
+    # responsive delivery URLs keyed by image role ("person", "cloth", "result")
+    image_variants: Dict[str, Optional[Dict[str, str]]] = {}
+    # job state for asynchronous try-on generation (None for legacy sessions)
+    status: Optional[TryOnStatus] = None
+    error: Optional[str] = None
+    text: Optional[str] = None
     # Removed: model_type, gender, garment_type, style
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
 class TryOnSessionResponse(BaseModel):
@@ -178,8 +196,15 @@ class TryOnSessionResponse(BaseModel):
     person_image_url: str
     cloth_image_url: str
     result_image_url: Optional[str]
+    image_variants: Optional[Dict[str, Optional[Dict[str, str]]]] = None
+    # role (person/cloth/result) -> rendition chosen by the list endpoint
+    display_urls: Optional[Dict[str, str]] = None
+    status: Optional[TryOnStatus] = None
+    error: Optional[str] = None
+    text: Optional[str] = None
     # Removed: model_type, gender, garment_type, style
     created_at: datetime
+    started_at: Optional[datetime] = None
     completed_at: Optional[datetime]
 
 # Virtual Try-On Item Models
@@ -233,6 +258,14 @@ class StyleFeedResponse(BaseModel):
     card: Dict[str, Any]
     created_at: datetime
 
+# Batch generation of style-feed card images (/api/images/batch)
+class StyleImageRequest(BaseModel):
+    prompt: str
+    model: str = "seedream"
+
+class StyleImageBatchRequest(BaseModel):
+    images: List[StyleImageRequest]
+
 class VirtualTryOnItemUpdate(BaseModel):
     person_image_url: Optional[str] = None
     cloth_image_url: Optional[str] = None
@@ -284,6 +317,10 @@ class OutfitAdvisorResponse(BaseModel):
     improvement_suggestions: Optional[str] = None
     better_outfit_idea: Optional[str] = None
 
+class OutfitAdvisorBatchRequest(BaseModel):
+    # wardrobe item ids to evaluate; empty means the whole wardrobe
+    item_ids: List[str] = []
+
 # DB storage models for outfit advisor results
 class OutfitAdvisorCreate(OutfitAdvisorRequest):
     pass
@@ -329,6 +366,47 @@ class OutfitAdvisorDBResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+# Direct (signed) upload models
+class UploadKind(str, Enum):
+    OUTFIT_ADVISOR = "outfit_advisor"
+    PROFILE = "profile"
+
+class SignedUploadRequest(BaseModel):
+    kind: UploadKind
+    filename: Optional[str] = None
+
+class SignedUploadResponse(BaseModel):
+    upload_url: str
+    api_key: str
+    cloud_name: str
+    folder: str
+    public_id: str
+    timestamp: int
+    allowed_formats: str
+    signature: str
+    expires_at: datetime
+
+class UploadCompleteRequest(BaseModel):
+    # fields echoed from the storage provider's upload response
+    public_id: str
+    version: int
+    signature: str
+    format: str
+    bytes: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+class MediaAssetResponse(BaseModel):
+    id: str
+    kind: UploadKind
+    public_id: str
+    image_url: str
+    image_variants: Optional[Dict[str, str]] = None
+    bytes: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    created_at: datetime
+
 # Response Models
 class SuccessResponse(BaseModel):
     success: bool
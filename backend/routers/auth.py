@@ -5,7 +5,9 @@ from datetime import datetime, timedelta
 import os
 from typing import List
 
-import cloudinary.uploader
+from storage import upload_media
+from utils.upload_ingest import ALLOWED_IMAGE_MIME_TYPES, read_upload
+from cloudinary_config import get_profile_photo_folder
 
 from models.schemas import (
     UserCreate, UserLogin, UserResponse, ProfileCreate, ProfileUpdate,
@@ -192,6 +194,29 @@ async def get_current_user(email: str = Depends(verify_token)):
             detail=f"Failed to get user: {str(e)}"
         )
 
+async def apply_profile_photo(email: str, photo_url: str) -> ProfileResponse:
+    """Set the profile photo url, creating the profile if needed"""
+    # update profile with new photo url (preserving existing fields)
+    # Fetch current profile if it exists
+    existing = await get_profile_by_email(email)
+    if existing:
+        # use update_profile helper to set photo_url only
+        await update_profile(email, ProfileUpdate(profile_photo_url=photo_url))
+        updated_profile = await get_profile_by_email(email)
+    else:
+        # create a new profile with just the photo
+        profile_create = ProfileCreate(
+            first_name="",
+            last_name="",
+            profile_photo_url=photo_url,
+            style_preferences=[]
+        )
+        updated_profile = await upsert_profile(email, profile_create)
+    profile_dict = updated_profile.model_dump(by_alias=True)
+    if "_id" in profile_dict:
+        profile_dict["id"] = profile_dict.pop("_id")
+    return ProfileResponse(**profile_dict)
+
 @router.post("/profile/photo", response_model=ProfileResponse)
 async def upload_profile_photo(
     file: UploadFile = File(...),
@@ -199,11 +224,11 @@ async def upload_profile_photo(
 ):
     """Upload a new profile photo, save to Cloudinary, and update profile"""
     try:
-        file_content = await file.read()
-        # upload to cloudinary
-        upload_result = cloudinary.uploader.upload(
+        file_content = await read_upload(file, allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+        # upload to media storage
+        upload_result = await upload_media(
             file_content,
-            folder="virtual_wardrobe/profile_photos",
+            folder=get_profile_photo_folder(),
             public_id=f"{email}_profile",
             overwrite=True,
             resource_type="image"
@@ -211,26 +236,9 @@ async def upload_profile_photo(
         photo_url = upload_result.get("secure_url")
         if not photo_url:
             raise Exception("Failed to obtain secure_url from Cloudinary response")
-        # update profile with new photo url (preserving existing fields)
-        # Fetch current profile if it exists
-        existing = await get_profile_by_email(email)
-        if existing:
-            # use update_profile helper to set photo_url only
-            await update_profile(email, ProfileUpdate(profile_photo_url=photo_url))
-            updated_profile = await get_profile_by_email(email)
-        else:
-            # create a new profile with just the photo
-            profile_create = ProfileCreate(
-                first_name="",
-                last_name="",
-                profile_photo_url=photo_url,
-                style_preferences=[]
-            )
-            updated_profile = await upsert_profile(email, profile_create)
-        profile_dict = updated_profile.model_dump(by_alias=True)
-        if "_id" in profile_dict:
-            profile_dict["id"] = profile_dict.pop("_id")
-        return ProfileResponse(**profile_dict)
+        return await apply_profile_photo(email, photo_url)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Photo upload failed: {str(e)}")
 
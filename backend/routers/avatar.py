@@ -1,87 +1,218 @@
+import asyncio
+import hashlib
+import json
 import os
 import random
-from urllib.parse import quote
+import re
+from urllib.parse import quote, urlparse
 
+import httpx
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-import cloudinary.uploader
-import requests
+from fastapi.responses import StreamingResponse
+from storage import get_storage, upload_media, upload_media_stream
+from cloudinary_config import get_avatar_image_folder
+
+from models.database_ops import get_avatar_cache_entry, put_avatar_cache_entry
+from utils.image_pipeline import normalize_image
+from utils.upload_ingest import read_upload
+from utils.upstreams import upstreams
 
 router = APIRouter()
 
-POLLINATIONS_API_KEY = os.getenv("POLLINATIONS_API_KEY")
+# a generated avatar larger than this is rejected instead of stored
+AVATAR_MAX_MB = int(os.getenv("AVATAR_MAX_MB", "40"))
+AVATAR_MAX_VARIANTS = int(os.getenv("AVATAR_MAX_VARIANTS", "4"))
+AVATAR_CHUNK_BYTES = 64 * 1024
+AVATAR_SEED_MAX = 100000
+
+MODEL = "qwen-image"
+WIDTH = 2048
+HEIGHT = 2048
+QUALITY_PREFIX = (
+    "\n    complete masterpiece, best quality, ultra high resolution, photorealistic,\n    8K, extremely detailed, sharp focus, professional lighting, cinematic,\n hyperrealistic\n modify the image into 3d style cartoon form  "
+)
+
+
+_REFERENCE_NAME = re.compile(r"/avatar_reference_([0-9a-f]{32})(?:\.[A-Za-z0-9]+)?$")
+
+
+def _reference_name(content_sha256):
+    # named by content hash, so re-uploading the same photo reuses the stored copy
+    return f"avatar_reference_{content_sha256[:32]}"
+
+
+def reference_identity(reference_url):
+    """Content identity of a reference image: the hash its stored copy is named by.
+
+    References returned by an earlier /avatar response live in our storage
+    under `avatar_reference_<sha256[:32]>`, the same identity a fresh upload
+    of that photo gets.  Any other URL is identified by the URL itself.
+    """
+    match = _REFERENCE_NAME.search(urlparse(reference_url).path)
+    if match:
+        stored_url = get_storage().url(f"{get_avatar_image_folder()}/{_reference_name(match.group(1))}")
+        if urlparse(stored_url).netloc == urlparse(reference_url).netloc:
+            return match.group(1)
+    return reference_url
+
+
+def avatar_cache_key(prompt, reference, seed):
+    """Everything that shapes a Pollinations result: prompt, model, size, reference image and seed.
+
+    `reference` is the reference image's content identity (see `reference_identity`).
+    """
+    params = {"prompt": prompt, "model": MODEL, "width": WIDTH, "height": HEIGHT, "reference": reference}
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"{digest}:{seed}"
+
+
+def _pick_seeds(count, seed=None):
+    """`count` distinct seeds; consecutive from `seed` when given, otherwise random"""
+    if seed is not None:
+        return [seed + i for i in range(count)]
+    return random.sample(range(1, AVATAR_SEED_MAX + 1), count)
+
+
+async def _upload_reference(content: bytes, content_sha256: str) -> str:
+    content, _ = await normalize_image(content, "avatar_reference")
+    upload_result = await upload_media(
+        content,
+        folder=get_avatar_image_folder(),
+        public_id=_reference_name(content_sha256),
+        overwrite=False,
+        resource_type="image"
+    )
+    return upload_result.get("secure_url")
+
+
+async def _generate_variant(path, params, cache_key):
+    """Return the stored avatar for `cache_key`, generating it with Pollinations if needed"""
+    try:
+        cached = await get_avatar_cache_entry(cache_key)
+    except Exception as e:
+        print(f"[avatar] cache lookup failed: {e}")
+        cached = None
+    if cached and cached.get("image_url"):
+        return {"image_url": cached["image_url"], "status": 200, "cached": True}
+
+    # the "pollinations" client (registered by the style feed router) carries the API key
+    pollinations = upstreams.get("pollinations")
+    try:
+        async with pollinations.stream("GET", path, params=params) as resp:
+            if resp.status_code != 200:
+                body = await resp.aread()
+                raise HTTPException(
+                    status_code=resp.status_code,
+                    detail=body.decode(errors="replace") or "Pollinations error"
+                )
+            upstream_url = str(resp.url)
+            # chunks go straight into the storage upload (spooled to disk past a
+            # small in-memory buffer), so memory use does not grow with resolution
+            try:
+                generated_upload = await upload_media_stream(
+                    resp.aiter_bytes(AVATAR_CHUNK_BYTES),
+                    folder=get_avatar_image_folder(),
+                    resource_type="image",
+                    max_bytes=AVATAR_MAX_MB * 1024 * 1024
+                )
+            except httpx.HTTPError:
+                raise
+            except Exception as exc:
+                # fall back to returning the Pollinations URL if upload fails
+                print(f"[avatar] storing generated avatar failed: {exc}")
+                return {"image_url": upstream_url, "status": resp.status_code, "cached": False}
+    except HTTPException:
+        raise
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(exc)}")
+
+    result_url = generated_upload.get("secure_url")
+    try:
+        await put_avatar_cache_entry(cache_key, {
+            "image_url": result_url,
+            "seed": params["seed"],
+            "model": params["model"],
+            "reference_url": params.get("image"),
+        })
+    except Exception as e:
+        print(f"[avatar] cache store failed: {e}")
+    return {"image_url": result_url, "status": 200, "cached": False}
+
 
 @router.post('/avatar')
 async def generate_avatar(
     prompt: str = Form(...),
-    file: UploadFile | None = File(None)
+    file: UploadFile | None = File(None),
+    reference_url: str | None = Form(None),
+    variants: int = Form(1, ge=1, le=AVATAR_MAX_VARIANTS),
+    seed: int | None = Form(None, ge=1)
 ):
-    """Generate a 3D-style avatar using Pollinations and optional reference image.
+    """Generate 3D-style avatars using Pollinations and optional reference image.
 
-    - uploads the provided file to Cloudinary under `virtual_wardrobe/avatar_images`
-    - calls Pollinations with model=klein, width/height 2048 and a random seed
-    - returns the Cloudinary URL of the generated avatar
+    - uploads the provided file to media storage under `virtual_wardrobe/avatar_images`
+      while the prompt is built (or reuses `reference_url` from an earlier response)
+    - launches `variants` generations concurrently with distinct seeds (consecutive
+      from `seed` when given); every result is recorded by seed, so asking again with
+      the same prompt, reference and seed returns the stored image
+    - one variant: returns `{image_url, seed, reference_url, status, cached}`;
+      several: streams one such JSON line (plus `index`) per variant as it finishes
     """
-    API_KEY = POLLINATIONS_API_KEY
-    MODEL = "qwen-image"
-    WIDTH = 2048
-    HEIGHT = 2048
-
-    # upload reference image if provided
-    reference_url = None
+    # upload reference image if provided; runs while the prompt is built
+    reference_task = None
+    reference = reference_identity(reference_url) if reference_url else None
     if file is not None:
+        content = await read_upload(file)
+        content_sha256 = hashlib.sha256(content).hexdigest()
+        reference = content_sha256[:32]
+        reference_task = asyncio.create_task(_upload_reference(content, content_sha256))
+
+    # build prompt
+    final_prompt = f"{QUALITY_PREFIX} {prompt}"
+    path = f"/image/{quote(final_prompt, safe='')}"
+    base_params = {
+        "model": MODEL,
+        "width": WIDTH,
+        "height": HEIGHT,
+    }
+    seeds = _pick_seeds(variants, seed)
+
+    if reference_task is not None:
         try:
-            content = await file.read()
-            upload_result = cloudinary.uploader.upload(
-                content,
-                folder="virtual_wardrobe/avatar_images",
-                resource_type="image"
-            )
-            reference_url = upload_result.get("secure_url")
+            reference_url = await reference_task
         except Exception as exc:
             raise HTTPException(status_code=500, detail=f"failed to upload reference image: {exc}")
+    if reference_url:
+        base_params["image"] = reference_url
 
-    # build prompt
-    quality_prefix = (
-        "\n    complete masterpiece, best quality, ultra high resolution, photorealistic,\n    8K, extremely detailed, sharp focus, professional lighting, cinematic,\n hyperrealistic\n modify the image into 3d style cartoon form  "
-    )
-    final_prompt = f"{quality_prefix} {prompt}"
+    async def run_variant(index, variant_seed):
+        result = await _generate_variant(
+            path, {**base_params, "seed": variant_seed},
+            avatar_cache_key(final_prompt, reference, variant_seed)
+        )
+        return {"index": index, "seed": variant_seed, "reference_url": reference_url, **result}
 
-    seed = random.randint(1, 100000)
-    try:
-        encoded = quote(final_prompt, safe="")
-        url = f"https://gen.pollinations.ai/image/{encoded}"
-        params = {
-            "model": MODEL,
-            "width": WIDTH,
-            "height": HEIGHT,
-            "seed": seed,
-        }
-        if reference_url:
-            params["image"] = reference_url
-
-        headers = {}
-        if API_KEY:
-            headers["Authorization"] = f"Bearer {API_KEY}"
-
-        resp = requests.get(url, params=params, headers=headers, timeout=60, stream=True)
-    except requests.RequestException as exc:
-        raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(exc)}")
+    if variants == 1:
+        result = await run_variant(0, seeds[0])
+        result.pop("index")
+        return result
 
-    if resp.status_code != 200:
-        raise HTTPException(status_code=resp.status_code, detail=resp.text or "Pollinations error")
+    async def run_variant_line(index, variant_seed):
+        try:
+            return await run_variant(index, variant_seed)
+        except HTTPException as e:
+            error = {"status": e.status_code, "error": e.detail}
+        except Exception as e:
+            error = {"status": 500, "error": str(e)}
+        return {"index": index, "seed": variant_seed, "reference_url": reference_url, **error}
 
-    # upload resulting image to Cloudinary as well so the frontend can simply display it
-    try:
-        # read binary content
-        image_bytes = resp.content
-        generated_upload = cloudinary.uploader.upload(
-            image_bytes,
-            folder="virtual_wardrobe/avatar_images",
-            resource_type="image"
-        )
-        result_url = generated_upload.get("secure_url")
-    except Exception as exc:
-        # fall back to returning the Pollinations URL if upload fails
-        result_url = resp.url
+    async def stream():
+        tasks = [asyncio.create_task(run_variant_line(i, s)) for i, s in enumerate(seeds)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result) + "\n"
+        finally:
+            # client went away: stop the generations still running
+            for task in tasks:
+                task.cancel()
 
-    return {"image_url": result_url, "status": resp.status_code}
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from routers.auth import verify_token
+from cloudinary_config import apply_card_variant, DEFAULT_LIST_VARIANT, IMAGE_VARIANT_PATTERN
 from models.schemas import FavoriteCreate, FavoriteResponse
 from models.database_ops import (
     create_favorite, get_user_favorites, delete_favorite
@@ -11,11 +12,15 @@ router = APIRouter()
 @router.get("/favorites", response_model=List[FavoriteResponse])
 async def list_favorites(
     type: Optional[str] = Query(None),
+    variant: str = Query(DEFAULT_LIST_VARIANT, pattern=IMAGE_VARIANT_PATTERN),
     email: str = Depends(verify_token)
 ):
-    """List favorites for the authenticated user.  Optional `type` filter"""
+    """List favorites for the authenticated user.  Optional `type` filter;
+    each card's display_url is the `variant` rendition of its image."""
     try:
         favs = await get_user_favorites(email, fav_type=type)
+        for fav in favs:
+            apply_card_variant(fav.get("item"), variant)
         return favs
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list favorites: {str(e)}")
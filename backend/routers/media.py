@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+
+from storage import get_storage, guess_content_type, LocalStorage
+from utils.asset_store import asset_store, content_sha256
+
+router = APIRouter()
+
+
+@router.get("/media/{key:path}")
+async def serve_media(key: str):
+    """Serve a stored media object.
+
+    Objects on local disk (local backend or the write-through cache) are sent
+    with FileResponse, which streams from disk and uses the server's
+    sendfile/pathsend support where available.  Anything else redirects to the
+    backend's own delivery URL.
+    """
+    storage = get_storage()
+    try:
+        path = storage.local_path(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not found")
+    if path:
+        return FileResponse(path, media_type=guess_content_type(path), headers={"Cache-Control": "public, max-age=86400"})
+    if isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    return RedirectResponse(storage.url(key))
+
+
+@router.get("/avatars_3D/{key}")
+async def serve_3d_asset(key: str, request: Request):
+    """Serve a generated 3D asset (MP4 preview or GLB) from the asset store.
+
+    Content-addressed keys never change, so they get their hash as a strong
+    ETag and an immutable Cache-Control; FileResponse answers `Range`
+    (and `If-Range`) requests with partial content for video scrubbing.
+    """
+    path = asset_store.local_path(key)
+    if not path:
+        raise HTTPException(status_code=404, detail="Not found")
+    sha256 = content_sha256(key)
+    headers = {"Accept-Ranges": "bytes"}
+    if sha256:
+        headers["ETag"] = f'"{sha256}"'
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        if headers["ETag"] in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        await asset_store.touch(key)
+    else:
+        # files written before content addressing could be overwritten in place
+        headers["Cache-Control"] = "public, max-age=3600"
+    return FileResponse(path, media_type=guess_content_type(path), headers=headers)
@@ -1,146 +1,446 @@
-from fastapi import APIRouter, UploadFile, File
-from fastapi.staticfiles import StaticFiles
-from gradio_client import Client, handle_file
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
+import asyncio
+import functools
+import hashlib
+import json
+import time
+import traceback
 from dotenv import load_dotenv
+from utils.image_pipeline import normalize_image, run_in_pipeline
+from utils.glb_lod import build_lods, parse_lod_levels
+from utils.upload_ingest import read_upload
+from utils.gradio_async import AsyncGradioClient, GradioFile
+from utils.gradio_sessions import GradioSessionPool, GradioSessionPoolExhausted
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.progress import ProgressBroker, sse_event, SSE_KEEPALIVE
+from utils.asset_store import asset_store
+from routers.auth import verify_token
+from utils.upstreams import upstreams
+from models.database_ops import (
+    create_model3d_job, get_model3d_job, update_model3d_job,
+    get_model3d_stage_entry, put_model3d_stage_entry, delete_model3d_stage_entry
+)
 
 # load environment variables from .env if present
 load_dotenv()
 
 router = APIRouter()
 
-# ensure the output directory exists; this path is relative to the backend working dir
-# both mp4 previews and glb files will land here
-OUTPUT_DIR = "avatars_3D"
-# ensure the output directory exists; this path is relative to the backend working dir
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# async client pointing at the TRELLIS multiple3D space (URL or Space id);
+# generation and GLB extraction can take minutes
+GRADIO_TRELLIS_URL = os.getenv("GRADIO_TRELLIS_URL", "dkatz2391/Cavargas-TRELLIS-Multiple3D")
+client = AsyncGradioClient(GRADIO_TRELLIS_URL, hf_token=os.getenv("HF_TOKEN"), timeout=300)
+# the Space config is fetched on first use or by the background warm-up
+upstreams.register("gradio-trellis", lambda: client, lambda c: c.connect())
 
-# client pointing at the TRELLIS multiple3D space
-# HF_TOKEN = os.getenv("HF_TOKEN")
-# if HF_TOKEN:
-#     # gradio_client reads HF_TOKEN from environment when making requests
-#     os.environ["HF_TOKEN"] = HF_TOKEN
-client = Client("dkatz2391/Cavargas-TRELLIS-Multiple3D")
+# TRELLIS keeps each generated model in per-session state, so every job
+# runs in its own checked-out session; the pool size bounds how many
+# generations run against the Space at once.
+TRELLIS_SESSION_POOL_SIZE = int(os.getenv("TRELLIS_SESSION_POOL_SIZE", "2"))
+TRELLIS_SESSION_CHECKOUT_TIMEOUT = float(os.getenv("TRELLIS_SESSION_CHECKOUT_TIMEOUT", "600"))
+trellis_sessions = GradioSessionPool(
+    client, size=TRELLIS_SESSION_POOL_SIZE, checkout_timeout=TRELLIS_SESSION_CHECKOUT_TIMEOUT
+)
 
-@router.post("/generate-3d")
+# Generation runs as background jobs recorded in the `model3d_jobs`
+# collection; jobs beyond the worker count wait in the queue, and the queue
+# itself is bounded (503 once full).
+MODEL3D_WORKERS = int(os.getenv("MODEL3D_WORKERS", str(TRELLIS_SESSION_POOL_SIZE)))
+MODEL3D_MAX_QUEUED = int(os.getenv("MODEL3D_MAX_QUEUED", "20"))
+model3d_queue = JobQueue("model3d", workers=MODEL3D_WORKERS, max_queued=MODEL3D_MAX_QUEUED)
+model3d_progress = ProgressBroker()
+MODEL3D_EVENTS_KEEPALIVE_SECONDS = 15.0
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Levels of detail built on CPU from every GLB, coarse to fine, as
+# "vertex ratio:max texture edge" pairs; empty disables the LOD stage.
+MODEL3D_LOD_LEVELS = parse_lod_levels(os.getenv("MODEL3D_LOD_LEVELS", "0.1:256,0.3:512,1.0:1024"))
+
+# fixed sampler settings for /image_to_3d; part of the stage cache key
+TRELLIS_GENERATE_PARAMS = {
+    "ss_guidance_strength": 7.5,
+    "ss_sampling_steps": 12,
+    "slat_guidance_strength": 3,
+    "slat_sampling_steps": 12,
+    "multiimage_algo": "stochastic",
+}
+
+
+def stage_cache_key(stage, image_sha256, params):
+    """Cache key of one pipeline stage: input image hash + the parameters that shape its output"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{stage}:{image_sha256}:{digest}"
+
+
+def _stage_keys(image_sha256, seed, texture_size, mesh_simplify, email):
+    """Stage parameters and cache keys for one request.
+
+    The generate entry holds the TRELLIS session the model lives in, so its
+    key is per user; GLB and LOD entries only name stored files and are
+    shared by everyone asking for the same image.
+    """
+    generate_params = {"seed": seed, **TRELLIS_GENERATE_PARAMS}
+    glb_params = {**generate_params, "texture_size": texture_size, "mesh_simplify": mesh_simplify}
+    return (
+        generate_params, stage_cache_key("generate", image_sha256, {**generate_params, "owner": email}),
+        glb_params, stage_cache_key("glb", image_sha256, glb_params),
+    )
+
+
+async def _cached_generation(generate_key, email):
+    """The caller's cached generate entry, if any.
+
+    Only entries recorded for `email` are returned: resuming one hands its
+    TRELLIS session to this job, and a session must never cross users.
+    """
+    entry = await get_model3d_stage_entry(generate_key)
+    if entry and entry.get("owner") != email:
+        print(f"[model3d] ignoring generate entry {generate_key} owned by another user")
+        return None
+    return entry
+
+
+def _lod_key(image_sha256, glb_params):
+    return stage_cache_key("lod", image_sha256, {**glb_params, "levels": MODEL3D_LOD_LEVELS})
+
+
+async def _store_asset(src, owner):
+    """Store a TRELLIS output in the content-addressed asset store; returns its URL.
+
+    `src` is what the client returned: a downloaded FileData dict (with
+    `data`), a Video output wrapping one, a list of those, or a path.  A
+    string that is not a local file (e.g. a URL) comes back unchanged so
+    the frontend can still display it; an output without a file gives None.
+    Raises RuntimeError when the file cannot be stored, which fails the job.
+    """
+    # unwrap lists/tuples
+    if isinstance(src, (list, tuple)) and src:
+        return await _store_asset(src[0], owner)
+    if isinstance(src, dict):
+        if 'data' in src and isinstance(src['data'], (bytes, str)):
+            data = src['data'].encode() if isinstance(src['data'], str) else src['data']
+            ext = os.path.splitext(src.get('name') or src.get('path') or '')[1]
+            try:
+                return (await asset_store.put(data, ext, owner))["url"]
+            except Exception as e:
+                raise RuntimeError(f"Storing the generated {ext or 'output'} asset failed: {e}")
+        # otherwise try common path keys, including video or GLB paths
+        nested = src.get('path') or src.get('video') or src.get('glb') or src.get('mesh') or src.get('name') or src.get('file')
+        if isinstance(nested, dict):
+            # e.g. a Video output wrapping the downloaded file
+            return await _store_asset(nested, owner)
+        src = nested
+    if isinstance(src, (str, os.PathLike)) and os.path.isfile(src):
+        ext = os.path.splitext(os.fspath(src))[1]
+        try:
+            data = await asyncio.to_thread(_read_file, src)
+            return (await asset_store.put(data, ext, owner))["url"]
+        except Exception as e:
+            raise RuntimeError(f"Storing the generated {ext or 'output'} asset failed: {e}")
+    return src if isinstance(src, str) else None
+
+
+def _read_file(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _publish(job_id, stage, **fields):
+    model3d_progress.publish(job_id, {"stage": stage, "job_id": job_id, **fields})
+
+
+def _forward_status(job_id, stage):
+    """on_status callback that republishes upstream queue rank / ETA / progress"""
+    def on_status(update):
+        _publish(job_id, stage, upstream_status=update.stage, upstream_rank=update.rank,
+                 upstream_eta_seconds=update.eta, progress=update.progress)
+    return on_status
+
+
+async def _generate_stage(job_id, session, email, image_file, image_sha256, generate_params, generate_key, timings):
+    """start_session + image_to_3d; returns the cache entry (video preview and TRELLIS session)"""
+    started = time.perf_counter()
+    _publish(job_id, "session")
+    await session.predict(api_name="/start_session")
+    # upload the image from memory once
+    image = await session.upload(image_file)
+    timings["session"] = round((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    _publish(job_id, "generating")
+    video = await session.predict(
+        multiimages=[{"image": image}],
+        **generate_params,
+        api_name="/image_to_3d",
+        on_status=_forward_status(job_id, "generating"),
+    )
+    video_preview = await _store_asset(video, email)
+    timings["generate"] = round((time.perf_counter() - started) * 1000)
+
+    entry = {
+        "stage": "generate",
+        "image_sha256": image_sha256,
+        "params": generate_params,
+        "video_preview": video_preview,
+        # the generated model stays in this session on the Space
+        "session_hash": session.session_hash,
+        "owner": email,
+    }
+    await put_model3d_stage_entry(generate_key, entry)
+    return entry
+
+
+async def _extract_glb_stage(job_id, session, email, image_sha256, glb_params, glb_key, timings):
+    started = time.perf_counter()
+    _publish(job_id, "extracting")
+    glb = await session.predict(
+        mesh_simplify=glb_params["mesh_simplify"],
+        texture_size=glb_params["texture_size"],
+        api_name="/extract_glb",
+        on_status=_forward_status(job_id, "extracting"),
+    )
+    glb_url = await _store_asset(glb, email)
+    timings["extract_glb"] = round((time.perf_counter() - started) * 1000)
+    await put_model3d_stage_entry(glb_key, {
+        "stage": "glb", "image_sha256": image_sha256, "params": glb_params, "glb_url": glb_url,
+    })
+    return glb_url
+
+
+async def _lod_stage(job_id, email, image_sha256, glb_url, lod_key, timings):
+    """Build the LOD set for a stored GLB on the CPU pool; returns the manifest"""
+    path = asset_store.local_path(os.path.basename(glb_url or ""))
+    if not path:
+        return None
+    started = time.perf_counter()
+    _publish(job_id, "optimizing")
+    data = await asyncio.to_thread(_read_file, path)
+    built = await run_in_pipeline(build_lods, data, MODEL3D_LOD_LEVELS)
+    levels = []
+    for level, (lod_bytes, info) in enumerate(built):
+        stored = await asset_store.put(lod_bytes, ".glb", email)
+        levels.append({"level": level, "url": stored["url"], **info})
+    manifest = {"original": {"url": glb_url, "bytes": len(data)}, "levels": levels}
+    timings["lod"] = round((time.perf_counter() - started) * 1000)
+    print(f"[model3d] LODs for {glb_url}: " + ", ".join(
+        f"L{lv['level']} {lv['triangles']} tris {lv['bytes']} B {lv['processing_ms']} ms" for lv in levels
+    ))
+    await put_model3d_stage_entry(lod_key, {
+        "stage": "lod", "image_sha256": image_sha256, "glb_url": glb_url,
+        "lod_urls": [lv["url"] for lv in levels], "manifest": manifest,
+    })
+    return manifest
+
+
+async def _run_stages(job_id, email, image_file, image_sha256, keys, include_glb, timings, generated=None):
+    """Run the missing stages inside one checked-out TRELLIS session.
+
+    Without `generated` a fresh session runs image_to_3d first; otherwise
+    the cached generation's session is resumed for extraction only.
+    Returns `(generated, glb_url)`.
+    """
+    generate_params, generate_key, glb_params, glb_key = keys
+    started = time.perf_counter()
+    _publish(job_id, "waiting_session", sessions=trellis_sessions.stats())
+    async with trellis_sessions.session(generated["session_hash"] if generated else None) as session:
+        timings["session_wait"] = timings.get("session_wait", 0) + round((time.perf_counter() - started) * 1000)
+        if generated is None:
+            generated = await _generate_stage(
+                job_id, session, email, image_file, image_sha256, generate_params, generate_key, timings
+            )
+            await update_model3d_job(job_id, stage="generate", video_preview=generated["video_preview"],
+                                     timings_ms=timings)
+        glb_url = None
+        if include_glb:
+            glb_url = await _extract_glb_stage(job_id, session, email, image_sha256, glb_params, glb_key, timings)
+    return generated, glb_url
+
+
+async def _run_model3d_job(job_id, email, image_file, image_sha256, seed, include_glb, texture_size, mesh_simplify):
+    """Worker body: run the uncached stages and record outputs and timings on the job"""
+    keys = _stage_keys(image_sha256, seed, texture_size, mesh_simplify, email)
+    _, generate_key, glb_params, glb_key = keys
+    timings = {}
+    cached_stages = []
+    # outputs written by this job stay pinned until it finishes (see asset_store)
+    async with asset_store.pinned():
+        try:
+            await update_model3d_job(job_id, status="running")
+
+            generated = await _cached_generation(generate_key, email)
+            glb_entry = await get_model3d_stage_entry(glb_key) if include_glb else None
+            if generated:
+                cached_stages.append("generate")
+            glb_url = None
+            if glb_entry:
+                cached_stages.append("extract_glb")
+                glb_url = glb_entry["glb_url"]
+                # the LOD stage reads this GLB from the store
+                asset_store.pin(os.path.basename(glb_url or ""))
+
+            extract = include_glb and glb_entry is None
+            if generated is None or extract:
+                try:
+                    generated, new_glb_url = await _run_stages(
+                        job_id, email, image_file, image_sha256, keys, extract, timings, generated
+                    )
+                except GradioSessionPoolExhausted:
+                    raise
+                except Exception as exc:
+                    if "generate" not in cached_stages:
+                        raise
+                    # the Space dropped the cached session's state; regenerate once
+                    print(f"[model3d] cached session for {generate_key} unusable ({exc}); regenerating")
+                    cached_stages.remove("generate")
+                    await delete_model3d_stage_entry(generate_key)
+                    generated, new_glb_url = await _run_stages(
+                        job_id, email, image_file, image_sha256, keys, extract, timings
+                    )
+                glb_url = glb_url or new_glb_url
+
+            lods = None
+            if glb_url and MODEL3D_LOD_LEVELS:
+                lod_key = _lod_key(image_sha256, glb_params)
+                lod_entry = await get_model3d_stage_entry(lod_key)
+                if lod_entry:
+                    cached_stages.append("lod")
+                    lods = lod_entry["manifest"]
+                else:
+                    try:
+                        lods = await _lod_stage(job_id, email, image_sha256, glb_url, lod_key, timings)
+                    except Exception as exc:
+                        # the full GLB is still usable without LODs
+                        print(f"[model3d] LOD generation failed for {glb_url}: {exc}")
+
+            await update_model3d_job(job_id, status="done", stage="done", video_preview=generated["video_preview"],
+                                     glb_url=glb_url, lods=lods, timings_ms=timings, cached_stages=cached_stages)
+            _publish(job_id, "done", video_preview=generated["video_preview"], glb_url=glb_url, lods=lods,
+                     timings_ms=timings, cached_stages=cached_stages)
+        except Exception as e:
+            print(f"Error in 3D job {job_id}: {e}")
+            traceback.print_exc()
+            _publish(job_id, "failed", error=str(e), timings_ms=timings)
+            await update_model3d_job(job_id, status="failed", error=str(e), timings_ms=timings)
+
+
+@router.post("/generate-3d", status_code=202)
 async def generate_3d(
     file: UploadFile = File(...),
     include_glb: bool = True,              # set to False when only video is desired
+    seed: int = 0,
+    texture_size: int = Query(1024, ge=512, le=2048),
+    mesh_simplify: float = Query(0.95, ge=0.9, le=0.98),
+    email: str = Depends(verify_token),
 ):
-    # write uploaded image into the avatars output directory as a temp file
-    image_path = os.path.join(OUTPUT_DIR, f"temp_{file.filename}")
+    """Queue a 3D generation job (TRELLIS: video preview, then optionally a GLB
+    plus CPU-built levels of detail).
 
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    Stage outputs are cached by input image hash and parameters, so asking
+    for the same image again only runs what is missing, e.g. a GLB with a
+    different `texture_size` skips video generation.  Returns `200` with the
+    assets when everything is cached, otherwise `202` with the job id; poll
+    GET /generate-3d/jobs/{id} or follow GET /generate-3d/jobs/{id}/events.
+    """
+    # normalise the upload (orientation, size) before handing it to TRELLIS
+    content, info = await normalize_image(await read_upload(file), "trellis")
+    image_sha256 = hashlib.sha256(content).hexdigest()
+    stem, ext = os.path.splitext(file.filename or "image")
+    image_file = GradioFile(content, f"{stem}{info.get('extension', ext)}")
 
-    # start session
+    params = {"seed": seed, "include_glb": include_glb, "texture_size": texture_size, "mesh_simplify": mesh_simplify}
     try:
-        client.predict(api_name="/start_session")
-    except Exception as exc:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=500, detail=f"session start failed: {exc}")
-
-    # (optional) preprocess images if you want to cache results or inspect them.
-    # we don't actually need its output to call /image_to_3d, so the value is
-    # ignored. keeping the call mainly for completeness; you may remove it.
-    try:
-        _ = client.predict(
-            images=[{"image": handle_file(image_path)}],
-            api_name="/preprocess_images"
-        )
-    except Exception as exc:
-        # log and continue; preprocessing failure shouldn't block generation
-        print(f"preprocess warning: {exc}")
-
-    # generate 3D (returns mp4 preview path or list)
-    # use multiimages parameter with a list of dicts containing ImageData
-    multi_input = [{"image": handle_file(image_path)}]
-    try:
-        video = client.predict(
-            multiimages=multi_input,
-            seed=0,
-            ss_guidance_strength=7.5,
-            ss_sampling_steps=12,
-            slat_guidance_strength=3,
-            slat_sampling_steps=12,
-            multiimage_algo="stochastic",
-            api_name="/image_to_3d"
-        )
-    except Exception as exc:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=500, detail=f"3D generation failed: {exc}")
-
-    # extract GLB only if requested
-    glb_url = None
-    if include_glb:
-        try:
-            glb = client.predict(
-                mesh_simplify=0.95,
-                texture_size=1024,
-                api_name="/extract_glb"
-            )
-        except Exception as exc:
-            print(f"GLB extraction failed: {exc}")
-            glb = None
-
-    # generic copier: if `src` refers to a local file path (string or
-    # dict containing a path) then copy it into OUTPUT_DIR and return the
-    # public /avatars URL.  If copying fails or the value isn't a path, return
-    # the original `src` so the frontend can still display it.
-    def _copy_file(src):
-        # debug log so we see what the model actually returned
-        print("_copy_file received:", repr(src))
-        # unwrap lists/tuples
-        if isinstance(src, (list, tuple)) and src:
-            return _copy_file(src[0])
-        # handle dict cases
-        if isinstance(src, dict):
-            # if data bytes/base64 present, write them to a temp file
-            if 'data' in src and isinstance(src['data'], (bytes, str)):
-                # treat as raw file content
-                fname = src.get('name', 'output')
-                tmp_path = os.path.join(OUTPUT_DIR, fname)
-                try:
-                    mode = 'wb' if isinstance(src['data'], (bytes, bytearray)) else 'w'
-                    with open(tmp_path, mode) as f:
-                        f.write(src['data'])
-                    return f"/avatars_3D/{os.path.basename(tmp_path)}"
-                except Exception:
-                    pass
-            # otherwise try common path keys, including video or GLB paths
-            src = src.get('path') or src.get('video') or src.get('glb') or src.get('mesh') or src.get('name') or src.get('file') or src
-        # if we now have a usable path-like
-        if isinstance(src, (str, bytes, os.PathLike)):
-            try:
-                dest = os.path.join(OUTPUT_DIR, os.path.basename(src))
-                shutil.copy(src, dest)
-                return f"/avatars_3D/{os.path.basename(dest)}"
-            except Exception:
-                return src
-        # fallback: return whatever it was
-        return src
-
-    # copy video preview(s) if they are writable paths; otherwise keep the
-    # original structure
-    if isinstance(video, (list, tuple)):
-        video_preview = [_copy_file(v) for v in video]
-    else:
-        video_preview = _copy_file(video)
-
-    # if we generated a GLB, handle it now
-    if include_glb and glb is not None:
-        glb_path = glb[0] if isinstance(glb, (list, tuple)) else glb
-        glb_url = _copy_file(glb_path)
+        _, generate_key, glb_params, glb_key = _stage_keys(image_sha256, seed, texture_size, mesh_simplify, email)
+        generated = await _cached_generation(generate_key, email)
+        glb_entry = await get_model3d_stage_entry(glb_key) if generated and include_glb else None
+        lod_entry = None
+        if glb_entry and MODEL3D_LOD_LEVELS:
+            lod_entry = await get_model3d_stage_entry(_lod_key(image_sha256, glb_params))
+        if generated and (not include_glb or (glb_entry and (lod_entry or not MODEL3D_LOD_LEVELS))):
+            # every stage is cached: record the job as done straight away
+            glb_url = glb_entry["glb_url"] if glb_entry else None
+            lods = lod_entry["manifest"] if lod_entry else None
+            cached_stages = ["generate"] + (["extract_glb"] if glb_entry else []) + (["lod"] if lod_entry else [])
+            job = await create_model3d_job({
+                "email": email, "status": "done", "stage": "done", "image_sha256": image_sha256, "params": params,
+                "video_preview": generated["video_preview"], "glb_url": glb_url, "lods": lods,
+                "timings_ms": {}, "cached_stages": cached_stages,
+            })
+            return JSONResponse(status_code=200, content={
+                "job_id": job["id"], "status": "done", "video_preview": generated["video_preview"],
+                "glb_url": glb_url, "lods": lods, "cached_stages": cached_stages,
+            })
+
+        job = await create_model3d_job({
+            "email": email, "status": "queued", "stage": "queued", "image_sha256": image_sha256, "params": params,
+            "timings_ms": {}, "cached_stages": [],
+        })
+    except Exception as e:
+        print(f"Error in /generate-3d endpoint: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
     try:
-        os.remove(image_path)
-    except OSError:
-        pass
+        model3d_queue.submit(job["id"], functools.partial(
+            _run_model3d_job, job["id"], email, image_file, image_sha256, seed, include_glb, texture_size, mesh_simplify
+        ))
+    except JobQueueFull as e:
+        await update_model3d_job(job["id"], status="failed", error=str(e))
+        raise HTTPException(status_code=503, detail=f"3D generation busy: {e}")
+    _publish(job["id"], "queued", position=model3d_queue.position(job["id"]),
+             eta_seconds=model3d_queue.eta(job["id"]))
+    return {"job_id": job["id"], "status": "queued"}
 
-    return {
-        "video_preview": video_preview,
-        "glb_url": glb_url
-    }
 
+@router.get("/generate-3d/jobs/{job_id}")
+async def get_generate_3d_job(job_id: str, email: str = Depends(verify_token)):
+    """Job record: status, current stage, outputs, per-stage timings and cache hits"""
+    job = await get_model3d_job(job_id, email)
+    if not job:
+        raise HTTPException(status_code=404, detail="3D job not found")
+    if job.get("status") == "queued":
+        job["position"] = model3d_queue.position(job_id)
+        job["eta_seconds"] = model3d_queue.eta(job_id)
+    return job
+
+
+@router.get("/generate-3d/jobs/{job_id}/lods")
+async def get_generate_3d_lods(job_id: str, email: str = Depends(verify_token)):
+    """LOD manifest of a finished job: `levels` coarse to fine (url, bytes,
+    triangles, texture_size, processing_ms) plus the `original` GLB, so a
+    viewer can show `levels[0]` first and refine"""
+    job = await get_model3d_job(job_id, email)
+    if not job:
+        raise HTTPException(status_code=404, detail="3D job not found")
+    if not job.get("lods"):
+        raise HTTPException(status_code=404, detail="No levels of detail for this job")
+    return job["lods"]
+
+
+@router.get("/generate-3d/jobs/{job_id}/events")
+async def get_generate_3d_job_events(job_id: str, email: str = Depends(verify_token)):
+    """Follow a 3D job as Server-Sent Events.
+
+    Events are named after the stage: `queued`, `waiting_session`,
+    `session`, `generating` and `extracting` (with upstream rank/ETA/
+    progress), `optimizing` (LOD build), then `done` with the assets, LOD
+    manifest, timings and cached stages, or `failed` with the error.
+    """
+    job = await get_model3d_job(job_id, email)
+    if not job:
+        raise HTTPException(status_code=404, detail="3D job not found")
+
+    async def stream():
+        if job.get("status") in ("done", "failed") and not model3d_progress.last(job_id):
+            # finished before we subscribed (or handled by another process)
+            yield sse_event({
+                "stage": job["status"], "job_id": job_id, "video_preview": job.get("video_preview"),
+                "glb_url": job.get("glb_url"), "lods": job.get("lods"), "error": job.get("error"),
+                "timings_ms": job.get("timings_ms"), "cached_stages": job.get("cached_stages"),
+            })
+            return
+        async for event in model3d_progress.subscribe(job_id, timeout=MODEL3D_EVENTS_KEEPALIVE_SECONDS):
+            yield SSE_KEEPALIVE if event is None else sse_event(event)
 
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
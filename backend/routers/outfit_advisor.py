@@ -1,16 +1,36 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from routers.auth import verify_token
 from dotenv import load_dotenv
 import os
-import requests
+import asyncio
+import functools
+import hashlib
 import json
 import re
-from typing import Optional, List
-import cloudinary.uploader
-from cloudinary_config import get_outfit_advisor_folder
-from models.schemas import OutfitAdvisorRequest, OutfitAdvisorResponse, OutfitAdvisorDBResponse
-from models.database_ops import create_outfit_advice, get_user_outfit_advice, get_outfit_advice_by_id, delete_outfit_advice
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, List
+
+import httpx
+from storage import upload_media
+from cloudinary_config import get_outfit_advisor_folder, image_asset_identity
+from models.schemas import (
+    OutfitAdvisorRequest, OutfitAdvisorResponse, OutfitAdvisorDBResponse, OutfitAdvisorBatchRequest
+)
+from models.database_ops import (
+    create_outfit_advice, get_user_outfit_advice, get_outfit_advice_by_id, delete_outfit_advice,
+    find_cached_outfit_advice, create_outfit_advice_many, get_wardrobe_items_by_ids, get_user_wardrobe_items
+)
+from utils.cache import LRUCache
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.json_stream import JsonFieldStream
+from utils.progress import ProgressBroker, sse_event, SSE_KEEPALIVE
+from utils.rate_limit import RateLimiter
+from utils.upload_ingest import ALLOWED_IMAGE_MIME_TYPES, read_upload
+from utils.upstreams import upstreams
 
 load_dotenv()
 
@@ -20,11 +40,79 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_BASE = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemma-3-4b-it:free")
 OPENROUTER_FALLBACK_MODEL = os.getenv("OPENROUTER_FALLBACK_MODEL", "gpt-4o-mini")
+OPENROUTER_TIMEOUT_SECONDS = float(os.getenv("OPENROUTER_TIMEOUT_SECONDS", "30"))
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+# the fallback model is asked too once the primary has not answered after this long
+OPENROUTER_HEDGE_DELAY_SECONDS = float(os.getenv("OPENROUTER_HEDGE_DELAY_SECONDS", "4"))
+# identical analyses (same fields, image and models) reuse a stored result this long; 0 disables
+OUTFIT_ADVICE_CACHE_TTL_SECONDS = int(os.getenv("OUTFIT_ADVICE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Wardrobe-wide evaluation packs several items into one completion request:
+# at most OUTFIT_BATCH_ITEMS_PER_REQUEST items and OUTFIT_BATCH_TOKEN_BUDGET
+# estimated prompt + answer tokens per request.  Requests from all batch jobs
+# share OUTFIT_BATCH_CONCURRENCY slots and OUTFIT_BATCH_REQUESTS_PER_MINUTE.
+OUTFIT_BATCH_MAX_ITEMS = int(os.getenv("OUTFIT_BATCH_MAX_ITEMS", "200"))
+OUTFIT_BATCH_ITEMS_PER_REQUEST = int(os.getenv("OUTFIT_BATCH_ITEMS_PER_REQUEST", "8"))
+OUTFIT_BATCH_TOKEN_BUDGET = int(os.getenv("OUTFIT_BATCH_TOKEN_BUDGET", "6000"))
+OUTFIT_BATCH_CONCURRENCY = int(os.getenv("OUTFIT_BATCH_CONCURRENCY", "4"))
+OUTFIT_BATCH_REQUESTS_PER_MINUTE = float(os.getenv("OUTFIT_BATCH_REQUESTS_PER_MINUTE", "20"))
+# answer tokens reserved per item, and the rough prompt cost of one attached image
+OUTFIT_BATCH_ANSWER_TOKENS = 300
+OUTFIT_BATCH_IMAGE_TOKENS = 300
+OUTFIT_BATCH_JOB_TTL_SECONDS = 3600
+OUTFIT_BATCH_EVENTS_KEEPALIVE_SECONDS = 15.0
 
 if not OPENROUTER_API_KEY:
     raise ValueError("Missing OPENROUTER_API_KEY in environment")
 
 
+def _openrouter_client():
+    return httpx.AsyncClient(
+        base_url=OPENROUTER_BASE,
+        headers={
+            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "Content-Type": "application/json",
+        },
+        timeout=httpx.Timeout(OPENROUTER_TIMEOUT_SECONDS, connect=10),
+        limits=httpx.Limits(
+            max_connections=OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENROUTER_MAX_CONNECTIONS,
+        ),
+    )
+
+
+async def _warm_openrouter(client):
+    # open the TLS connection so the first advice request skips the handshake
+    await client.head("/", timeout=10)
+
+
+async def _close_openrouter(client):
+    await client.aclose()
+
+
+upstreams.register("openrouter", _openrouter_client, _warm_openrouter, _close_openrouter)
+
+_provider_counters = {
+    "requests": 0, "primary_wins": 0, "fallback_wins": 0, "hedges_fired": 0, "failures": 0,
+}
+_provider_latencies: List[float] = []
+
+ADVICE_FIELDS = ("suitability_score", "recommendation", "explanation", "improvement_suggestions", "better_outfit_idea")
+# cache_key -> advice fields, in front of the outfit_advisors collection
+_advice_cache = LRUCache(maxsize=1024, ttl=OUTFIT_ADVICE_CACHE_TTL_SECONDS)
+_advice_counters = {"lookups": 0, "memory_hits": 0, "db_hits": 0}
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# batch jobs live in memory; their results end up in outfit_advisors (with `batch_id`)
+advice_batch_queue = JobQueue("outfit-advisor-batch", workers=2, max_queued=20)
+advice_batch_progress = ProgressBroker(keep_seconds=OUTFIT_BATCH_JOB_TTL_SECONDS)
+_batch_jobs = LRUCache(maxsize=256, ttl=OUTFIT_BATCH_JOB_TTL_SECONDS)
+_batch_slots = asyncio.Semaphore(OUTFIT_BATCH_CONCURRENCY)
+_batch_rate = RateLimiter(OUTFIT_BATCH_REQUESTS_PER_MINUTE, burst=OUTFIT_BATCH_CONCURRENCY)
+_batch_counters = {"jobs": 0, "items": 0, "cached_items": 0, "requests": 0, "single_retries": 0}
+
+
 def _extract_text_from_choice(choice: dict) -> Optional[str]:
     # OpenRouter can return 'message.content' as an array of parts or as text
     msg = choice.get("message") or {}
@@ -69,6 +157,275 @@ def _parse_json_from_text(text: str) -> Optional[dict]:
     return None
 
 
+class ProviderError(Exception):
+    """OpenRouter answered with an error status (or not at all)"""
+
+    def __init__(self, details: Any):
+        super().__init__(str(details))
+        self.details = details
+
+
+async def _call_provider(model_name: str, request_body: dict) -> dict:
+    """POST one chat completion; returns the response JSON or raises ProviderError"""
+    print(f"[outfit-advisor] calling provider model={model_name}")
+    try:
+        resp = await upstreams.get("openrouter").post("/chat/completions", json={**request_body, "model": model_name})
+    except httpx.HTTPError as ex:
+        print(f"[outfit-advisor] provider call exception: {ex}")
+        raise ProviderError({"error": str(ex) or type(ex).__name__})
+    if resp.status_code != 200:
+        try:
+            details = resp.json()
+        except Exception:
+            details = resp.text
+        print(f"[outfit-advisor] provider returned error ({model_name}): {details}")
+        raise ProviderError(details)
+    try:
+        data = resp.json()
+    except ValueError as ex:
+        # truncated or non-JSON body: treat like any other failed attempt
+        print(f"[outfit-advisor] provider returned an unreadable body ({model_name}): {ex}")
+        raise ProviderError({"error": "invalid JSON from provider", "body": resp.text[:200]})
+    if not isinstance(data, dict):
+        raise ProviderError({"error": "unexpected response from provider", "body": resp.text[:200]})
+    return data
+
+
+def _parse_completion(data: dict) -> Optional[dict]:
+    choices = data.get("choices") or []
+    assistant_text = _extract_text_from_choice(choices[0]) if choices else None
+    parsed = _parse_json_from_text(assistant_text or "")
+    return parsed if isinstance(parsed, dict) else None
+
+
+async def _with_inline_retry(call, model_name: str, body: dict, retry_body: dict):
+    try:
+        return await call(model_name, body)
+    except ProviderError:
+        # some providers reject image parts or developer instructions: retry
+        # with the image URL inlined in the text
+        return await call(model_name, retry_body)
+
+
+async def _hedged(call, body: dict, retry_body: dict,
+                  accept: Callable[[Any], bool], discard: Optional[Callable[[Any], Awaitable[Any]]] = None):
+    """Run `call` on the primary model, hedged by the fallback model; returns (model, result).
+
+    The fallback call starts once the primary (including its inlined-image
+    retry) has failed or given an unacceptable result, or has not finished
+    within OPENROUTER_HEDGE_DELAY_SECONDS.  The first result that `accept`s
+    wins and the other call is cancelled; results that are not used are
+    passed to `discard`.  If nothing is accepted the first successful result
+    is returned.  Raises ProviderError when both calls fail.
+    """
+    _provider_counters["requests"] += 1
+    primary_failed = asyncio.Event()
+
+    async def fallback_attempt():
+        try:
+            await asyncio.wait_for(primary_failed.wait(), OPENROUTER_HEDGE_DELAY_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _provider_counters["hedges_fired"] += 1
+        print(f"[outfit-advisor] hedging with fallback model={OPENROUTER_FALLBACK_MODEL}")
+        return await call(OPENROUTER_FALLBACK_MODEL, body)
+
+    primary = asyncio.create_task(_with_inline_retry(call, OPENROUTER_MODEL, body, retry_body))
+    attempts = {primary: ("primary", OPENROUTER_MODEL)}
+    if OPENROUTER_FALLBACK_MODEL and OPENROUTER_FALLBACK_MODEL != OPENROUTER_MODEL:
+        attempts[asyncio.create_task(fallback_attempt())] = ("fallback", OPENROUTER_FALLBACK_MODEL)
+
+    pending = set(attempts)
+    winner = None
+    unaccepted = []
+    error = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    result = task.result()
+                except ProviderError as e:
+                    error = e
+                else:
+                    if winner is None and accept(result):
+                        winner = (task, result)
+                        continue
+                    unaccepted.append((task, result))
+                if task is primary:
+                    # no valid answer from the primary: stop waiting out the hedge delay
+                    primary_failed.set()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if winner is None and unaccepted:
+        winner = unaccepted.pop(0)
+    if discard is not None:
+        for _, result in unaccepted:
+            await discard(result)
+    if winner is None:
+        _provider_counters["failures"] += 1
+        raise error or ProviderError({"error": "no response from provider"})
+    label, model_name = attempts[winner[0]]
+    _provider_counters[f"{label}_wins"] += 1
+    return model_name, winner[1]
+
+
+async def _request_advice(body: dict, retry_body: dict):
+    """Ask for a complete answer (hedged); returns (response JSON, parsed advice or None).
+
+    The first response whose text parses as JSON wins.
+    """
+    start = time.perf_counter()
+    try:
+        _, data = await _hedged(
+            _call_provider, body, retry_body, accept=lambda data: _parse_completion(data) is not None
+        )
+    finally:
+        _provider_latencies.append(time.perf_counter() - start)
+        del _provider_latencies[:-1000]
+    return data, _parse_completion(data)
+
+
+async def _completion_deltas(resp: httpx.Response) -> AsyncIterator[str]:
+    """Content deltas of a streamed (SSE) chat completion; closes `resp` when done"""
+    try:
+        async for line in resp.aiter_lines():
+            # OpenRouter interleaves ": OPENROUTER PROCESSING" comments
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                raise ProviderError(chunk["error"])
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield text
+    finally:
+        await resp.aclose()
+
+
+async def _stream_provider(model_name: str, request_body: dict):
+    """Start a streamed chat completion; returns (first content delta, iterator of the rest)"""
+    print(f"[outfit-advisor] streaming from provider model={model_name}")
+    client = upstreams.get("openrouter")
+    request = client.build_request(
+        "POST", "/chat/completions", json={**request_body, "model": model_name, "stream": True}
+    )
+    try:
+        resp = await client.send(request, stream=True)
+    except httpx.HTTPError as ex:
+        print(f"[outfit-advisor] provider call exception: {ex}")
+        raise ProviderError({"error": str(ex) or type(ex).__name__})
+    if resp.status_code != 200:
+        try:
+            await resp.aread()
+            try:
+                details = resp.json()
+            except Exception:
+                details = resp.text
+        finally:
+            await resp.aclose()
+        print(f"[outfit-advisor] provider returned error ({model_name}): {details}")
+        raise ProviderError(details)
+    deltas = _completion_deltas(resp)
+    try:
+        first = await anext(deltas, None)
+    except httpx.HTTPError as ex:
+        await deltas.aclose()
+        raise ProviderError({"error": str(ex) or type(ex).__name__})
+    except BaseException:
+        await deltas.aclose()
+        raise
+    if first is None:
+        raise ProviderError({"error": "empty completion"})
+    return first, deltas
+
+
+async def _open_advice_stream(body: dict, retry_body: dict):
+    """Start streaming an answer (hedged on time to first token); returns (model, first delta, rest)"""
+
+    async def discard(result):
+        await result[1].aclose()
+
+    model_name, (first, deltas) = await _hedged(
+        _stream_provider, body, retry_body, accept=lambda result: True, discard=discard
+    )
+    return model_name, first, deltas
+
+
+def get_provider_stats() -> Dict[str, Any]:
+    latencies = sorted(_provider_latencies)
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else None
+
+    return {
+        **_provider_counters,
+        "p50_ms": percentile(0.5),
+        "p99_ms": percentile(0.99),
+        "cache": {**_advice_counters, "memory": _advice_cache.stats()},
+        "batch": {**_batch_counters, "rate_limit": _batch_rate.stats()},
+    }
+
+
+def _image_identity(url: str) -> str:
+    """Cache identity of the request image, derived without fetching it.
+
+    Images in our storage are keyed by asset (public id and version); any
+    other URL is identified by the URL itself.  The server never downloads
+    client-supplied URLs to build a cache key.
+    """
+    return image_asset_identity(url) or "url:" + hashlib.sha256(url.encode()).hexdigest()
+
+
+def _normalize_field(value: Optional[str], casefold: bool = True) -> Optional[str]:
+    if value is None:
+        return None
+    value = " ".join(value.split())
+    if casefold:
+        value = value.casefold()
+    return value or None
+
+
+def advice_cache_key(payload: OutfitAdvisorRequest) -> str:
+    """Canonical hash of the request fields, the image identity and the models asked"""
+    fields = payload.model_dump()
+    image_url = fields.pop("image_url", None)
+    canonical = {
+        name: _normalize_field(value, casefold=name != "description")
+        for name, value in fields.items()
+    }
+    canonical["image"] = _image_identity(image_url) if image_url else None
+    canonical["models"] = [OPENROUTER_MODEL, OPENROUTER_FALLBACK_MODEL]
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+async def _lookup_advice(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Stored advice for `cache_key` (memory first, then outfit_advisors) within the TTL"""
+    _advice_counters["lookups"] += 1
+    cached = _advice_cache.get(cache_key)
+    if cached:
+        _advice_counters["memory_hits"] += 1
+        return cached
+    try:
+        since = datetime.utcnow() - timedelta(seconds=OUTFIT_ADVICE_CACHE_TTL_SECONDS)
+        doc = await find_cached_outfit_advice(cache_key, since)
+    except Exception as e:
+        print(f"[outfit-advisor] cache lookup failed: {e}")
+        return None
+    if not doc:
+        return None
+    _advice_counters["db_hits"] += 1
+    cached = {k: doc.get(k) for k in ADVICE_FIELDS}
+    _advice_cache.set(cache_key, cached)
+    return cached
+
+
 # --- apparel CSV helpers (cached, small concise summaries for prompt context) ---
 _APPAREL_CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'utils', 'apparel_only.csv')
 _APPAREL_DATA = None
@@ -151,198 +508,600 @@ def _build_apparel_context(payload: OutfitAdvisorRequest, max_examples: int = 7)
     return f"Items similar to '{payload.outfit_type or 'N/A'}' — {summary}" if summary else None
 
 
+ADVICE_KEY_LINES = [
+    '  - suitability_score: integer between 0 and 100\n',
+    "  - recommendation: either 'recommended' or 'not recommended'\n",
+    "  - explanation: detailed explanation (3-6 sentences) that includes relevant context — mention color/print, fit, likely occasion(s), season/weather suitability, and at least one concrete suggestion or layering idea\n",
+    "  - improvement_suggestions: short suggestions (comma-separated or array)\n",
+    "  - better_outfit_idea: one concise alternative outfit idea\n\n",
+]
+
+
+def _outfit_detail_lines(payload: OutfitAdvisorRequest) -> List[str]:
+    # include provided description + explicit fields
+    lines = []
+    if payload.description:
+        lines.append(f"Description: {payload.description}\n")
+    if payload.outfit_name:
+        lines.append(f"Name: {payload.outfit_name}\n")
+    if payload.outfit_type:
+        lines.append(f"Type: {payload.outfit_type}\n")
+    if payload.outfit_size:
+        lines.append(f"Size: {payload.outfit_size}\n")
+    if payload.outfit_season:
+        lines.append(f"Season: {payload.outfit_season}\n")
+    if payload.outfit_style:
+        lines.append(f"Style: {payload.outfit_style}\n")
+    return lines
+
+
+def _build_request_bodies(payload: OutfitAdvisorRequest):
+    """Chat completion body for `payload`, plus the retry body with the image URL inlined"""
+    # Build a clear instruction for the model (user message only)
+    prompt_lines = [
+        "You are an AI fashion stylist. Evaluate the outfit described below and return ONLY a single valid JSON object (no explanation, no extra keys) with these keys:\n",
+        *ADVICE_KEY_LINES,
+        "Provide only valid JSON.\n\n",
+        "OUTFIT DETAILS:\n",
+        *_outfit_detail_lines(payload),
+    ]
+
+    # Attach apparel dataset context (concise) to help the model use domain data
+    try:
+        apparel_ctx = _build_apparel_context(payload)
+        if apparel_ctx:
+            # insert apparel reference just before the OUTFIT DETAILS section
+            for i, line in enumerate(prompt_lines):
+                if line.strip() == "OUTFIT DETAILS:":
+                    prompt_lines.insert(i, f"REFERENCE DATA: {apparel_ctx}\n\n")
+                    break
+    except Exception as _e:
+        print(f"[outfit-advisor] apparel context error: {_e}")
+
+    prompt = "".join(prompt_lines)
+
+    # Construct messages for OpenRouter
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt}
+            ]
+        }
+    ]
+
+    # If image_url included, send image_url as a separate content part (OpenRouter supports this)
+    if payload.image_url:
+        messages[0]["content"].append({"type": "image_url", "image_url": {"url": payload.image_url}})
+
+    body = {
+        "model": OPENROUTER_MODEL,
+        "messages": messages,
+        "max_tokens": 512,
+        "temperature": 0.2,
+    }
+    # inline the image URL in the text (no image_url content part) for providers that reject it
+    retry_prompt = prompt + (f"\nImage URL: {payload.image_url}" if payload.image_url else "")
+    retry_body = {**body, "messages": [{"role": "user", "content": [{"type": "text", "text": retry_prompt}]}]}
+    return body, retry_body
+
+
+def _normalize_advice(parsed: Optional[dict]) -> Dict[str, Any]:
+    """Map the model's JSON onto ADVICE_FIELDS (missing or unusable values become None)"""
+    result = {field: None for field in ADVICE_FIELDS}
+    if not isinstance(parsed, dict):
+        return result
+
+    # Normalize keys (allow multiple key name variants)
+    def getk(*keys):
+        for k in keys:
+            if k in parsed:
+                return parsed[k]
+        return None
+
+    score = getk("suitability_score", "score")
+    try:
+        if score is not None:
+            result["suitability_score"] = int(score)
+    except Exception:
+        result["suitability_score"] = None
+
+    result["recommendation"] = getk("recommendation", "recommended")
+    result["explanation"] = getk("explanation", "reason", "explain")
+    sugg = getk("improvement_suggestions", "suggestions", "improvement")
+    if isinstance(sugg, list):
+        result["improvement_suggestions"] = ", ".join(map(str, sugg))
+    else:
+        result["improvement_suggestions"] = sugg
+    result["better_outfit_idea"] = getk("better_outfit_idea", "alternative", "better_idea")
+    return result
+
+
+async def _cached_advice(payload: OutfitAdvisorRequest):
+    """(cache key, cached advice or None); the key is None when caching is disabled"""
+    if OUTFIT_ADVICE_CACHE_TTL_SECONDS <= 0:
+        return None, None
+    cache_key = advice_cache_key(payload)
+    cached = await _lookup_advice(cache_key)
+    if cached:
+        print(f"[outfit-advisor] cache hit key={cache_key[:12]}")
+    return cache_key, cached
+
+
+async def _save_advice(email: str, payload: OutfitAdvisorRequest, result: Dict[str, Any], parsed_ok: bool,
+                       cache_key: Optional[str], model: Optional[str] = None) -> Dict[str, Any]:
+    """Remember a fresh answer for identical requests and add it to the user's history.
+
+    Returns `result` with the history record `id` (best-effort: a failed
+    insert is only logged).
+    """
+    result = dict(result)
+    # only well-formed answers are reused for later identical requests
+    if not parsed_ok:
+        cache_key = None
+    elif cache_key:
+        _advice_cache.set(cache_key, dict(result))
+
+    # Persist result to DB for the authenticated user (best-effort)
+    try:
+        request_data = payload.model_dump() if hasattr(payload, 'model_dump') else payload.__dict__
+        record = await create_outfit_advice(email, request_data, result, cache_key=cache_key, model=model)
+        if record and record.get('id'):
+            result['id'] = record.get('id')
+            print(f"[outfit-advisor] persisted result id={record.get('id')}")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"[outfit-advisor] failed to persist result: {e}")
+        # still return the result to the client
+    return result
+
+
 @router.post("/outfit-advisor/analyze")
 async def analyze_outfit(payload: OutfitAdvisorRequest, email: str = Depends(verify_token)):
     """Call external LLM (via OpenRouter) to evaluate the outfit and return structured JSON.
 
     - Uses only a `user` role message (no developer/system instructions) to avoid provider errors.
-    - If provider returns an error referencing `Developer instruction`, falls back by inlining the image URL into the prompt and retrying.
+    - If the provider returns an error, retries by inlining the image URL into the prompt.
+    - The fallback model is hedged: asked as well once the primary fails or is slow; the first valid JSON answer wins.
     - Parses model text and attempts to extract valid JSON. If parsing fails we do NOT expose raw model output to the client; the endpoint will return only the structured fields (missing values become null).
     """
     try:
-        # Build a clear instruction for the model (user message only)
-        prompt_lines = [
-            "You are an AI fashion stylist. Evaluate the outfit described below and return ONLY a single valid JSON object (no explanation, no extra keys) with these keys:\n",
-            '  - suitability_score: integer between 0 and 100\n',
-            "  - recommendation: either 'recommended' or 'not recommended'\n",
-            "  - explanation: detailed explanation (3-6 sentences) that includes relevant context — mention color/print, fit, likely occasion(s), season/weather suitability, and at least one concrete suggestion or layering idea\n",
-            "  - improvement_suggestions: short suggestions (comma-separated or array)\n",
-            "  - better_outfit_idea: one concise alternative outfit idea\n\n",
-            "Provide only valid JSON.\n\n",
-            "OUTFIT DETAILS:\n",
-        ]
-
-        # include provided description + explicit fields
-        if payload.description:
-            prompt_lines.append(f"Description: {payload.description}\n")
-        if payload.outfit_name:
-            prompt_lines.append(f"Name: {payload.outfit_name}\n")
-        if payload.outfit_type:
-            prompt_lines.append(f"Type: {payload.outfit_type}\n")
-        if payload.outfit_size:
-            prompt_lines.append(f"Size: {payload.outfit_size}\n")
-        if payload.outfit_season:
-            prompt_lines.append(f"Season: {payload.outfit_season}\n")
-        if payload.outfit_style:
-            prompt_lines.append(f"Style: {payload.outfit_style}\n")
-
-        # Attach apparel dataset context (concise) to help the model use domain data
+        cache_key, cached = await _cached_advice(payload)
+        if cached:
+            # the user's history still gets its own record
+            return JSONResponse(content=await _save_advice(email, payload, cached, True, cache_key))
+
+        body, retry_body = _build_request_bodies(payload)
         try:
-            apparel_ctx = _build_apparel_context(payload)
-            if apparel_ctx:
-                # insert apparel reference just before the OUTFIT DETAILS section
-                for i, line in enumerate(prompt_lines):
-                    if line.strip() == "OUTFIT DETAILS:":
-                        prompt_lines.insert(i, f"REFERENCE DATA: {apparel_ctx}\n\n")
-                        break
-        except Exception as _e:
-            print(f"[outfit-advisor] apparel context error: {_e}")
-
-        prompt = "".join(prompt_lines)
-
-        # Construct messages for OpenRouter
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt}
-                ]
-            }
-        ]
-
-        # If image_url included, send image_url as a separate content part (OpenRouter supports this)
-        if payload.image_url:
-            messages[0]["content"].append({"type": "image_url", "image_url": {"url": payload.image_url}})
+            data, parsed = await _request_advice(body, retry_body)
+        except ProviderError as e:
+            print(f"[outfit-advisor] final provider error: {e.details}")
+            raise HTTPException(status_code=502, detail={"provider_error": e.details})
 
-        body = {
-            "model": OPENROUTER_MODEL,
-            "messages": messages,
-            "max_tokens": 512,
-            "temperature": 0.2,
-        }
+        result = await _save_advice(
+            email, payload, _normalize_advice(parsed), parsed is not None, cache_key, data.get("model")
+        )
+        return JSONResponse(content=result)
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Unexpected error
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Helper to call OpenRouter and return Response
-        def call_provider(model_name, request_body):
-            try:
-                print(f"[outfit-advisor] calling provider model={model_name}")
-                return requests.post(f"{OPENROUTER_BASE}/chat/completions", headers=headers, json=request_body, timeout=30)
-            except Exception as ex:
-                print(f"[outfit-advisor] provider call exception: {ex}")
-                raise
-
-        # Primary request (try configured model first)
-        body["model"] = OPENROUTER_MODEL
-        resp = call_provider(OPENROUTER_MODEL, body)
-
-        # If provider complains about developer instruction (some GEMMA variants) or rejects image parts,
-        # retry by inlining the image URL (text-only content) and — if still failing — try a fallback model.
-        def _is_dev_instruction_error(text):
-            if not text:
-                return False
-            return any(sub in text.lower() for sub in ["developer instruction", "is not enabled", "developer instructions are not enabled"])
-
-        if resp.status_code >= 400:
-            # check for developer-instruction-like error
+
+@router.post("/outfit-advisor/analyze/stream")
+async def analyze_outfit_stream(payload: OutfitAdvisorRequest, email: str = Depends(verify_token)):
+    """Same analysis as POST /outfit-advisor/analyze, streamed as Server-Sent Events.
+
+    The completion is requested with `stream: true` and parsed as it arrives:
+    `generating` (with the answering `model`) once tokens flow, one `field`
+    event (`{field, value}`) per advice field as soon as its JSON value is
+    complete, then `done` with the full result and history record `id` (saved
+    once the stream has finished), or `failed`.  Cached answers are replayed
+    the same way.
+    """
+    async def stream():
+        try:
+            cache_key, cached = await _cached_advice(payload)
+            if cached:
+                for field in ADVICE_FIELDS:
+                    yield sse_event({"stage": "field", "field": field, "value": cached.get(field)})
+                result = await _save_advice(email, payload, cached, True, cache_key)
+                yield sse_event({"stage": "done", "cached": True, **result})
+                return
+
+            body, retry_body = _build_request_bodies(payload)
             try:
-                err = resp.json()
-                err_msg = json.dumps(err)
-            except Exception:
-                err_msg = resp.text
-            print(f"[outfit-advisor] provider returned error: {err_msg}")
+                model, first_text, deltas = await _open_advice_stream(body, retry_body)
+            except ProviderError as e:
+                print(f"[outfit-advisor] final provider error: {e.details}")
+                yield sse_event({"stage": "failed", "error": {"provider_error": e.details}, "status_code": 502})
+                return
+            yield sse_event({"stage": "generating", "model": model})
 
-            # retry 1: inline image URL in the text (avoid image_url content part)
-            retry_prompt = prompt + (f"\nImage URL: {payload.image_url}" if payload.image_url else "")
-            retry_body = {"model": OPENROUTER_MODEL, "messages": [{"role": "user", "content": [{"type": "text", "text": retry_prompt}]}], "max_tokens": 512, "temperature": 0.2}
+            fields = JsonFieldStream()
+            emitted = set()
+            text = first_text
+            pieces = [first_text]
             try:
-                resp = call_provider(OPENROUTER_MODEL, retry_body)
-            except Exception:
-                resp = None
+                while True:
+                    for key, value in fields.feed(text):
+                        for field, normalized in _normalize_advice({key: value}).items():
+                            if normalized is not None and field not in emitted:
+                                emitted.add(field)
+                                yield sse_event({"stage": "field", "field": field, "value": normalized})
+                    text = await anext(deltas, None)
+                    if text is None:
+                        break
+                    pieces.append(text)
+            except (httpx.HTTPError, ProviderError) as e:
+                details = e.details if isinstance(e, ProviderError) else str(e)
+                yield sse_event({"stage": "failed", "error": {"provider_error": details}, "status_code": 502})
+                return
+            finally:
+                await deltas.aclose()
 
-        # If still failing and fallback model is different, try fallback
-        if (not resp) or resp.status_code >= 400:
-            if OPENROUTER_FALLBACK_MODEL and OPENROUTER_FALLBACK_MODEL != OPENROUTER_MODEL:
-                print(f"[outfit-advisor] retrying with fallback model={OPENROUTER_FALLBACK_MODEL}")
-                body["model"] = OPENROUTER_FALLBACK_MODEL
-                try:
-                    resp = call_provider(OPENROUTER_FALLBACK_MODEL, body)
-                except Exception:
-                    resp = None
+            parsed = _parse_json_from_text("".join(pieces))
+            if not isinstance(parsed, dict):
+                parsed = None
+            result = await _save_advice(email, payload, _normalize_advice(parsed), parsed is not None, cache_key, model)
+            yield sse_event({"stage": "done", "cached": False, **result})
+        except Exception as e:
+            print(f"[outfit-advisor] stream failed: {e}")
+            yield sse_event({"stage": "failed", "error": str(e), "status_code": 500})
 
-        if (not resp) or resp.status_code != 200:
-            try:
-                details = resp.json() if resp else {"error": "no response from provider"}
-            except Exception:
-                details = resp.text if resp else "no response from provider"
-            print(f"[outfit-advisor] final provider error: {details}")
-            raise HTTPException(status_code=502, detail={"provider_error": details})
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
-        data = resp.json()
-        # Extract assistant text
-        assistant_text = None
-        choices = data.get("choices") or []
-        if choices:
-            assistant_text = _extract_text_from_choice(choices[0])
-
-        parsed = _parse_json_from_text(assistant_text or "")
-
-        result = {
-            "suitability_score": None,
-            "recommendation": None,
-            "explanation": None,
-            "improvement_suggestions": None,
-            "better_outfit_idea": None,
-        }
 
-        if isinstance(parsed, dict):
-            # Normalize keys (allow multiple key name variants)
-            def getk(*keys):
-                for k in keys:
-                    if k in parsed:
-                        return parsed[k]
-                return None
+# --- wardrobe-wide batch evaluation ---
+_BATCH_PROMPT_HEAD = (
+    "You are an AI fashion stylist. Evaluate each wardrobe item listed below and return ONLY a single valid JSON "
+    'object of the form {"results": [...]} (no explanation, no extra keys) with one entry per item, each with these keys:\n'
+    "  - item: the item number shown below\n"
+)
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; only used to size packed requests
+    return len(text) // 4 + 1
+
+
+def _wardrobe_item_request(item) -> OutfitAdvisorRequest:
+    """The single-analysis request equivalent to a wardrobe item (same fields, same cache key)"""
+    details = ", ".join(value for value in (item.color, item.brand) if value)
+    return OutfitAdvisorRequest(
+        description=f"{item.name} ({details})" if details else item.name,
+        outfit_name=item.name,
+        outfit_type=item.garment_type.value,
+        outfit_size=item.size,
+        outfit_season=item.season.value if item.season else None,
+        outfit_style=item.style.value if item.style else None,
+        image_url=item.image_url,
+    )
+
+
+def _pack_items(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group entries into completion requests within the item and token limits.
+
+    Entries with the same reference data are packed together so it is
+    included once per request.
+    """
+    base_tokens = _estimate_tokens(_BATCH_PROMPT_HEAD + "".join(ADVICE_KEY_LINES))
+    packs: List[List[Dict[str, Any]]] = []
+    pack: List[Dict[str, Any]] = []
+    tokens = base_tokens
+    for entry in sorted(entries, key=lambda e: e["context"] or ""):
+        new_context = entry["context"] and all(e["context"] != entry["context"] for e in pack)
+        cost = entry["tokens"] + (_estimate_tokens(entry["context"]) if new_context else 0)
+        if pack and (len(pack) >= OUTFIT_BATCH_ITEMS_PER_REQUEST or tokens + cost > OUTFIT_BATCH_TOKEN_BUDGET):
+            packs.append(pack)
+            pack = []
+            tokens = base_tokens
+            cost = entry["tokens"] + (_estimate_tokens(entry["context"]) if entry["context"] else 0)
+        pack.append(entry)
+        tokens += cost
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def _build_batch_bodies(pack: List[Dict[str, Any]]):
+    """Chat completion body evaluating every entry of `pack` (numbered from 1), plus the retry body with image URLs inlined"""
+    head = [_BATCH_PROMPT_HEAD, *ADVICE_KEY_LINES, "Provide only valid JSON.\n\n"]
+    for context in dict.fromkeys(entry["context"] for entry in pack if entry["context"]):
+        head.append(f"REFERENCE DATA: {context}\n")
+    head.append("\nITEMS:\n")
+
+    prompt_lines = list(head)
+    retry_lines = list(head)
+    image_parts = []
+    for number, entry in enumerate(pack, 1):
+        payload = entry["payload"]
+        section = [f"\nItem {number}:\n", *_outfit_detail_lines(payload)]
+        prompt_lines += section
+        retry_lines += section
+        if payload.image_url:
+            retry_lines.append(f"Image URL: {payload.image_url}\n")
+            image_parts.append({"type": "text", "text": f"Image of item {number}:"})
+            image_parts.append({"type": "image_url", "image_url": {"url": payload.image_url}})
+
+    body = {
+        "model": OPENROUTER_MODEL,
+        "messages": [{
+            "role": "user",
+            "content": [{"type": "text", "text": "".join(prompt_lines)}, *image_parts],
+        }],
+        "max_tokens": OUTFIT_BATCH_ANSWER_TOKENS * len(pack),
+        "temperature": 0.2,
+    }
+    retry_body = {**body, "messages": [{"role": "user", "content": [{"type": "text", "text": "".join(retry_lines)}]}]}
+    return body, retry_body
 
-            score = getk("suitability_score", "score")
-            try:
-                if score is not None:
-                    result["suitability_score"] = int(score)
-            except Exception:
-                result["suitability_score"] = None
 
-            result["recommendation"] = getk("recommendation", "recommended")
-            result["explanation"] = getk("explanation", "reason", "explain")
-            sugg = getk("improvement_suggestions", "suggestions", "improvement")
-            if isinstance(sugg, list):
-                result["improvement_suggestions"] = ", ".join(map(str, sugg))
+def _pack_answers(parsed: Optional[dict], size: int) -> Dict[int, dict]:
+    """Item number -> that item's answer in a packed completion"""
+    if not isinstance(parsed, dict):
+        return {}
+    results = parsed.get("results")
+    if not isinstance(results, list):
+        # a single item may come back as a bare answer
+        return {1: parsed} if size == 1 else {}
+    answers = {}
+    for position, answer in enumerate(results, 1):
+        if not isinstance(answer, dict):
+            continue
+        try:
+            number = int(answer.get("item", position))
+        except (TypeError, ValueError):
+            number = position
+        if 1 <= number <= size:
+            answers.setdefault(number, answer)
+    return answers
+
+
+def _publish_batch(job: Dict[str, Any], stage: str, **fields):
+    advice_batch_progress.publish(job["job_id"], {"stage": stage, "job_id": job["job_id"], **fields})
+
+
+async def _run_advice_batch(job: Dict[str, Any], items: list, missing_ids: List[str]):
+    """Evaluate a batch job's wardrobe items; publishes one `item` event per item as it finishes"""
+    email = job["email"]
+    started = time.perf_counter()
+    records = []
+    job["status"] = "running"
+
+    def finish_item(entry, result, record=None):
+        job["results"].append(result)
+        job["completed"] += 1
+        if result["status"] == "failed":
+            job["failed"] += 1
+        if result.get("cached"):
+            job["cached"] += 1
+        if record is not None:
+            records.append((entry["item_id"], {
+                **record, "request_data": entry["payload"].model_dump(),
+                "batch_id": job["job_id"], "wardrobe_item_id": entry["item_id"],
+            }))
+        _publish_batch(job, "item", **result, completed=job["completed"], total=job["total"])
+
+    def finish_answer(entry, answer, model=None):
+        result = _normalize_advice(answer)
+        # only well-formed answers are reused for later identical requests
+        cache_key = entry["cache_key"] if answer is not None else None
+        if cache_key:
+            _advice_cache.set(cache_key, dict(result))
+        finish_item(
+            entry, {"item_id": entry["item_id"], "name": entry["name"], "status": "done", "cached": False, **result},
+            {"result_data": result, "cache_key": cache_key, "model": model},
+        )
+
+    def fail_entry(entry, error):
+        finish_item(entry, {"item_id": entry["item_id"], "name": entry["name"], "status": "failed", "error": error})
+
+    async def run_pack(pack):
+        body, retry_body = _build_batch_bodies(pack)
+        try:
+            async with _batch_slots:
+                await _batch_rate.acquire()
+                _batch_counters["requests"] += 1
+                data, parsed = await _request_advice(body, retry_body)
+        except ProviderError as e:
+            print(f"[outfit-advisor] batch request failed: {e.details}")
+            for entry in pack:
+                fail_entry(entry, {"provider_error": e.details})
+            return
+        except Exception as e:
+            for entry in pack:
+                fail_entry(entry, str(e))
+            return
+
+        answers = _pack_answers(parsed, len(pack))
+        unanswered = []
+        for number, entry in enumerate(pack, 1):
+            if number not in answers and len(pack) > 1:
+                unanswered.append(entry)
             else:
-                result["improvement_suggestions"] = sugg
-            result["better_outfit_idea"] = getk("better_outfit_idea", "alternative", "better_idea")
+                finish_answer(entry, answers.get(number), data.get("model"))
+        if unanswered:
+            # items the packed answer left out are asked for on their own
+            _batch_counters["single_retries"] += len(unanswered)
+            await asyncio.gather(*[run_pack([entry]) for entry in unanswered])
 
-        # Persist result to DB for the authenticated user (best-effort)
+    try:
+        for item_id in missing_ids:
+            fail_entry({"item_id": item_id, "name": None}, "Wardrobe item not found")
+
+        contexts = {}
+        entries = []
+        for item in items:
+            payload = _wardrobe_item_request(item)
+            # the apparel summary only depends on type and season: build it once per pair
+            context_key = (payload.outfit_type, payload.outfit_season)
+            if context_key not in contexts:
+                try:
+                    contexts[context_key] = _build_apparel_context(payload)
+                except Exception as e:
+                    print(f"[outfit-advisor] apparel context error: {e}")
+                    contexts[context_key] = None
+            section = "".join(_outfit_detail_lines(payload))
+            entries.append({
+                "item_id": item.id, "name": item.name, "payload": payload, "context": contexts[context_key],
+                "tokens": _estimate_tokens(section) + OUTFIT_BATCH_ANSWER_TOKENS
+                          + (OUTFIT_BATCH_IMAGE_TOKENS if payload.image_url else 0),
+                "cache_key": None,
+            })
+
+        lookup_slots = asyncio.Semaphore(OUTFIT_BATCH_CONCURRENCY * 2)
+
+        async def lookup(entry):
+            async with lookup_slots:
+                entry["cache_key"], cached = await _cached_advice(entry["payload"])
+            return cached
+
+        uncached = []
+        for entry, cached in zip(entries, await asyncio.gather(*[lookup(entry) for entry in entries])):
+            if cached:
+                _batch_counters["cached_items"] += 1
+                finish_item(
+                    entry, {"item_id": entry["item_id"], "name": entry["name"], "status": "done", "cached": True, **cached},
+                    {"result_data": cached, "cache_key": entry["cache_key"]},
+                )
+            else:
+                uncached.append(entry)
+
+        packs = _pack_items(uncached)
+        job["requests"] = len(packs)
+        _publish_batch(job, "running", requests=len(packs), completed=job["completed"], total=job["total"])
+        await asyncio.gather(*[run_pack(pack) for pack in packs])
+
+        # every new history record in one round trip
         try:
-            request_data = payload.model_dump() if hasattr(payload, 'model_dump') else payload.__dict__
-            record = await create_outfit_advice(email, request_data, result)
-            if record and record.get('id'):
-                result['id'] = record.get('id')
-                print(f"[outfit-advisor] persisted result id={record.get('id')}")
+            ids = await create_outfit_advice_many(email, [record for _, record in records])
+            job["records"] = {item_id: record_id for (item_id, _), record_id in zip(records, ids)}
         except Exception as e:
-            import traceback
             traceback.print_exc()
-            print(f"[outfit-advisor] failed to persist result: {e}")
-            # still return the result to the client
-            pass
+            print(f"[outfit-advisor] failed to persist batch {job['job_id']}: {e}")
 
-        return JSONResponse(content=result)
+        job["status"] = "done"
+        job["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+        _publish_batch(
+            job, "done", total=job["total"], completed=job["completed"], failed=job["failed"], cached=job["cached"],
+            requests=job["requests"], records=job["records"], elapsed_ms=job["elapsed_ms"],
+        )
+    except Exception as e:
+        traceback.print_exc()
+        job["status"] = "failed"
+        job["error"] = str(e)
+        _publish_batch(job, "failed", error=str(e))
 
-    except HTTPException:
-        raise
+
+def _batch_job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    view = {key: value for key, value in job.items() if key != "email"}
+    if job["status"] == "queued":
+        view["position"] = advice_batch_queue.position(job["job_id"])
+    return view
+
+
+def _get_batch_job(job_id: str, email: str) -> Dict[str, Any]:
+    job = _batch_jobs.get(job_id)
+    if not job or job["email"] != email:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+
+@router.post("/outfit-advisor/batch", status_code=202)
+async def analyze_wardrobe_batch(batch: OutfitAdvisorBatchRequest, email: str = Depends(verify_token)):
+    """Queue an evaluation of many wardrobe items (`item_ids`, or the whole wardrobe when empty).
+
+    Each item is analysed as POST /outfit-advisor/analyze would (cached
+    answers are reused), but several items share one completion request,
+    packed within OUTFIT_BATCH_ITEMS_PER_REQUEST items and
+    OUTFIT_BATCH_TOKEN_BUDGET tokens; requests run concurrently under a
+    shared rate limit.  The results are added to the history with one
+    insert.  Returns `202` with the job id; poll GET /outfit-advisor/batch/{id}
+    or follow GET /outfit-advisor/batch/{id}/events.
+    """
+    item_ids = list(dict.fromkeys(batch.item_ids))
+    if len(item_ids) > OUTFIT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {OUTFIT_BATCH_MAX_ITEMS} items per batch")
+    try:
+        if item_ids:
+            found = {item.id: item for item in await get_wardrobe_items_by_ids(email, item_ids)}
+            items = [found[item_id] for item_id in item_ids if item_id in found]
+            missing_ids = [item_id for item_id in item_ids if item_id not in found]
+        else:
+            items = await get_user_wardrobe_items(email, limit=OUTFIT_BATCH_MAX_ITEMS)
+            missing_ids = []
     except Exception as e:
-        # Unexpected error
         raise HTTPException(status_code=500, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="No wardrobe items to evaluate")
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id, "email": email, "status": "queued", "total": len(items) + len(missing_ids),
+        "completed": 0, "failed": 0, "cached": 0, "requests": None, "results": [], "records": {},
+    }
+    try:
+        advice_batch_queue.submit(job_id, functools.partial(_run_advice_batch, job, items, missing_ids))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Outfit advisor busy: {e}")
+    _batch_jobs.set(job_id, job)
+    _batch_counters["jobs"] += 1
+    _batch_counters["items"] += job["total"]
+    _publish_batch(job, "queued", total=job["total"], position=advice_batch_queue.position(job_id))
+    return {"job_id": job_id, "status": "queued", "total": job["total"]}
+
+
+@router.get("/outfit-advisor/batch/{job_id}")
+async def get_wardrobe_batch(job_id: str, email: str = Depends(verify_token)):
+    """Batch job state: status, counts, per-item results so far and, once done, the history record ids"""
+    return _batch_job_view(_get_batch_job(job_id, email))
+
+
+@router.get("/outfit-advisor/batch/{job_id}/events")
+async def get_wardrobe_batch_events(job_id: str, email: str = Depends(verify_token)):
+    """Follow a batch job as Server-Sent Events.
+
+    `queued`, `running` (with the number of packed requests), one `item`
+    event per wardrobe item as its result arrives (with `completed`/`total`;
+    items finished before connecting are replayed first), then `done` with
+    the counts and `records` (item id -> history record id), or `failed`.
+    """
+    job = _get_batch_job(job_id, email)
+
+    async def stream():
+        events = advice_batch_progress.subscribe(job_id, timeout=OUTFIT_BATCH_EVENTS_KEEPALIVE_SECONDS)
+        try:
+            # subscribing yields the latest event at once; the results taken
+            # right after are exactly those published before it
+            first = await anext(events, None) if advice_batch_progress.last(job_id) else None
+            sent = set()
+            for number, result in enumerate(list(job["results"]), 1):
+                sent.add(result["item_id"])
+                yield sse_event({"stage": "item", "job_id": job_id, **result, "completed": number, "total": job["total"]})
+            if first is None and job["status"] in ("done", "failed"):
+                # progress events expired: finish from the job state
+                yield sse_event({"stage": job["status"], **_batch_job_view(job)})
+                return
+
+            async def following():
+                if first is not None:
+                    yield first
+                async for event in events:
+                    yield event
+
+            async for event in following():
+                if event is None:
+                    yield SSE_KEEPALIVE
+                elif event["stage"] != "item" or event["item_id"] not in sent:
+                    yield sse_event(event)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @router.get("/outfit-advisor", response_model=List[OutfitAdvisorDBResponse])
@@ -392,15 +1151,18 @@ async def delete_outfit_advice_endpoint(record_id: str, email: str = Depends(ver
 async def upload_outfit_image(file: UploadFile = File(...), email: str = Depends(verify_token)):
     """Upload an outfit image to Cloudinary under the outfit_advisor_images folder and return secure URL"""
     try:
-        content = await file.read()
+        content = await read_upload(file, allowed_types=ALLOWED_IMAGE_MIME_TYPES)
         folder = get_outfit_advisor_folder()
-        upload_result = cloudinary.uploader.upload(
+        stem = (file.filename or "").split('.')[0] or hashlib.sha256(content).hexdigest()[:16]
+        upload_result = await upload_media(
             content,
             folder=folder,
-            public_id=f"{email}_{file.filename.split('.')[0]}",
+            public_id=f"{email}_{stem}",
             overwrite=False,
             resource_type='image'
         )
         return JSONResponse({"image_url": upload_result.get('secure_url')})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -1,17 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import List
 import os
-import requests
+import asyncio
+import json
+import httpx
 from urllib.parse import quote
 
 from routers.auth import verify_token
+from cloudinary_config import apply_card_variant, DEFAULT_LIST_VARIANT, IMAGE_VARIANT_PATTERN
 from models.database_ops import get_user_style_feed
-from models.schemas import StyleFeedResponse
+from models.schemas import StyleFeedResponse, StyleImageBatchRequest
+from utils.cache import LRUCache, SingleFlight
+from utils.upstreams import upstreams
 
 router = APIRouter()
 
 # Pollinations image generation support moved here
 POLLINATIONS_API_KEY = os.getenv("POLLINATIONS_API_KEY")
+POLLINATIONS_BASE = "https://gen.pollinations.ai"
+STYLE_IMAGE_CACHE_SIZE = int(os.getenv("STYLE_IMAGE_CACHE_SIZE", "1024"))
+STYLE_IMAGE_CACHE_TTL_SECONDS = int(os.getenv("STYLE_IMAGE_CACHE_TTL_SECONDS", "3600"))
+# at most this many image checks are in flight against Pollinations at once
+POLLINATIONS_MAX_CONCURRENCY = int(os.getenv("POLLINATIONS_MAX_CONCURRENCY", "6"))
+STYLE_IMAGE_BATCH_MAX = int(os.getenv("STYLE_IMAGE_BATCH_MAX", "24"))
+
+# (prompt, model) -> validated Pollinations image URL
+_image_cache = LRUCache(maxsize=STYLE_IMAGE_CACHE_SIZE, ttl=STYLE_IMAGE_CACHE_TTL_SECONDS)
+_image_flights = SingleFlight()
+_pollinations_slots = asyncio.Semaphore(POLLINATIONS_MAX_CONCURRENCY)
+
+
+def _pollinations_client():
+    headers = {"Authorization": f"Bearer {POLLINATIONS_API_KEY}"} if POLLINATIONS_API_KEY else None
+    return httpx.AsyncClient(
+        base_url=POLLINATIONS_BASE,
+        headers=headers,
+        timeout=httpx.Timeout(60, connect=10),
+        follow_redirects=True,
+    )
+
+
+async def _warm_pollinations(client):
+    await client.head("/", timeout=10)
+
+
+async def _close_pollinations(client):
+    await client.aclose()
+
+
+# shared with the avatar router
+upstreams.register("pollinations", _pollinations_client, _warm_pollinations, _close_pollinations)
 
 # Valid models accepted by Pollinations (kept in sync with upstream allowed values)
 ALLOWED_MODELS = {
@@ -22,51 +61,133 @@ ALLOWED_MODELS = {
 }
 
 @router.get("/stylefeed", response_model=List[StyleFeedResponse])
-async def list_style_feed(email: str = Depends(verify_token)):
-    """Return all style-feed cards for the authenticated user."""
+async def list_style_feed(
+    variant: str = Query(DEFAULT_LIST_VARIANT, pattern=IMAGE_VARIANT_PATTERN),
+    email: str = Depends(verify_token)
+):
+    """Return all style-feed cards for the authenticated user (display_url is the `variant` rendition of each card image)."""
     try:
         entries = await get_user_style_feed(email)
+        for entry in entries:
+            apply_card_variant(entry.get("card"), variant)
         return entries
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list style feed: {str(e)}")
 
 
+async def _validate_image(url):
+    """Ask Pollinations for the first byte of `url`; returns (status, error text).
+
+    The ranged request makes Pollinations generate (and cache) the image
+    without the proxy downloading it; the stream is closed after one chunk
+    in case the range is ignored.
+    """
+    async with _pollinations_slots:
+        async with upstreams.get("pollinations").stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+            if resp.status_code in (200, 206):
+                async for _ in resp.aiter_bytes():
+                    break
+                return 200, None
+            body = await resp.aread()
+            return resp.status_code, body.decode(errors="replace")
+
+
+def get_image_cache_stats():
+    return {**_image_cache.stats(), **_image_flights.stats()}
+
+
+def _invalid_model_error(model):
+    return {
+        "error": "invalid_model",
+        "message": f"Invalid model '{model}'. Valid models: {', '.join(sorted(ALLOWED_MODELS))}"
+    }
+
+
+async def _resolve_image(prompt, model):
+    """Validated image URL for (prompt, model), from the cache or a ranged check.
+
+    Raises HTTPException with the upstream status and body when Pollinations
+    rejects the prompt.
+    """
+    cache_key = (prompt, model)
+    cached_url = _image_cache.get(cache_key)
+    if cached_url:
+        return {"image_url": cached_url, "status": 200, "model": model, "cached": True}
+
+    encoded = quote(prompt, safe='')
+    encoded_model = quote(model, safe='')
+    # Forward model as query parameter (upstream expects `model`)
+    url = f"{POLLINATIONS_BASE}/image/{encoded}?model={encoded_model}"
+
+    try:
+        status, error = await _image_flights.do(cache_key, lambda: _validate_image(url))
+    except httpx.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(exc)}")
+
+    # Upstream success -> cache and return canonical image URL + model used
+    if status == 200:
+        _image_cache.set(cache_key, url)
+        return {"image_url": url, "status": status, "model": model, "cached": False}
+
+    # Forward upstream error body (already JSON/stringified) to the client
+    raise HTTPException(status_code=status, detail=error or "Upstream error")
+
+
 @router.get('/image/{prompt}')
-def generate_image(prompt: str, model: str = "seedream"):
+async def generate_image(prompt: str, model: str = "seedream"):
     """Proxy endpoint for Pollinations image generation.
 
     - Validates `model` against a known list and forwards it to Pollinations as a
       query parameter (e.g. ?model=flux).
+    - Checks the image with a ranged request (concurrent identical prompts share
+      one check) and caches the validated URL per prompt and model.
     - Returns JSON: { "image_url": <url>, "status": <http-status>, "model": <model> }
     """
     # Validate model early so callers get immediate, clear feedback
     if model not in ALLOWED_MODELS:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "invalid_model",
-                "message": f"Invalid model '{model}'. Valid models: {', '.join(sorted(ALLOWED_MODELS))}"
-            }
-        )
+        raise HTTPException(status_code=400, detail=_invalid_model_error(model))
 
-    try:
-        encoded = quote(prompt, safe='')
-        encoded_model = quote(model, safe='')
-        # Forward model as query parameter (upstream expects `model`)
-        url = f"https://gen.pollinations.ai/image/{encoded}?model={encoded_model}"
+    result = await _resolve_image(prompt, model)
+    result.pop("cached")
+    return result
 
-        headers = {}
-        if POLLINATIONS_API_KEY:
-            headers["Authorization"] = f"Bearer {POLLINATIONS_API_KEY}"
 
-        resp = requests.get(url, headers=headers, timeout=30)
+@router.post('/images/batch')
+async def generate_images_batch(batch: StyleImageBatchRequest):
+    """Resolve many style-feed card images in one request.
 
-    except requests.RequestException as exc:
-        raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(exc)}")
+    Every `(prompt, model)` pair is checked concurrently (at most
+    POLLINATIONS_MAX_CONCURRENCY upstream requests at once) and streamed back as
+    an NDJSON line `{index, prompt, model, image_url, status, cached}` (or
+    `{index, prompt, model, status, error}`) as soon as it is ready.
+    """
+    if not batch.images:
+        raise HTTPException(status_code=400, detail="images must not be empty")
+    if len(batch.images) > STYLE_IMAGE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {STYLE_IMAGE_BATCH_MAX} images per batch")
+    invalid = [
+        {"index": i, **_invalid_model_error(image.model)}
+        for i, image in enumerate(batch.images) if image.model not in ALLOWED_MODELS
+    ]
+    if invalid:
+        raise HTTPException(status_code=400, detail=invalid)
 
-    # Upstream success -> return canonical image URL + model used
-    if resp.status_code == 200:
-        return {"image_url": url, "status": resp.status_code, "model": model}
+    async def resolve_line(index, image):
+        line = {"index": index, "prompt": image.prompt}
+        try:
+            return {**line, **await _resolve_image(image.prompt, image.model)}
+        except HTTPException as e:
+            return {**line, "model": image.model, "status": e.status_code, "error": e.detail}
+        except Exception as e:
+            return {**line, "model": image.model, "status": 500, "error": str(e)}
 
-    # Forward upstream error body (already JSON/stringified) to the client
-    raise HTTPException(status_code=resp.status_code, detail=resp.text or "Upstream error")
+    async def stream():
+        tasks = [asyncio.create_task(resolve_line(i, image)) for i, image in enumerate(batch.images)]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,24 +1,36 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
-from utils.base64_helpers import array_buffer_to_base64
 from dotenv import load_dotenv
 import os
-import cloudinary.uploader
-from gradio_client import Client, handle_file
-from gradio_client.exceptions import AppError
+import asyncio
+import functools
+import hashlib
+import json
+from storage import upload_media, is_stored_media_url
 import httpx
-import tempfile
 import traceback
 import base64
 from routers.auth import verify_token
-from cloudinary_config import get_tryon_image_folder
+from cloudinary_config import (
+    get_tryon_image_folder, pick_image_variant, original_image_url, DEFAULT_LIST_VARIANT, IMAGE_VARIANT_PATTERN
+)
+from utils.image_pipeline import normalize_image
+from utils.upload_ingest import ALLOWED_IMAGE_MIME_TYPES, read_upload
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.gradio_pool import GradioPool
+from utils.gradio_async import GradioFile, GradioAppError
+from utils.upstreams import upstreams
+from utils.speculative import SpeculativeScheduler
+from utils.progress import ProgressBroker, sse_event, SSE_KEEPALIVE
+from utils.cache import LRUCache
 from models.schemas import (
     TryOnSessionCreate, TryOnSessionResponse, SuccessResponse
 )
 from models.database_ops import (
-    create_tryon_session, get_tryon_session_by_id, get_user_tryon_sessions,
-    update_tryon_session_result, delete_tryon_session
+    create_tryon_session, get_tryon_session_by_id, get_user_tryon_sessions, get_wardrobe_item_by_id,
+    update_tryon_session_result, update_tryon_session_status, delete_tryon_session,
+    get_tryon_cache_entry, put_tryon_cache_entry, get_user_favorites, get_user_wardrobe_items
 )
 
 load_dotenv()
@@ -26,189 +38,820 @@ load_dotenv()
 router = APIRouter()
 
 GRADIO_TRYON_URL = os.getenv("GRADIO_TRYON_URL", "https://ai-modelscope-kolors-virtual-try-on.ms.fun/")
-# initialize a Gradio client with a generous timeout for uploads
-client = Client(GRADIO_TRYON_URL, httpx_kwargs={"timeout": httpx.Timeout(100)})
+# comma-separated list of interchangeable try-on Spaces; defaults to the single URL above
+GRADIO_TRYON_URLS = [u.strip() for u in os.getenv("GRADIO_TRYON_URLS", GRADIO_TRYON_URL).split(",") if u.strip()]
+GRADIO_MAX_IN_FLIGHT_PER_BACKEND = int(os.getenv("GRADIO_MAX_IN_FLIGHT_PER_BACKEND", "2"))
+GRADIO_HEALTH_INTERVAL = float(os.getenv("GRADIO_HEALTH_INTERVAL", "30"))
+# least-loaded routing with failover across the backends (generous timeout for uploads)
+tryon_backends = GradioPool(
+    "tryon",
+    GRADIO_TRYON_URLS,
+    max_in_flight=GRADIO_MAX_IN_FLIGHT_PER_BACKEND,
+    health_interval=GRADIO_HEALTH_INTERVAL,
+    client_kwargs={"timeout": 100},
+)
+# connecting/probing the backends is deferred to the background warm-up
+upstreams.register("gradio-tryon", lambda: tryon_backends, lambda pool: pool.start())
+
+# Try-on generation runs on a bounded worker pool; POST /try-on only enqueues
+TRYON_WORKERS = int(os.getenv("TRYON_WORKERS", "2"))
+TRYON_MAX_QUEUED = int(os.getenv("TRYON_MAX_QUEUED", "50"))
+tryon_queue = JobQueue("tryon", workers=TRYON_WORKERS, max_queued=TRYON_MAX_QUEUED)
+
+# Batch try-on: one person image against many garments
+TRYON_BATCH_MAX_GARMENTS = int(os.getenv("TRYON_BATCH_MAX_GARMENTS", "20"))
+TRYON_BATCH_CONCURRENCY = int(os.getenv("TRYON_BATCH_CONCURRENCY", "4"))
+TRYON_BATCH_MAX_CONCURRENCY = 8
+
+# Speculative pre-generation (opt-in): after a new person photo, the user's
+# most recent favourite and wardrobe garments are tried on at background
+# priority while the worker pool is idle, so the results are already cached.
+TRYON_PREGENERATE_ENABLED = os.getenv("TRYON_PREGENERATE_ENABLED", "false").lower() == "true"
+TRYON_PREGENERATE_TOP_N = int(os.getenv("TRYON_PREGENERATE_TOP_N", "5"))
+TRYON_PREGENERATE_BUDGET = int(os.getenv("TRYON_PREGENERATE_BUDGET", "10"))
+TRYON_PREGENERATE_WINDOW = int(os.getenv("TRYON_PREGENERATE_WINDOW", "3600"))
+# interactive requests default to seed 0, so their cache keys line up
+TRYON_PREGENERATE_SEED = 0
+tryon_pregenerator = SpeculativeScheduler(
+    "tryon-pregen", tryon_queue,
+    budget=TRYON_PREGENERATE_BUDGET, window_seconds=TRYON_PREGENERATE_WINDOW,
+)
+
+# Progress events for GET /try-on/sessions/{id}/events and POST /try-on/stream
+tryon_progress = ProgressBroker()
+TRYON_EVENTS_POLL_SECONDS = 2.0
+TRYON_EVENTS_KEEPALIVE_SECONDS = 15.0
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _queued_event(session_id):
+    eta = tryon_queue.eta(session_id)
+    return {
+        "stage": "queued",
+        "session_id": session_id,
+        "position": tryon_queue.position(session_id),
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+    }
+
+
+def _publish_queued(session_id):
+    tryon_progress.publish(session_id, _queued_event(session_id))
+
+# Deterministic runs (randomize_seed=False) are cached per user by
+# (email, sha256(person), sha256(cloth), seed): an in-process LRU in front of
+# the `tryon_cache` MongoDB collection.  A hit skips storage and Gradio
+# entirely.  Entries hold the owner's public ids and URLs, so they are never
+# shared between users.
+TRYON_CACHE_SIZE = int(os.getenv("TRYON_CACHE_SIZE", "1024"))
+_result_cache = LRUCache(maxsize=TRYON_CACHE_SIZE)
+_cache_counters = {"lookups": 0, "memory_hits": 0, "db_hits": 0}
+
+
+def _file_stem(filename, sha256):
+    """Public-id stem for an upload: its filename, or the content hash when unnamed"""
+    stem = (filename or "").split('.')[0]
+    return stem or f"img_{sha256[:16]}"
+
+
+def tryon_cache_key(email, person_sha256, cloth_sha256, seed):
+    return f"{email}:{person_sha256}:{cloth_sha256}:{seed}"
+
+
+async def lookup_tryon_cache(cache_key, record_stats=True):
+    """Return the cached result for `cache_key` (memory first, then MongoDB)"""
+    if record_stats:
+        _cache_counters["lookups"] += 1
+    entry = _result_cache.get(cache_key)
+    if entry:
+        if record_stats:
+            _cache_counters["memory_hits"] += 1
+        return entry
+    try:
+        entry = await get_tryon_cache_entry(cache_key)
+    except Exception as e:
+        print(f"[tryon-cache] lookup failed: {e}")
+        entry = None
+    if entry and entry.get("result_image_url"):
+        if record_stats:
+            _cache_counters["db_hits"] += 1
+        _result_cache.set(cache_key, entry)
+        return entry
+    return None
+
+
+async def remember_tryon_result(cache_key, entry):
+    """Store a finished deterministic result in both cache tiers (best-effort)"""
+    _result_cache.set(cache_key, entry)
+    try:
+        await put_tryon_cache_entry(cache_key, entry)
+    except Exception as e:
+        print(f"[tryon-cache] store failed: {e}")
+
+
+def get_tryon_cache_stats():
+    lookups = _cache_counters["lookups"]
+    hits = _cache_counters["memory_hits"] + _cache_counters["db_hits"]
+    return {
+        **_cache_counters,
+        "misses": lookups - hits,
+        "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        "memory": _result_cache.stats(),
+    }
+
+
+async def _store_tryon_output(result, folder, public_id):
+    """Persist the model output in media storage; returns (image_url, text)"""
+    image_url = None
+    text_response = None
+
+    async def _maybe_upload_output(out_val):
+        nonlocal image_url
+        if isinstance(out_val, dict):
+            # file output, already downloaded into memory by the Gradio client
+            out_val = out_val.get("data") or out_val.get("url") or out_val.get("path")
+        if not out_val:
+            return
+        # raw bytes from model
+        if isinstance(out_val, (bytes, bytearray)):
+            try:
+                upload = await upload_media(
+                    out_val,
+                    folder=folder,
+                    public_id=public_id,
+                    overwrite=False,
+                    resource_type="image"
+                )
+                image_url = upload.get("secure_url")
+                return
+            except Exception:
+                pass
+        if isinstance(out_val, str) and os.path.exists(out_val):
+            # the storage backend reads the file from disk itself
+            upload = await upload_media(
+                out_val,
+                folder=folder,
+                public_id=public_id,
+                overwrite=False,
+                resource_type="image"
+            )
+            image_url = upload.get("secure_url")
+        elif isinstance(out_val, str) and out_val.startswith("http"):
+            image_url = out_val
+        elif isinstance(out_val, str) and out_val.startswith("data:"):
+            try:
+                header, b64 = out_val.split(",", 1)
+                data = base64.b64decode(b64)
+                upload = await upload_media(
+                    data,
+                    folder=folder,
+                    public_id=public_id,
+                    overwrite=False,
+                    resource_type="image"
+                )
+                image_url = upload.get("secure_url")
+            except Exception:
+                pass
+
+    if isinstance(result, tuple):
+        result = {"output": result[0], "_tuple": result}
+    elif isinstance(result, dict) and "data" in result:
+        # a single downloaded file output
+        result = {"output": result}
+
+    # Handle various result shapes: dict, tuple/list, raw string path/url, or bytes
+    if isinstance(result, dict):
+        await _maybe_upload_output(result.get("output") or result.get("image") or result.get("image_url"))
+        text_response = result.get("text") or result.get("caption")
+    elif isinstance(result, (list, tuple)):
+        for item in result:
+            await _maybe_upload_output(item)
+    elif isinstance(result, (bytes, bytearray)):
+        await _maybe_upload_output(result)
+    elif isinstance(result, str):
+        await _maybe_upload_output(result)
+
+    return image_url, text_response
+
+
+async def _predict_tryon(person_image, cloth_image, seed, randomize_seed, on_status=None):
+    """Run the try-on model on the least-loaded backend"""
+    try:
+        return await tryon_backends.predict(
+            person_img=person_image,
+            garment_img=cloth_image,
+            seed=seed,
+            randomize_seed=randomize_seed,
+            api_name="/tryon",
+            on_status=on_status,
+        )
+    except GradioAppError as ae:
+        raise RuntimeError(f"External try-on service busy: {ae}")
+
+
+async def _run_tryon_job(session_id, email, person_image, cloth_image, seed, randomize_seed, result_public_id,
+                         cache_key=None, cache_entry=None):
+    """Worker body: call the Gradio model and record the outcome on the session.
 
-@router.post("/try-on")
+    `person_image` and `cloth_image` are in-memory `GradioFile`s.  When
+    `cache_key` is given the result is also stored in the result cache,
+    together with the fields in `cache_entry`.
+    """
+    last_update = {}
+
+    def on_status(update):
+        # forward upstream queue rank / ETA / progress when it changes
+        event = {
+            "stage": "generating",
+            "session_id": session_id,
+            "upstream_status": update.stage,
+            "upstream_rank": update.rank,
+            "upstream_queue_size": update.queue_size,
+            "upstream_eta_seconds": update.eta,
+            "progress": update.progress,
+        }
+        if event != last_update:
+            last_update.clear()
+            last_update.update(event)
+            tryon_progress.publish(session_id, event)
+
+    try:
+        await update_tryon_session_status(session_id, email, "running")
+        tryon_progress.publish(session_id, {"stage": "generating", "session_id": session_id})
+        raw_result = await _predict_tryon(person_image, cloth_image, seed, randomize_seed, on_status)
+
+        tryon_progress.publish(session_id, {"stage": "storing", "session_id": session_id})
+        image_url, text_response = await _store_tryon_output(
+            raw_result, f"{get_tryon_image_folder()}/results", result_public_id
+        )
+        if image_url:
+            await update_tryon_session_result(session_id, email, image_url)
+            await update_tryon_session_status(session_id, email, "done", text=text_response)
+            tryon_progress.publish(session_id, {
+                "stage": "done", "session_id": session_id, "image": image_url, "text": text_response
+            })
+            if cache_key:
+                await remember_tryon_result(cache_key, {
+                    **(cache_entry or {}), "result_image_url": image_url, "text": text_response
+                })
+        else:
+            await update_tryon_session_status(session_id, email, "failed", error="Try-on model returned no image")
+            tryon_progress.publish(session_id, {
+                "stage": "failed", "session_id": session_id, "error": "Try-on model returned no image"
+            })
+    except Exception as e:
+        print(f"Error in try-on job {session_id}: {e}")
+        traceback.print_exc()
+        tryon_progress.publish(session_id, {"stage": "failed", "session_id": session_id, "error": str(e)})
+        await update_tryon_session_status(session_id, email, "failed", error=str(e))
+
+
+async def _pregenerate_tryon(person_file, cloth_file, result_public_id, cache_key, cache_entry):
+    """Speculative job body: like `_run_tryon_job` but without a session"""
+    raw_result = await _predict_tryon(person_file, cloth_file, TRYON_PREGENERATE_SEED, False)
+    image_url, text_response = await _store_tryon_output(
+        raw_result, f"{get_tryon_image_folder()}/results", result_public_id
+    )
+    if not image_url:
+        raise RuntimeError("Try-on model returned no image")
+    await remember_tryon_result(cache_key, {**cache_entry, "result_image_url": image_url, "text": text_response})
+
+
+async def _pregeneration_jobs(email, person_file, person_sha256, person_url, person_stem, limit):
+    """Yield try-on jobs for the user's most recent garments that are not cached yet.
+
+    Garments are the newest wardrobe favourites and wardrobe items (by image
+    URL, de-duplicated).  Each one is fetched and normalised only when the
+    scheduler asks for the next job, i.e. when the worker pool is idle.
+    Favourite cards are client-supplied, so images outside our media storage
+    are skipped rather than fetched.
+    """
+    favorites = await get_user_favorites(email, "wardrobe", limit=limit)
+    items = await get_user_wardrobe_items(email, limit=limit)
+    garments = {}
+    for fav in favorites:
+        item = fav.get("item") or {}
+        if item.get("image_url"):
+            # older favourites may hold a list rendition; try on the original
+            garments.setdefault(original_image_url(item["image_url"]), str(item.get("id") or fav.get("id")))
+    for item in items:
+        if item.image_url:
+            garments.setdefault(item.image_url, item.id)
+
+    async with httpx.AsyncClient(timeout=30) as client_http:
+        for cloth_url, item_id in garments.items():
+            if not is_stored_media_url(cloth_url):
+                print(f"[tryon-pregen] skipping {cloth_url}: not in our media storage")
+                continue
+            try:
+                resp = await client_http.get(cloth_url)
+                resp.raise_for_status()
+                cloth_bytes, cloth_info = await normalize_image(resp.content, "tryon")
+            except Exception as e:
+                print(f"[tryon-pregen] skipping {cloth_url}: {e}")
+                continue
+            cloth_sha256 = hashlib.sha256(cloth_bytes).hexdigest()
+            cache_key = tryon_cache_key(email, person_sha256, cloth_sha256, TRYON_PREGENERATE_SEED)
+            if await lookup_tryon_cache(cache_key, record_stats=False):
+                continue
+            cloth_stem = f"item_{item_id}"
+            yield functools.partial(
+                _pregenerate_tryon, person_file,
+                GradioFile(cloth_bytes, cloth_stem + (cloth_info.get("extension") or ".jpg")),
+                f"{email}_tryon_result_{person_stem}_{cloth_stem}",
+                cache_key, {
+                    "person_sha256": person_sha256,
+                    "cloth_sha256": cloth_sha256,
+                    "seed": TRYON_PREGENERATE_SEED,
+                    "person_image_url": person_url,
+                    "cloth_image_url": cloth_url,
+                },
+            )
+
+
+def _schedule_pregeneration(email, person_file, person_sha256, person_url, person_stem,
+                            limit=TRYON_PREGENERATE_TOP_N):
+    """Start (or restart) speculative try-ons of the user's garments on this person photo"""
+    tryon_pregenerator.schedule(email, _pregeneration_jobs(
+        email, person_file, person_sha256, person_url, person_stem, limit
+    ))
+
+
+async def _start_tryon(email, person_bytes, person_filename, cloth_bytes, cloth_filename,
+                       instructions, seed, randomize_seed, pregenerate=False):
+    """Normalise, store and enqueue one try-on; returns the response payload.
+
+    A deterministic request with a cached result comes back as `done`
+    straight away, everything else as `queued`.  With `pregenerate` (and
+    pre-generation enabled) the person photo is also tried on with the
+    user's recent garments in the background.
+    """
+    pregenerate = pregenerate and TRYON_PREGENERATE_ENABLED
+    # downscale/re-encode both images once; the raw upload is dropped afterwards
+    person_bytes, person_info = await normalize_image(person_bytes, "tryon")
+    cloth_bytes, cloth_info = await normalize_image(cloth_bytes, "tryon")
+
+    person_sha256 = hashlib.sha256(person_bytes).hexdigest()
+    cloth_sha256 = hashlib.sha256(cloth_bytes).hexdigest()
+    person_stem = _file_stem(person_filename, person_sha256)
+    cloth_stem = _file_stem(cloth_filename, cloth_sha256)
+
+    # The normalised bytes are shared by the storage upload and the Gradio
+    # job; nothing touches the local disk.
+    person_file = GradioFile(person_bytes, person_stem + (person_info.get("extension") or ".jpg"))
+    cloth_file = GradioFile(cloth_bytes, cloth_stem + (cloth_info.get("extension") or ".jpg"))
+
+    # Deterministic requests may already have a cached result
+    cache_key = None
+    if not randomize_seed:
+        cache_key = tryon_cache_key(email, person_sha256, cloth_sha256, seed)
+        cached = await lookup_tryon_cache(cache_key)
+        if cached:
+            tryon_session = await create_tryon_session(email, TryOnSessionCreate(
+                person_image_url=cached["person_image_url"],
+                cloth_image_url=cached["cloth_image_url"],
+            ), status="done")
+            await update_tryon_session_result(tryon_session.id, email, cached["result_image_url"])
+            if cached.get("text"):
+                await update_tryon_session_status(tryon_session.id, email, "done", text=cached["text"])
+            if pregenerate:
+                _schedule_pregeneration(email, person_file, person_sha256, cached["person_image_url"], person_stem)
+            return {
+                "session_id": tryon_session.id,
+                "status": "done",
+                "image": cached["result_image_url"],
+                "text": cached.get("text"),
+                "cached": True,
+            }
+
+    folder = get_tryon_image_folder()
+
+    # Upload person and cloth images concurrently
+    person_upload_result, cloth_upload_result = await asyncio.gather(
+        upload_media(
+            person_bytes,
+            folder=f"{folder}/person_images",
+            public_id=f"{email}_person_{person_stem}",
+            overwrite=False,
+            resource_type="image"
+        ),
+        upload_media(
+            cloth_bytes,
+            folder=f"{folder}/cloth_images",
+            public_id=f"{email}_cloth_{cloth_stem}",
+            overwrite=False,
+            resource_type="image"
+        ),
+    )
+
+    # Create a try-on session to track this job
+    session_data = TryOnSessionCreate(
+        person_image_url=person_upload_result["secure_url"],
+        cloth_image_url=cloth_upload_result["secure_url"],
+        instructions=instructions,
+    )
+    tryon_session = await create_tryon_session(email, session_data, status="queued")
+
+    try:
+        tryon_queue.submit(tryon_session.id, functools.partial(
+            _run_tryon_job, tryon_session.id, email, person_file, cloth_file,
+            seed, randomize_seed, f"{email}_tryon_result_{person_stem}_{cloth_stem}",
+            cache_key, {
+                "person_sha256": person_sha256,
+                "cloth_sha256": cloth_sha256,
+                "seed": seed,
+                "person_image_url": person_upload_result["secure_url"],
+                "cloth_image_url": cloth_upload_result["secure_url"],
+            },
+        ))
+    except JobQueueFull as e:
+        await update_tryon_session_status(tryon_session.id, email, "failed", error=str(e))
+        raise HTTPException(status_code=503, detail=f"Try-on service busy: {e}")
+    _publish_queued(tryon_session.id)
+    if pregenerate:
+        # submitted after the interactive job, and only runs once the pool is idle
+        _schedule_pregeneration(email, person_file, person_sha256, person_upload_result["secure_url"], person_stem)
+
+    return {
+        "session_id": tryon_session.id,
+        "status": "queued",
+    }
+
+
+@router.post("/try-on", status_code=202)
 async def try_on(
     person_image: UploadFile = File(...),
     cloth_image: UploadFile = File(...),
     instructions: str = Form("None"),
     seed: int = Form(0),
     randomize_seed: bool = Form(False),
+    pregenerate: bool = Form(False),
     email: str = Depends(verify_token),
 ):
-    """Perform virtual try-on with image generation and store results in Cloudinary"""
+    """Queue a virtual try-on job.
+
+    The images are validated, normalised and stored, then the generation is
+    handed to the try-on worker pool.  Returns the session id immediately;
+    poll GET /try-on/sessions/{id} or follow GET /try-on/sessions/{id}/events
+    until `status` is `done` or `failed`.  `pregenerate=true` also starts
+    background try-ons of the user's recent garments on this person photo.
+    """
     try:
-        MAX_IMAGE_SIZE_MB = 10
-        ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+        # the request size was already capped by UploadLimitMiddleware; this checks each file
+        user_bytes = await read_upload(person_image, "person_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+        cloth_bytes = await read_upload(cloth_image, "cloth_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
 
-        if person_image.content_type not in ALLOWED_MIME_TYPES:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type for person_image: {person_image.content_type}")
+        result = await _start_tryon(
+            email, user_bytes, person_image.filename or "", cloth_bytes, cloth_image.filename or "",
+            instructions, seed, randomize_seed, pregenerate,
+        )
+        return JSONResponse(status_code=200 if result["status"] == "done" else 202, content=result)
 
-        user_bytes = await person_image.read()
-        if len(user_bytes) / (1024 * 1024) > MAX_IMAGE_SIZE_MB:
-            raise HTTPException(status_code=400, detail="Image exceeds 10MB size limit for person_image")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in /api/try-on endpoint: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-        if cloth_image.content_type not in ALLOWED_MIME_TYPES:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type for cloth_image: {cloth_image.content_type}")
 
-        cloth_bytes = await cloth_image.read()
-        if len(cloth_bytes) / (1024 * 1024) > MAX_IMAGE_SIZE_MB:
-            raise HTTPException(status_code=400, detail="Image exceeds 10MB size limit for cloth_image")
+async def _session_events(session_id, email):
+    """SSE messages for one try-on session until it is done or failed.
 
-        user_b64 = array_buffer_to_base64(user_bytes)
-        cloth_b64 = array_buffer_to_base64(cloth_bytes)
+    Progress comes from this process's broker; on every keep-alive the
+    session record is re-read so a job finished elsewhere still ends the
+    stream.
+    """
+    session = await get_tryon_session_by_id(session_id, email)
+    if not session:
+        yield sse_event({"stage": "failed", "session_id": session_id, "error": "Try-on session not found"})
+        return
+    status = session.status.value if session.status else "done"
+    if status in ("done", "failed") and not tryon_progress.last(session_id):
+        # finished before we subscribed (or handled by another process)
+        yield sse_event(_session_final_event(session))
+        return
 
-        # Upload person and cloth images to Cloudinary
-        folder = get_tryon_image_folder()
-        person_upload_result = cloudinary.uploader.upload(
-            user_bytes,
-            folder=f"{folder}/person_images",
-            public_id=f"{email}_person_{person_image.filename.split('.')[0]}",
-            overwrite=False,
-            resource_type="image"
-        )
+    idle = 0.0
+    last_queued = None
+    async for event in tryon_progress.subscribe(session_id, timeout=TRYON_EVENTS_POLL_SECONDS):
+        if event is None:
+            idle += TRYON_EVENTS_POLL_SECONDS
+            last = tryon_progress.last(session_id)
+            if last and last.get("stage") == "queued":
+                # queue position only changes when other jobs start; refresh it
+                event = _queued_event(session_id)
+                if (event["position"], event["eta_seconds"]) == last_queued:
+                    event = None
+            if event is None:
+                if idle >= TRYON_EVENTS_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    # the job may have finished in another process, or its events were missed
+                    session = await get_tryon_session_by_id(session_id, email)
+                    if not session:
+                        yield sse_event({"stage": "failed", "session_id": session_id, "error": "Try-on session not found"})
+                        return
+                    status = session.status.value if session.status else "done"
+                    if status in ("done", "failed"):
+                        yield sse_event(_session_final_event(session))
+                        return
+                    yield SSE_KEEPALIVE
+                continue
+        idle = 0.0
+        if event.get("stage") == "queued":
+            last_queued = (event.get("position"), event.get("eta_seconds"))
+        yield sse_event(event)
 
-        cloth_upload_result = cloudinary.uploader.upload(
-            cloth_bytes,
-            folder=f"{folder}/cloth_images",
-            public_id=f"{email}_cloth_{cloth_image.filename.split('.')[0]}",
-            overwrite=False,
-            resource_type="image"
-        )
 
-        # Call the Gradio try-on model using temporary files
-        person_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(person_image.filename or "")[1] or ".jpg")
-        cloth_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(cloth_image.filename or "")[1] or ".jpg")
-        image_url = None
-        text_response = None
+def _session_final_event(session):
+    status = session.status.value if session.status else "done"
+    return {
+        "stage": status,
+        "session_id": session.id,
+        "image": session.result_image_url,
+        "text": session.text,
+        "error": session.error,
+    }
+
+
+@router.post("/try-on/stream")
+async def try_on_stream(
+    person_image: UploadFile = File(...),
+    cloth_image: UploadFile = File(...),
+    instructions: str = Form("None"),
+    seed: int = Form(0),
+    randomize_seed: bool = Form(False),
+    pregenerate: bool = Form(False),
+    email: str = Depends(verify_token),
+):
+    """Run a try-on and stream its progress as Server-Sent Events.
+
+    Takes the same form as POST /try-on.  Events are named after the stage:
+    `uploading`, `queued` (with `position` and `eta_seconds`), `generating`
+    (upstream queue rank/ETA/progress), `storing`, then `done` with the image
+    or `failed` with the error.
+    """
+    # read before streaming starts; the form is closed once the handler returns
+    user_bytes = await read_upload(person_image, "person_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+    cloth_bytes = await read_upload(cloth_image, "cloth_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+    person_filename = person_image.filename or ""
+    cloth_filename = cloth_image.filename or ""
+
+    async def stream():
+        yield sse_event({"stage": "uploading"})
         try:
-            person_tmp.write(user_bytes)
-            person_tmp.flush()
-            cloth_tmp.write(cloth_bytes)
-            cloth_tmp.flush()
+            result = await _start_tryon(
+                email, user_bytes, person_filename, cloth_bytes, cloth_filename,
+                instructions, seed, randomize_seed, pregenerate,
+            )
+        except HTTPException as e:
+            yield sse_event({"stage": "failed", "error": e.detail, "status_code": e.status_code})
+            return
+        except Exception as e:
+            print(f"Error in /api/try-on/stream endpoint: {e}")
+            traceback.print_exc()
+            yield sse_event({"stage": "failed", "error": "Internal Server Error", "status_code": 500})
+            return
+        if result["status"] == "done":
+            yield sse_event({"stage": "done", **result})
+            return
+        async for message in _session_events(result["session_id"], email):
+            yield message
 
-            try:
-                raw_result = client.predict(
-                    person_img=handle_file(person_tmp.name),
-                    garment_img=handle_file(cloth_tmp.name),
-                    seed=seed,
-                    randomize_seed=randomize_seed,
-                    api_name="/tryon",
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def _load_batch_garment(index, email, upload=None, item_id=None, client_http=None):
+    """Read/normalise one batch garment; returns a dict describing it (or its error)"""
+    garment = {"index": index, "garment": upload.filename if upload else item_id}
+    try:
+        if upload is not None:
+            data = await read_upload(upload, f"cloth_images[{index}]", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+            cloth_url = None
+            stem = upload.filename
+        else:
+            item = await get_wardrobe_item_by_id(item_id, email)
+            if not item:
+                raise ValueError("Wardrobe item not found")
+            if not is_stored_media_url(item.image_url):
+                raise HTTPException(status_code=400, detail=f"Wardrobe item {item_id} has an image outside our media storage")
+            resp = await client_http.get(item.image_url)
+            resp.raise_for_status()
+            data = resp.content
+            # wardrobe images are already stored; reuse their URL
+            cloth_url = item.image_url
+            stem = f"item_{item_id}"
+        data, info = await normalize_image(data, "tryon")
+        sha256 = hashlib.sha256(data).hexdigest()
+        garment.update({
+            "data": data,
+            "extension": info.get("extension") or ".jpg",
+            "sha256": sha256,
+            "cloth_url": cloth_url,
+            "stem": _file_stem(stem, sha256),
+        })
+    except HTTPException as e:
+        if upload is None:
+            # a wardrobe image we would not fetch rejects the whole batch
+            raise
+        garment["error"] = e.detail
+    except Exception as e:
+        garment["error"] = str(e)
+    return garment
+
+
+@router.post("/try-on/batch")
+async def try_on_batch(
+    person_image: UploadFile = File(...),
+    cloth_images: List[UploadFile] = File([]),
+    wardrobe_item_ids: List[str] = Form([]),
+    seed: int = Form(0),
+    randomize_seed: bool = Form(False),
+    concurrency: int = Form(TRYON_BATCH_CONCURRENCY, ge=1, le=TRYON_BATCH_MAX_CONCURRENCY),
+    email: str = Depends(verify_token),
+):
+    """Try one person image against many garments.
+
+    Garments are uploaded files (`cloth_images`) and/or `wardrobe_item_ids`.
+    The person image is normalised, hashed and stored once; the predictions
+    fan out over the try-on worker pool with at most `concurrency` of this
+    batch in flight.  Results stream back as NDJSON lines in completion
+    order, and each garment is recorded as its own try-on session.
+    """
+    garment_count = len(cloth_images) + len(wardrobe_item_ids)
+    if garment_count == 0:
+        raise HTTPException(status_code=400, detail="Provide at least one cloth image or wardrobe item id")
+    if garment_count > TRYON_BATCH_MAX_GARMENTS:
+        raise HTTPException(status_code=400, detail=f"At most {TRYON_BATCH_MAX_GARMENTS} garments per batch")
+
+    try:
+        person_bytes = await read_upload(person_image, "person_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+        person_bytes, person_info = await normalize_image(person_bytes, "tryon")
+        person_sha256 = hashlib.sha256(person_bytes).hexdigest()
+        person_stem = _file_stem(person_image.filename, person_sha256)
+        # one in-memory copy shared by every garment job
+        person_file = GradioFile(person_bytes, person_stem + (person_info.get("extension") or ".jpg"))
+
+        folder = get_tryon_image_folder()
+        async with httpx.AsyncClient(timeout=30) as client_http:
+            person_upload_result, *garments = await asyncio.gather(
+                upload_media(
+                    person_bytes,
+                    folder=f"{folder}/person_images",
+                    public_id=f"{email}_person_{person_stem}",
+                    overwrite=False,
+                    resource_type="image"
+                ),
+                *[_load_batch_garment(i, email, upload=f) for i, f in enumerate(cloth_images)],
+                *[_load_batch_garment(len(cloth_images) + i, email, item_id=item_id, client_http=client_http)
+                  for i, item_id in enumerate(wardrobe_item_ids)],
+            )
+        person_url = person_upload_result["secure_url"]
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in /api/try-on/batch endpoint: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def run_garment(garment):
+        result = {"index": garment["index"], "garment": garment["garment"]}
+        if garment.get("error"):
+            return {**result, "status": "failed", "error": garment["error"]}
+
+        cache_key = None
+        if not randomize_seed:
+            cache_key = tryon_cache_key(email, person_sha256, garment["sha256"], seed)
+            cached = await lookup_tryon_cache(cache_key)
+            if cached:
+                session = await create_tryon_session(email, TryOnSessionCreate(
+                    person_image_url=person_url,
+                    cloth_image_url=garment["cloth_url"] or cached["cloth_image_url"],
+                ), status="done")
+                await update_tryon_session_result(session.id, email, cached["result_image_url"])
+                return {**result, "session_id": session.id, "status": "done",
+                        "image": cached["result_image_url"], "cached": True}
+
+        async with semaphore:
+            cloth_bytes = garment.pop("data")
+            cloth_file = GradioFile(cloth_bytes, garment["stem"] + garment["extension"])
+            cloth_url = garment["cloth_url"]
+            if not cloth_url:
+                upload = await upload_media(
+                    cloth_bytes,
+                    folder=f"{folder}/cloth_images",
+                    public_id=f"{email}_cloth_{garment['stem']}",
+                    overwrite=False,
+                    resource_type="image"
                 )
-            except AppError as ae:
-                # propagate sensible error to frontend
-                raise HTTPException(status_code=503, detail=f"External try-on service busy: {ae}")
-
-            if isinstance(raw_result, tuple):
-                result = {"output": raw_result[0], "_tuple": raw_result}
-            else:
-                result = raw_result
-
-            def _maybe_upload_output(out_val):
-                nonlocal image_url
-                if not out_val:
-                    return
-                # raw bytes from model
-                if isinstance(out_val, (bytes, bytearray)):
-                    try:
-                        upload = cloudinary.uploader.upload(
-                            out_val,
-                            folder=f"{folder}/results",
-                            public_id=f"{email}_tryon_result_{person_image.filename.split('.')[0]}_{cloth_image.filename.split('.')[0]}",
-                            overwrite=False,
-                            resource_type="image"
-                        )
-                        image_url = upload.get("secure_url")
-                        return
-                    except Exception:
-                        pass
-                if isinstance(out_val, str) and os.path.exists(out_val):
-                    with open(out_val, "rb") as f:
-                        data = f.read()
-                    upload = cloudinary.uploader.upload(
-                        data,
-                        folder=f"{folder}/results",
-                        public_id=f"{email}_tryon_result_{person_image.filename.split('.')[0]}_{cloth_image.filename.split('.')[0]}",
-                        overwrite=False,
-                        resource_type="image"
+                cloth_url = upload["secure_url"]
+            session = await create_tryon_session(email, TryOnSessionCreate(
+                person_image_url=person_url, cloth_image_url=cloth_url
+            ), status="queued")
+
+            finished = loop.create_future()
+
+            async def job():
+                try:
+                    await _run_tryon_job(
+                        session.id, email, person_file, cloth_file, seed, randomize_seed,
+                        f"{email}_tryon_result_{person_stem}_{garment['stem']}",
+                        cache_key, {
+                            "person_sha256": person_sha256,
+                            "cloth_sha256": garment["sha256"],
+                            "seed": seed,
+                            "person_image_url": person_url,
+                            "cloth_image_url": cloth_url,
+                        },
                     )
-                    image_url = upload.get("secure_url")
-                elif isinstance(out_val, str) and out_val.startswith("http"):
-                    image_url = out_val
-                elif isinstance(out_val, str) and out_val.startswith("data:"):
-                    try:
-                        header, b64 = out_val.split(",", 1)
-                        data = base64.b64decode(b64)
-                        upload = cloudinary.uploader.upload(
-                            data,
-                            folder=f"{folder}/results",
-                            public_id=f"{email}_tryon_result_{person_image.filename.split('.')[0]}_{cloth_image.filename.split('.')[0]}",
-                            overwrite=False,
-                            resource_type="image"
-                        )
-                        image_url = upload.get("secure_url")
-                    except Exception:
-                        pass
-
-            # Handle various result shapes: dict, tuple/list, raw string path/url, or bytes
-            if isinstance(result, dict):
-                _maybe_upload_output(result.get("output") or result.get("image") or result.get("image_url"))
-                text_response = result.get("text") or result.get("caption")
-            elif isinstance(result, (list, tuple)):
-                for item in result:
-                    _maybe_upload_output(item)
-            elif isinstance(result, (bytes, bytearray)):
-                _maybe_upload_output(result)
-            elif isinstance(result, str):
-                _maybe_upload_output(result)
-
-        finally:
-            try:
-                person_tmp.close()
-            except Exception:
-                pass
-            try:
-                cloth_tmp.close()
-            except Exception:
-                pass
-            # remove temporary files
+                finally:
+                    if not finished.done():
+                        finished.set_result(None)
+
+            def dropped():
+                if not finished.done():
+                    finished.set_result("dropped")
+
             try:
-                os.unlink(person_tmp.name)
-            except Exception:
-                pass
+                tryon_queue.submit(session.id, job, on_drop=dropped)
+            except JobQueueFull as e:
+                await update_tryon_session_status(session.id, email, "failed", error=str(e))
+                return {**result, "session_id": session.id, "status": "failed", "error": str(e)}
+            _publish_queued(session.id)
+            if await finished == "dropped":
+                # the queue stopped (shutdown) before this job ran
+                error = "Try-on job was dropped before it ran"
+                await update_tryon_session_status(session.id, email, "failed", error=error)
+                return {**result, "session_id": session.id, "status": "failed", "error": error}
+
+        done_session = await get_tryon_session_by_id(session.id, email)
+        return {
+            **result,
+            "session_id": session.id,
+            "status": done_session.status.value if done_session and done_session.status else "failed",
+            "image": done_session.result_image_url if done_session else None,
+            "error": done_session.error if done_session else "session lost",
+        }
+
+    async def stream():
+        for next_result in asyncio.as_completed([run_garment(g) for g in garments]):
             try:
-                os.unlink(cloth_tmp.name)
-            except Exception:
-                pass
+                line = await next_result
+            except Exception as e:
+                line = {"status": "failed", "error": str(e)}
+            yield json.dumps(line) + "\n"
 
-        # Create a try-on session to track this operation
-        session_data = TryOnSessionCreate(
-            person_image_url=person_upload_result["secure_url"],
-            cloth_image_url=cloth_upload_result["secure_url"],
-            instructions=instructions,
-        )
-        
-        tryon_session = await create_tryon_session(email, session_data)
-        
-        # Update the session with the results
-        if image_url:
-            await update_tryon_session_result(
-                tryon_session.id, email, image_url
-            )
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-        return JSONResponse(content={
-            "image": image_url, 
-            "text": text_response,
-            "session_id": tryon_session.id
-        })
+@router.post("/try-on/pregenerate", status_code=202)
+async def pregenerate_tryons(
+    person_image: UploadFile = File(...),
+    limit: int = Form(TRYON_PREGENERATE_TOP_N, ge=1, le=TRYON_BATCH_MAX_GARMENTS),
+    email: str = Depends(verify_token),
+):
+    """Speculatively try a new person photo on the user's recent garments.
 
+    The newest `limit` wardrobe favourites and wardrobe items are tried on at
+    background priority while the try-on workers are idle (seed 0, no
+    sessions); results land in the try-on cache, so a later deterministic
+    try-on of the same images returns immediately.  Replaces any run already
+    in progress for the user and counts against a rolling per-user budget.
+    """
+    if not TRYON_PREGENERATE_ENABLED:
+        raise HTTPException(status_code=403, detail="Try-on pre-generation is disabled")
+    try:
+        person_bytes = await read_upload(person_image, "person_image", allowed_types=ALLOWED_IMAGE_MIME_TYPES)
+        person_bytes, person_info = await normalize_image(person_bytes, "tryon")
+        person_sha256 = hashlib.sha256(person_bytes).hexdigest()
+        person_stem = _file_stem(person_image.filename, person_sha256)
+        person_file = GradioFile(person_bytes, person_stem + (person_info.get("extension") or ".jpg"))
+        person_upload_result = await upload_media(
+            person_bytes,
+            folder=f"{get_tryon_image_folder()}/person_images",
+            public_id=f"{email}_person_{person_stem}",
+            overwrite=False,
+            resource_type="image"
+        )
+        _schedule_pregeneration(
+            email, person_file, person_sha256, person_upload_result["secure_url"], person_stem, limit
+        )
+        return {"status": "scheduled", "remaining_budget": tryon_pregenerator.remaining_budget(email)}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in /api/try-on endpoint: {e}")
+        print(f"Error in /api/try-on/pregenerate endpoint: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+
+@router.delete("/try-on/pregenerate")
+async def cancel_pregenerated_tryons(email: str = Depends(verify_token)):
+    """Cancel the user's speculative try-on run (a job already running finishes)"""
+    return {"cancelled": tryon_pregenerator.cancel(email)}
+
+
 @router.post("/try-on/sessions", response_model=TryOnSessionResponse)
 async def create_tryon_session_endpoint(
     session: TryOnSessionCreate,
@@ -231,15 +874,20 @@ async def create_tryon_session_endpoint(
 async def get_tryon_sessions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    variant: str = Query(DEFAULT_LIST_VARIANT, pattern=IMAGE_VARIANT_PATTERN),
     email: str = Depends(verify_token)
 ):
-    """Get all try-on sessions for the user"""
+    """Get all try-on sessions for the user (display_urls holds the `variant` rendition of each image)"""
     try:
         sessions = await get_user_tryon_sessions(email, skip=skip, limit=limit)
         response_sessions = []
         for session in sessions:
             session_dict = session.model_dump(by_alias=True)
             session_dict["id"] = session_dict.pop("_id")
+            session_dict["display_urls"] = {
+                role: pick_image_variant(session_dict[f"{role}_image_url"], variant)
+                for role in ("person", "cloth", "result") if session_dict.get(f"{role}_image_url")
+            }
             response_sessions.append(TryOnSessionResponse(**session_dict))
         return response_sessions
     
@@ -271,6 +919,25 @@ async def get_tryon_session(
             detail=f"Failed to get try-on session: {str(e)}"
         )
 
+@router.get("/try-on/sessions/{session_id}/events")
+async def get_tryon_session_events(
+    session_id: str,
+    email: str = Depends(verify_token)
+):
+    """Stream a try-on session's progress as Server-Sent Events.
+
+    Emits `queued` (position, ETA), `generating`, `storing` and finally
+    `done` or `failed`, then closes; a finished session yields its final
+    event straight away.
+    """
+    session = await get_tryon_session_by_id(session_id, email)
+    if not session:
+        raise HTTPException(status_code=404, detail="Try-on session not found")
+    return StreamingResponse(
+        _session_events(session_id, email), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
 @router.put("/try-on/sessions/{session_id}/result", response_model=TryOnSessionResponse)
 async def update_tryon_session_result_endpoint(
     session_id: str,
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from datetime import datetime, timedelta
+import os
+import re
+import time
+import uuid
+from cloudinary.exceptions import NotFound
+
+from routers.auth import verify_token, apply_profile_photo
+from cloudinary_config import (
+    UPLOAD_FOLDERS, SIGNED_UPLOAD_TTL_SECONDS, SIGNED_UPLOAD_ALLOWED_FORMATS,
+    SIGNED_UPLOAD_MAX_BYTES, SIGNED_UPLOAD_MAX_MB, sign_upload_params,
+    verify_upload_signature, fetch_uploaded_asset, delete_uploaded_asset,
+    build_delivery_url, build_image_variants
+)
+from models.schemas import (
+    SignedUploadRequest, SignedUploadResponse, UploadCompleteRequest, MediaAssetResponse
+)
+from models.database_ops import (
+    create_pending_upload, get_media_asset, complete_media_asset
+)
+
+router = APIRouter()
+
+
+@router.post("/uploads/sign", response_model=SignedUploadResponse)
+async def sign_upload(request: SignedUploadRequest, email: str = Depends(verify_token)):
+    """Issue short-lived signed parameters for uploading an image straight to Cloudinary.
+
+    The image bytes never pass through the API: the client POSTs the file plus
+    the returned fields to `upload_url`, then calls /uploads/complete with the
+    provider's response to register the asset.
+    """
+    try:
+        folder = UPLOAD_FOLDERS[request.kind.value]
+        stem = os.path.splitext(request.filename or "")[0]
+        stem = re.sub(r"[^A-Za-z0-9_-]+", "_", stem)[:40] or "upload"
+        # the user's email prefixes every public id, matching the server-side uploads
+        public_id = f"{email}_{stem}_{uuid.uuid4().hex[:8]}"
+        timestamp = int(time.time())
+        expires_at = datetime.utcnow() + timedelta(seconds=SIGNED_UPLOAD_TTL_SECONDS)
+
+        params = sign_upload_params(folder, public_id, timestamp)
+        await create_pending_upload(email, request.kind.value, f"{folder}/{public_id}", expires_at)
+        return SignedUploadResponse(**params, expires_at=expires_at)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to sign upload: {str(e)}")
+
+
+@router.post("/uploads/complete", response_model=MediaAssetResponse)
+async def complete_upload(request: UploadCompleteRequest, email: str = Depends(verify_token)):
+    """Verify a finished direct upload and register it as a media asset"""
+    try:
+        pending = await get_media_asset(request.public_id, email)
+        if not pending:
+            raise HTTPException(status_code=404, detail="Unknown upload")
+        if pending.get("status") == "ready":
+            # completion is idempotent
+            return MediaAssetResponse(**pending)
+
+        if not verify_upload_signature(request.public_id, request.version, request.signature):
+            raise HTTPException(status_code=400, detail="Invalid upload signature")
+
+        # sizes echoed by the client are not signed: check the provider's record
+        try:
+            stored = await asyncio.to_thread(fetch_uploaded_asset, request.public_id)
+        except NotFound:
+            raise HTTPException(status_code=404, detail="Upload not found in storage")
+        fmt = stored.get("format")
+        size = stored.get("bytes") or 0
+        if fmt not in SIGNED_UPLOAD_ALLOWED_FORMATS.split(",") or size > SIGNED_UPLOAD_MAX_BYTES:
+            await asyncio.to_thread(delete_uploaded_asset, request.public_id)
+            if size > SIGNED_UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Image exceeds {SIGNED_UPLOAD_MAX_MB}MB size limit")
+            raise HTTPException(status_code=400, detail=f"Unsupported image format: {fmt}")
+
+        image_url = build_delivery_url(request.public_id, stored.get("version", request.version), fmt)
+        asset = await complete_media_asset(request.public_id, email, {
+            "version": stored.get("version", request.version),
+            "format": fmt,
+            "bytes": size,
+            "width": stored.get("width"),
+            "height": stored.get("height"),
+            "image_url": image_url,
+            "image_variants": build_image_variants(image_url),
+        })
+        if not asset:
+            raise HTTPException(status_code=410, detail="Upload signature expired")
+
+        if asset["kind"] == "profile":
+            await apply_profile_photo(email, image_url)
+
+        return MediaAssetResponse(**asset)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to complete upload: {str(e)}")
@@ -3,10 +3,15 @@ from fastapi.responses import JSONResponse
 from typing import List, Optional
 from dotenv import load_dotenv
 import os
-import cloudinary.uploader
-from inference_sdk import InferenceHTTPClient
+import asyncio
+from storage import upload_media
 from routers.auth import verify_token
-from cloudinary_config import get_wardrobe_item_folder
+from cloudinary_config import (
+    get_wardrobe_item_folder, build_image_variants, pick_image_variant, DEFAULT_LIST_VARIANT, IMAGE_VARIANT_PATTERN
+)
+from utils.image_pipeline import normalize_image
+from utils.upload_ingest import read_upload
+from utils.upstreams import upstreams
 from models.schemas import (
     WardrobeItemCreate, WardrobeItemUpdate, WardrobeItemResponse,
     SuccessResponse, ErrorResponse
@@ -27,8 +32,17 @@ API_KEY = os.getenv("ROBOFLOW_API_KEY")
 if not API_KEY:
     raise ValueError("Missing ROBOFLOW_API_KEY in .env")
 
-def classify_and_save_image(image_path, model_id, api_url, api_key):
-    client = InferenceHTTPClient(api_url=api_url, api_key=api_key)
+def _roboflow_client():
+    # inference_sdk pulls in heavy imaging dependencies; import on first use
+    from inference_sdk import InferenceHTTPClient
+    return InferenceHTTPClient(api_url=API_URL, api_key=API_KEY)
+
+
+upstreams.register("roboflow", _roboflow_client)
+
+
+def classify_and_save_image(image_path, model_id):
+    client = upstreams.get("roboflow")
     result = client.infer(image_path, model_id=model_id)
     predictions = result['predictions']
     filtered = [
@@ -47,12 +61,18 @@ async def classify_wardrobe_image(
     """Classify uploaded wardrobe image and upload to Cloudinary"""
     try:
         # Read the file content
-        file_content = await file.read()
+        file_content = await read_upload(file)
+
+        # Cloudinary keeps a display-sized copy; the classifier only needs a small one
+        (stored_content, _), (classify_content, classify_info) = await asyncio.gather(
+            normalize_image(file_content, "storage"),
+            normalize_image(file_content, "classify"),
+        )
         
         # Upload to Cloudinary
         folder = get_wardrobe_item_folder()
-        upload_result = cloudinary.uploader.upload(
-            file_content,
+        upload_result = await upload_media(
+            stored_content,
             folder=folder,
             public_id=f"{email}_{file.filename.split('.')[0]}",
             overwrite=False,
@@ -60,11 +80,11 @@ async def classify_wardrobe_image(
         )
         
         # Save temporarily for classification
-        temp_file_path = f"/tmp/{file.filename}"
+        temp_file_path = f"/tmp/{os.path.splitext(file.filename)[0]}{classify_info.get('extension', os.path.splitext(file.filename)[1])}"
         with open(temp_file_path, "wb") as buffer:
-            buffer.write(file_content)
+            buffer.write(classify_content)
         
-        results = classify_and_save_image(temp_file_path, MODEL_ID, API_URL, API_KEY)
+        results = classify_and_save_image(temp_file_path, MODEL_ID)
         
         # Clean up temporary file
         os.remove(temp_file_path)
@@ -80,9 +100,12 @@ async def classify_wardrobe_image(
         
         return JSONResponse({
             "results": formatted_results,
-            "image_url": upload_result["secure_url"]
+            "image_url": upload_result["secure_url"],
+            "image_variants": build_image_variants(upload_result["secure_url"])
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
@@ -109,15 +132,17 @@ async def create_wardrobe_item_endpoint(
 async def get_wardrobe_items(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    variant: str = Query(DEFAULT_LIST_VARIANT, pattern=IMAGE_VARIANT_PATTERN),
     email: str = Depends(verify_token)
 ):
-    """Get all wardrobe items for the user"""
+    """Get all wardrobe items for the user (display_url is the `variant` rendition of image_url)"""
     try:
         items = await get_user_wardrobe_items(email, skip=skip, limit=limit)
         response_items = []
         for item in items:
             item_dict = item.model_dump(by_alias=True)
             item_dict["id"] = item_dict.pop("_id")
+            item_dict["display_url"] = pick_image_variant(item_dict["image_url"], variant)
             response_items.append(WardrobeItemResponse(**item_dict))
         return response_items
     
@@ -202,9 +227,10 @@ async def search_wardrobe_items_endpoint(
     color: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    variant: str = Query(DEFAULT_LIST_VARIANT, pattern=IMAGE_VARIANT_PATTERN),
     email: str = Depends(verify_token)
 ):
-    """Search wardrobe items with filters"""
+    """Search wardrobe items with filters (display_url is the `variant` rendition of image_url)"""
     try:
         items = await search_wardrobe_items(
             email=email,
@@ -218,6 +244,7 @@ async def search_wardrobe_items_endpoint(
         for item in items:
             item_dict = item.model_dump(by_alias=True)
             item_dict["id"] = item_dict.pop("_id")
+            item_dict["display_url"] = pick_image_variant(item_dict["image_url"], variant)
             response_items.append(WardrobeItemResponse(**item_dict))
         return response_items
     
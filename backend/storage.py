@@ -0,0 +1,515 @@
+"""Pluggable media storage.
+
+Every image the API persists goes through `get_storage()`, which returns one
+of the backends below depending on ``STORAGE_BACKEND``:
+
+- ``cloudinary`` (default): Cloudinary uploads / delivery URLs
+- ``local``: files under ``MEDIA_ROOT`` served by the API at ``/media``
+- ``s3``: any S3-compatible bucket (requires ``boto3``)
+
+Setting ``STORAGE_CACHE_MAX_MB`` wraps the backend in a write-through local
+disk cache with LRU eviction, so hot assets can be served from local disk.
+
+All backends are synchronous; `upload_media` runs a put in a worker thread so
+request handlers never block the event loop on storage I/O, and
+`upload_media_stream` stores an async byte stream without holding it in memory.
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterable, BinaryIO, Dict, Optional, Union
+from urllib.parse import unquote, urlsplit
+
+import cloudinary.uploader
+import cloudinary.utils
+import requests
+from dotenv import load_dotenv
+
+from cloudinary_config import build_image_url
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "http://localhost:8000/media")
+STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", "media_cache")
+STORAGE_CACHE_MAX_MB = int(os.getenv("STORAGE_CACHE_MAX_MB", "0"))
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL")
+# streamed uploads stay in memory up to this size, then spill to a temp file
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_KB", "1024")) * 1024
+# files go to Cloudinary in parts of this size (Cloudinary's minimum is 5 MB)
+CLOUDINARY_UPLOAD_CHUNK_BYTES = int(os.getenv("CLOUDINARY_UPLOAD_CHUNK_MB", "6")) * 1024 * 1024
+
+# bytes, a local file path, or a readable binary file object
+MediaData = Union[bytes, bytearray, str, BinaryIO]
+
+_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".mp4": "video/mp4",
+    ".glb": "model/gltf-binary",
+    ".bin": "application/octet-stream",
+}
+
+
+def _read_head(data: MediaData, size: int = 16) -> bytes:
+    """First `size` bytes of `data`; file objects are rewound afterwards"""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data[:size])
+    if isinstance(data, str):
+        with open(data, "rb") as fh:
+            return fh.read(size)
+    head = data.read(size)
+    data.seek(0)
+    return head
+
+
+def _sniff_extension(head: bytes) -> str:
+    """Guess a file extension from the first bytes of a file"""
+    if head.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG"):
+        return ".png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head.startswith(b"GIF8"):
+        return ".gif"
+    if head[4:8] == b"ftyp":
+        return ".mp4"
+    if head.startswith(b"glTF"):
+        return ".glb"
+    return ".bin"
+
+
+def guess_content_type(path: str) -> str:
+    """Content type of a local file, sniffed from its first bytes"""
+    with open(path, "rb") as fh:
+        return _CONTENT_TYPES[_sniff_extension(fh.read(16))]
+
+
+def _write_file(path: str, data: MediaData) -> int:
+    """Atomically write `data` to `path`; returns the number of bytes written"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if isinstance(data, (bytes, bytearray)):
+                out.write(data)
+            elif isinstance(data, str):
+                with open(data, "rb") as src:
+                    shutil.copyfileobj(src, out)
+            else:
+                shutil.copyfileobj(data, out)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
+
+
+class MediaStorage(ABC):
+    """Interface implemented by every storage backend.
+
+    `put` returns a dict with at least ``key`` (the id used for get/url/delete),
+    ``secure_url`` and ``bytes``.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def put(self, data: MediaData, folder: str, public_id: Optional[str] = None,
+            overwrite: bool = False, resource_type: str = "image") -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get(self, key: str, resource_type: str = "image") -> bytes:
+        ...
+
+    @abstractmethod
+    def url(self, key: str, variant: str = "original", resource_type: str = "image") -> str:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str, resource_type: str = "image") -> bool:
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of `key` on local disk, if this backend has one"""
+        return None
+
+    def url_prefix(self) -> Optional[str]:
+        """Common prefix of this backend's public URLs, if it has a fixed one"""
+        return None
+
+
+class _KeepOpen:
+    """File object proxy that ignores close(); upload_large closes whatever it reads"""
+
+    def __init__(self, fh: BinaryIO):
+        self._fh = fh
+
+    def __getattr__(self, name):
+        return getattr(self._fh, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+
+class CloudinaryStorage(MediaStorage):
+    name = "cloudinary"
+
+    def put(self, data, folder, public_id=None, overwrite=False, resource_type="image"):
+        options = {"folder": folder, "public_id": public_id, "overwrite": overwrite, "resource_type": resource_type}
+        if isinstance(data, (bytes, bytearray)):
+            result = cloudinary.uploader.upload(data, **options)
+        else:
+            # upload() reads a whole file into memory; upload_large sends it in
+            # CLOUDINARY_UPLOAD_CHUNK_BYTES parts, holding one part at a time
+            result = cloudinary.uploader.upload_large(
+                data if isinstance(data, str) else _KeepOpen(data),
+                chunk_size=CLOUDINARY_UPLOAD_CHUNK_BYTES,
+                **options
+            )
+        # Cloudinary flags an upload that kept the existing asset (overwrite=False)
+        return {**result, "key": result.get("public_id"), "written": not result.get("existing", False)}
+
+    def get(self, key, resource_type="image"):
+        resp = requests.get(self.url(key, resource_type=resource_type), timeout=60)
+        resp.raise_for_status()
+        return resp.content
+
+    def url(self, key, variant="original", resource_type="image"):
+        url, _ = cloudinary.utils.cloudinary_url(key, secure=True, resource_type=resource_type)
+        return build_image_url(url, variant)
+
+    def delete(self, key, resource_type="image"):
+        result = cloudinary.uploader.destroy(key, resource_type=resource_type)
+        return result.get("result") == "ok"
+
+    def url_prefix(self):
+        return _cloudinary_url_prefix()
+
+
+class LocalStorage(MediaStorage):
+    """Files on local disk under `root`, publicly reachable at `base_url`"""
+
+    name = "local"
+
+    def __init__(self, root: str = MEDIA_ROOT, base_url: str = MEDIA_BASE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put(self, data, folder, public_id=None, overwrite=False, resource_type="image"):
+        name = public_id or uuid.uuid4().hex
+        if not os.path.splitext(name)[1]:
+            name += _sniff_extension(_read_head(data))
+        key = f"{folder}/{name}" if folder else name
+        path = self._path(key)
+        written = overwrite or not os.path.exists(path)
+        if written:
+            size = _write_file(path, data)
+        else:
+            # same semantics as Cloudinary's overwrite=False: keep the existing asset
+            size = os.path.getsize(path)
+        return {"key": key, "public_id": key, "secure_url": self.url(key), "bytes": size, "written": written}
+
+    def get(self, key, resource_type="image"):
+        with open(self._path(key), "rb") as fh:
+            return fh.read()
+
+    def url(self, key, variant="original", resource_type="image"):
+        return f"{self.base_url}/{key}"
+
+    def delete(self, key, resource_type="image"):
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+    def url_prefix(self):
+        return f"{self.base_url}/" if self.base_url else None
+
+
+class S3Storage(MediaStorage):
+    """Any S3-compatible object store (AWS S3, MinIO, R2, ...)"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+                 public_base_url: Optional[str] = S3_PUBLIC_BASE_URL):
+        try:
+            import boto3
+        except ImportError:
+            raise ValueError("STORAGE_BACKEND=s3 requires boto3 to be installed")
+        if not bucket:
+            raise ValueError("Missing S3_BUCKET for STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+
+    def put(self, data, folder, public_id=None, overwrite=False, resource_type="image"):
+        name = public_id or uuid.uuid4().hex
+        if not os.path.splitext(name)[1]:
+            name += _sniff_extension(_read_head(data))
+        key = f"{folder}/{name}" if folder else name
+        content_type = _CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+        if not overwrite:
+            try:
+                head = self.client.head_object(Bucket=self.bucket, Key=key)
+                return {"key": key, "public_id": key, "secure_url": self.url(key),
+                        "bytes": head["ContentLength"], "written": False}
+            except self.client.exceptions.ClientError:
+                pass
+        if isinstance(data, (bytes, bytearray)):
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=bytes(data), ContentType=content_type)
+            size = len(data)
+        else:
+            # files and file objects go up in parts instead of being read into memory
+            fh = open(data, "rb") if isinstance(data, str) else data
+            try:
+                fh.seek(0, os.SEEK_END)
+                size = fh.tell()
+                fh.seek(0)
+                self.client.upload_fileobj(fh, self.bucket, key, ExtraArgs={"ContentType": content_type})
+            finally:
+                if fh is not data:
+                    fh.close()
+        return {"key": key, "public_id": key, "secure_url": self.url(key), "bytes": size, "written": True}
+
+    def get(self, key, resource_type="image"):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def url(self, key, variant="original", resource_type="image"):
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=7 * 24 * 3600
+        )
+
+    def delete(self, key, resource_type="image"):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def url_prefix(self):
+        # presigned URLs vary with the addressing style; only a public base is fixed
+        return f"{self.public_base_url}/" if self.public_base_url else None
+
+
+class CachedStorage(MediaStorage):
+    """Write-through local disk cache in front of another backend.
+
+    Puts are written to the backend and to `cache_dir`; gets are served from
+    disk when possible.  The cache is bounded to `max_bytes` and evicts the
+    least recently used files first.
+    """
+
+    def __init__(self, backend: MediaStorage, cache_dir: str = STORAGE_CACHE_DIR,
+                 max_bytes: int = STORAGE_CACHE_MAX_MB * 1024 * 1024):
+        self.backend = backend
+        self.name = f"{backend.name}+cache"
+        self.cache = LocalStorage(cache_dir, base_url="")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size, ordered least to most recently used
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.cache.root):
+            for fname in filenames:
+                if fname.endswith(".part"):
+                    continue
+                path = os.path.join(dirpath, fname)
+                stat = os.stat(path)
+                files.append((stat.st_atime, os.path.relpath(path, self.cache.root), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key.replace(os.sep, "/")] = size
+            self._size += size
+
+    def _remember(self, key: str, size: int):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.cache.delete(old_key)
+
+    def _touch(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def _store(self, key: str, body: bytes):
+        # cache files are named by the backend key exactly
+        size = _write_file(self.cache._path(key), body)
+        self._remember(key, size)
+
+    def put(self, data, folder, public_id=None, overwrite=False, resource_type="image"):
+        # with overwrite=False the backend may keep an existing asset; the new
+        # bytes are only cached when it reports it wrote them, otherwise the
+        # stored asset is fetched into the cache on the next get
+        if isinstance(data, (bytes, bytearray)):
+            result = self.backend.put(data, folder, public_id, overwrite, resource_type)
+            if result.get("written", True):
+                self._store(result["key"], data)
+            return result
+        # write streams to a cache temp file first and upload from there, so
+        # large bodies are never held in memory
+        os.makedirs(self.cache.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache.root, suffix=".part")
+        os.close(fd)
+        try:
+            _write_file(tmp_path, data)
+            result = self.backend.put(tmp_path, folder, public_id, overwrite, resource_type)
+            if not result.get("written", True):
+                return result
+            path = self.cache._path(result["key"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        self._remember(result["key"], os.path.getsize(path))
+        return result
+
+    def get(self, key, resource_type="image"):
+        path = self.cache.local_path(key)
+        if path:
+            self._touch(key)
+            with open(path, "rb") as fh:
+                return fh.read()
+        body = self.backend.get(key, resource_type)
+        self._store(key, body)
+        return body
+
+    def url(self, key, variant="original", resource_type="image"):
+        return self.backend.url(key, variant, resource_type)
+
+    def delete(self, key, resource_type="image"):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        self.cache.delete(key)
+        return self.backend.delete(key, resource_type)
+
+    def local_path(self, key):
+        path = self.cache.local_path(key) or self.backend.local_path(key)
+        if path:
+            self._touch(key)
+        return path
+
+    def url_prefix(self):
+        return self.backend.url_prefix()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+_storage: Optional[MediaStorage] = None
+_asset_storage: Optional[LocalStorage] = None
+
+
+def get_storage() -> MediaStorage:
+    """Return the configured media storage backend (created on first use)"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "local":
+            backend = LocalStorage()
+        elif STORAGE_BACKEND == "s3":
+            backend = S3Storage()
+        elif STORAGE_BACKEND == "cloudinary":
+            backend = CloudinaryStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+        _storage = CachedStorage(backend) if STORAGE_CACHE_MAX_MB > 0 else backend
+    return _storage
+
+
+def get_asset_storage() -> LocalStorage:
+    """Local storage for generated 3D assets, served under /avatars_3D"""
+    global _asset_storage
+    if _asset_storage is None:
+        _asset_storage = LocalStorage("avatars_3D", base_url="/avatars_3D")
+    return _asset_storage
+
+
+def _cloudinary_url_prefix() -> Optional[str]:
+    cloud_name = cloudinary.config().cloud_name
+    return f"https://res.cloudinary.com/{cloud_name}/image/upload/" if cloud_name else None
+
+
+def is_stored_media_url(url: Optional[str]) -> bool:
+    """Whether `url` points at our own media (the storage backend or our Cloudinary account).
+
+    Image URLs that reach the API from clients (favourite cards, wardrobe
+    records) must pass this before the server fetches them, so a request
+    cannot make us read arbitrary hosts.  Cloudinary URLs of our account are
+    accepted under every backend: records written before a backend switch
+    still point there.
+    """
+    if not url or ".." in unquote(urlsplit(url).path).split("/"):
+        return False
+    prefixes = {_cloudinary_url_prefix(), get_storage().url_prefix()}
+    return any(prefix and url.startswith(prefix) for prefix in prefixes)
+
+
+async def upload_media(data: MediaData, folder: str, public_id: Optional[str] = None,
+                       overwrite: bool = False, resource_type: str = "image") -> Dict[str, Any]:
+    """Store `data` with the configured backend without blocking the event loop"""
+    return await asyncio.to_thread(get_storage().put, data, folder, public_id, overwrite, resource_type)
+
+
+async def upload_media_stream(chunks: AsyncIterable[bytes], folder: str, public_id: Optional[str] = None,
+                              overwrite: bool = False, resource_type: str = "image",
+                              max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Store an async byte stream with the configured backend.
+
+    Every backend needs the full length before it uploads, so chunks are
+    spooled (in memory up to `UPLOAD_SPOOL_MAX_BYTES`, then on disk) and the
+    spool is handed to the backend as a file object.  Raises ValueError once
+    the stream exceeds `max_bytes`.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES) as spool:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise ValueError(f"stream exceeds {max_bytes} bytes")
+            spool.write(chunk)
+        if not size:
+            raise ValueError("empty stream")
+        spool.seek(0)
+        return await upload_media(spool, folder, public_id, overwrite, resource_type)
@@ -0,0 +1,148 @@
+"""Content-addressed store for generated 3D assets (MP4 previews, GLB files).
+
+Files live on local disk (`get_asset_storage()`, served under /avatars_3D)
+named by the SHA-256 of their content, so identical outputs are stored once
+and a name never changes meaning.  Every asset is indexed in the
+`model3d_assets` collection with its owners, size and last access; once the
+total exceeds `max_bytes` the least recently used assets are deleted, along
+with any 3D stage cache entries that point at them.  Assets written or
+used inside a `pinned()` block (one 3D job) are never evicted while it runs.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set
+
+from storage import get_asset_storage, guess_content_type
+from utils.cache import LRUCache
+from models.database_ops import (
+    upsert_model3d_asset, touch_model3d_asset, get_model3d_assets_size, get_lru_model3d_assets,
+    delete_model3d_asset, delete_model3d_stage_entries_for_url
+)
+
+ASSET_STORE_MAX_MB = int(os.getenv("ASSET_STORE_MAX_MB", "2048"))
+# serving a video issues many range requests; record at most one access per key per interval
+ASSET_TOUCH_INTERVAL_SECONDS = 60
+
+# keys pinned by the job running in the current task (see `AssetStore.pinned`)
+_job_pins: contextvars.ContextVar[Optional[Set[str]]] = contextvars.ContextVar("asset_job_pins", default=None)
+
+_CONTENT_KEY = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+
+def content_sha256(key: str) -> Optional[str]:
+    """The content hash encoded in a store key, or None for legacy names"""
+    match = _CONTENT_KEY.match(key)
+    return match.group(1) if match else None
+
+
+class AssetStore:
+    def __init__(self, max_bytes: int = ASSET_STORE_MAX_MB * 1024 * 1024):
+        self.disk = get_asset_storage()
+        self.max_bytes = max_bytes
+        self._evict_lock = asyncio.Lock()
+        # keys whose access was recorded recently
+        self._touched = LRUCache(maxsize=4096, ttl=ASSET_TOUCH_INTERVAL_SECONDS)
+        self._counters = {"puts": 0, "deduplicated": 0, "evicted": 0, "evicted_bytes": 0}
+        # pin sets of the jobs currently running
+        self._pin_sets: List[Set[str]] = []
+
+    @asynccontextmanager
+    async def pinned(self):
+        """Protect every asset this task puts (or `pin`s) from eviction until the block exits.
+
+        A job's outputs (preview, GLB, LODs) are written one after another;
+        without pinning, the quota check after a later write could evict an
+        earlier output of the same job.
+        """
+        pins: Set[str] = set()
+        token = _job_pins.set(pins)
+        self._pin_sets.append(pins)
+        try:
+            yield pins
+        finally:
+            self._pin_sets.remove(pins)
+            _job_pins.reset(token)
+
+    def pin(self, key: str):
+        """Pin an existing asset for the job running in this task (no-op outside `pinned()`)"""
+        pins = _job_pins.get()
+        if pins is not None:
+            pins.add(key)
+
+    def _pinned_keys(self) -> Set[str]:
+        return set().union(*self._pin_sets)
+
+    async def put(self, data: bytes, ext: str = "", owner: Optional[str] = None) -> Dict[str, Any]:
+        """Store `data` under its content hash; returns `key`, `url`, `sha256` and `bytes`"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        key = sha256 + ext.lower()
+        self._counters["puts"] += 1
+        self.pin(key)
+        path = self.disk.local_path(key)
+        if path:
+            self._counters["deduplicated"] += 1
+        else:
+            await asyncio.to_thread(self.disk.put, data, "", key, False)
+            path = self.disk.local_path(key)
+        url = self.disk.url(key)
+        await upsert_model3d_asset(key, {
+            "sha256": sha256,
+            "size": len(data),
+            "content_type": guess_content_type(path),
+            "url": url,
+        }, owner)
+        await self.enforce_quota()
+        return {"key": key, "url": url, "sha256": sha256, "bytes": len(data)}
+
+    def local_path(self, key: str) -> Optional[str]:
+        try:
+            return self.disk.local_path(key)
+        except ValueError:
+            return None
+
+    async def touch(self, key: str):
+        """Record an access (throttled per key)"""
+        if key in self._touched:
+            return
+        self._touched.set(key, True)
+        try:
+            await touch_model3d_asset(key)
+        except Exception as e:
+            print(f"[asset-store] touch failed for {key}: {e}")
+
+    async def enforce_quota(self):
+        """Evict least recently used assets until the store fits in `max_bytes`"""
+        async with self._evict_lock:
+            total = await get_model3d_assets_size()
+            while total > self.max_bytes:
+                pinned = self._pinned_keys()
+                victims = await get_lru_model3d_assets(limit=20 + len(pinned))
+                # always keep the most recent asset, even if it alone exceeds the quota
+                evictable = [a for a in victims[:-1] if a["key"] not in pinned]
+                if not evictable:
+                    break
+                for asset in evictable:
+                    await self._evict(asset)
+                    total -= asset.get("size", 0)
+                    if total <= self.max_bytes:
+                        break
+
+    async def _evict(self, asset: Dict[str, Any]):
+        key = asset["key"]
+        await asyncio.to_thread(self.disk.delete, key)
+        await delete_model3d_asset(key)
+        await delete_model3d_stage_entries_for_url(asset.get("url") or self.disk.url(key))
+        self._touched.pop(key, None)
+        self._counters["evicted"] += 1
+        self._counters["evicted_bytes"] += asset.get("size", 0)
+        print(f"[asset-store] evicted {key} ({asset.get('size', 0)} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "max_bytes": self.max_bytes}
+
+
+asset_store = AssetStore()
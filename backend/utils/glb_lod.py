@@ -0,0 +1,394 @@
+"""CPU post-processing of generated GLB files into levels of detail.
+
+Each level is a self-contained GLB with
+
+- geometry decimated by vertex clustering: vertices are snapped to a grid
+  whose resolution is searched to hit the level's vertex ratio; vertices of
+  different UV charts (connected components of the index buffer, since
+  glTF splits vertices along seams) stay separate so textures survive;
+- vertex attributes quantised with ``KHR_mesh_quantization`` (positions as
+  normalised int16 with the dequantisation folded into a node transform,
+  normals as int8, texture coordinates as uint16);
+- embedded textures downscaled to the level's maximum edge and re-encoded
+  (JPEG unless the image uses alpha).
+
+Only triangle meshes without skins, morph targets or animations are
+handled, which covers the TRELLIS output; anything else raises
+`UnsupportedGLB`.  Everything here is synchronous and CPU bound, so callers
+run it on the image pipeline's process pool.
+"""
+import io
+import json
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+_COMPONENT_DTYPES = {
+    5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32,
+}
+_TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+_TYPES_BY_SIZE = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+
+# Clustering grid resolution is searched between these bounds
+_MIN_GRID = 2
+_MAX_GRID = 2048
+TEXTURE_JPEG_QUALITY = 85
+
+
+class UnsupportedGLB(ValueError):
+    """The GLB uses features the LOD builder does not handle"""
+
+
+def parse_glb(data: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Split a GLB into its JSON document and binary chunk"""
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise UnsupportedGLB("not a glTF 2.0 binary")
+    offset = 12
+    gltf, binary = None, b""
+    while offset < min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN and not binary:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise UnsupportedGLB("GLB has no JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf: Dict[str, Any], binary: bytes) -> bytes:
+    """Serialise a glTF document and its binary chunk as GLB"""
+    doc = json.dumps(gltf, separators=(",", ":")).encode()
+    doc += b" " * (-len(doc) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(doc) + (8 + len(binary) if binary else 0)
+    out = struct.pack("<III", GLB_MAGIC, 2, length) + struct.pack("<II", len(doc), CHUNK_JSON) + doc
+    if binary:
+        out += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+    return out
+
+
+def _read_view(gltf, binary, view_index) -> bytes:
+    view = gltf["bufferViews"][view_index]
+    if view.get("buffer", 0) != 0 or "uri" in gltf["buffers"][0]:
+        raise UnsupportedGLB("external buffers are not supported")
+    start = view.get("byteOffset", 0)
+    return binary[start:start + view["byteLength"]]
+
+
+def read_accessor(gltf: Dict[str, Any], binary: bytes, index: int) -> np.ndarray:
+    """Accessor data as a (count, components) array; normalised integers become floats"""
+    accessor = gltf["accessors"][index]
+    if "sparse" in accessor or "bufferView" not in accessor:
+        raise UnsupportedGLB("sparse or empty accessors are not supported")
+    dtype = np.dtype(_COMPONENT_DTYPES[accessor["componentType"]])
+    components = _TYPE_SIZES[accessor["type"]]
+    count = accessor["count"]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    raw = _read_view(gltf, binary, accessor["bufferView"])
+    stride = view.get("byteStride") or dtype.itemsize * components
+    offset = accessor.get("byteOffset", 0)
+    rows = np.frombuffer(raw, dtype=np.uint8, count=stride * (count - 1) + dtype.itemsize * components, offset=offset)
+    rows = np.lib.stride_tricks.as_strided(rows, shape=(count, dtype.itemsize * components), strides=(stride, 1))
+    values = np.ascontiguousarray(rows).view(dtype).reshape(count, components)
+    if accessor.get("normalized"):
+        info = np.iinfo(dtype)
+        values = values.astype(np.float32) / info.max
+        if info.min < 0:
+            values = np.maximum(values, -1.0)
+    return values
+
+
+class _BufferBuilder:
+    """Collects the bufferViews/accessors of the output document"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.length = 0
+        self.views: List[Dict[str, Any]] = []
+        self.accessors: List[Dict[str, Any]] = []
+
+    def add_view(self, data: bytes, target: Optional[int] = None, stride: Optional[int] = None) -> int:
+        padding = -self.length % 4
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.length += padding
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if target:
+            view["target"] = target
+        if stride:
+            view["byteStride"] = stride
+        self.chunks.append(data)
+        self.length += len(data)
+        self.views.append(view)
+        return len(self.views) - 1
+
+    def add_attribute(self, values: np.ndarray, component_type: int, normalized: bool = False,
+                      bounds: bool = False) -> int:
+        """Store vertex data; rows are padded to a 4-byte stride as glTF requires"""
+        dtype = np.dtype(_COMPONENT_DTYPES[component_type])
+        count, components = values.shape
+        row_bytes = dtype.itemsize * components
+        stride = row_bytes + (-row_bytes % 4)
+        padded = np.zeros((count, stride // dtype.itemsize), dtype=dtype)
+        padded[:, :components] = values
+        view = self.add_view(padded.tobytes(), ARRAY_BUFFER, stride if stride != row_bytes else None)
+        accessor = {
+            "bufferView": view, "componentType": component_type, "count": count,
+            "type": _TYPES_BY_SIZE[components],
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if bounds:
+            accessor["min"] = values.min(axis=0).tolist()
+            accessor["max"] = values.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_indices(self, triangles: np.ndarray, vertex_count: int) -> int:
+        if vertex_count <= 0xFFFF:
+            component_type, data = 5123, triangles.astype(np.uint16)
+        else:
+            component_type, data = 5125, triangles.astype(np.uint32)
+        view = self.add_view(data.tobytes(), ELEMENT_ARRAY_BUFFER)
+        self.accessors.append({
+            "bufferView": view, "componentType": component_type, "count": int(data.size), "type": "SCALAR",
+        })
+        return len(self.accessors) - 1
+
+    def binary(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+def _connected_components(triangles: np.ndarray, vertex_count: int) -> np.ndarray:
+    """Component label per vertex (hook-and-jump union-find over triangle edges)"""
+    parent = np.arange(vertex_count)
+    a = np.concatenate([triangles[:, 0], triangles[:, 1]])
+    b = np.concatenate([triangles[:, 1], triangles[:, 2]])
+    while True:
+        pa, pb = parent[a], parent[b]
+        differ = pa != pb
+        if not differ.any():
+            return parent
+        np.minimum.at(parent, np.maximum(pa, pb)[differ], np.minimum(pa, pb)[differ])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def _cluster_vertices(positions: np.ndarray, triangles: np.ndarray, ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Map every vertex to a cluster; returns (vertex -> new vertex, new vertex -> spatial cell)"""
+    low = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - low).max()) or 1.0
+    unit = (positions - low) / extent
+    target = max(4, int(len(np.unique(positions, axis=0)) * ratio))
+
+    def cells(resolution):
+        grid = np.minimum((unit * resolution).astype(np.int64), resolution - 1)
+        return np.unique((grid[:, 0] * resolution + grid[:, 1]) * resolution + grid[:, 2], return_inverse=True)
+
+    # largest grid whose occupied cell count stays within the target
+    lo, hi = _MIN_GRID, _MAX_GRID
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(cells(mid)[0]) <= target:
+            lo = mid
+        else:
+            hi = mid - 1
+    _, cell_of_vertex = cells(lo)
+    cell_of_vertex = cell_of_vertex.reshape(-1)
+
+    charts = _connected_components(triangles, len(positions))
+    unique_keys, new_index = np.unique(np.column_stack([cell_of_vertex, charts]), axis=0, return_inverse=True)
+    return new_index.reshape(-1), unique_keys[:, 0]
+
+
+def _mean_by(index: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    counts = np.bincount(index, minlength=size).astype(np.float64)
+    counts[counts == 0] = 1
+    return np.column_stack([
+        np.bincount(index, weights=values[:, c], minlength=size) / counts for c in range(values.shape[1])
+    ]).astype(np.float32)
+
+
+def decimate(attributes: Dict[str, np.ndarray], triangles: np.ndarray,
+             ratio: float) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Vertex-clustering decimation keeping roughly `ratio` of the vertices"""
+    positions = attributes["POSITION"]
+    new_index, cell_of_new = _cluster_vertices(positions, triangles, ratio)
+    vertex_count = int(new_index.max()) + 1
+    cell_of_vertex = cell_of_new[new_index]
+
+    # every vertex of a spatial cell gets the same position, so seams stay closed
+    cell_positions = _mean_by(cell_of_vertex, positions, int(cell_of_vertex.max()) + 1)
+    result = {"POSITION": cell_positions[cell_of_new]}
+    for name, values in attributes.items():
+        if name == "POSITION":
+            continue
+        merged = _mean_by(new_index, values, vertex_count)
+        if name == "NORMAL":
+            lengths = np.linalg.norm(merged, axis=1, keepdims=True)
+            merged = merged / np.where(lengths == 0, 1, lengths)
+        result[name] = merged
+
+    remapped = new_index[triangles]
+    keep = (remapped[:, 0] != remapped[:, 1]) & (remapped[:, 1] != remapped[:, 2]) & (remapped[:, 0] != remapped[:, 2])
+    remapped = remapped[keep]
+    _, first = np.unique(np.sort(remapped, axis=1), axis=0, return_index=True)
+    return result, remapped[np.sort(first)]
+
+
+def _quantize_positions(positions: np.ndarray, offset: np.ndarray, scale: float) -> np.ndarray:
+    return np.round((positions - offset) / scale * 32767).clip(-32767, 32767).astype(np.int16)
+
+
+def _write_attribute(builder: _BufferBuilder, name: str, values: np.ndarray,
+                     quantize: Optional[Tuple[np.ndarray, float]]) -> int:
+    if name == "POSITION":
+        if quantize is None:
+            return builder.add_attribute(values.astype(np.float32), 5126, bounds=True)
+        return builder.add_attribute(_quantize_positions(values, *quantize), 5122, normalized=True, bounds=True)
+    if quantize is not None and name in ("NORMAL", "TANGENT"):
+        return builder.add_attribute(np.round(values.clip(-1, 1) * 127).astype(np.int8), 5120, normalized=True)
+    if quantize is not None and name.startswith("TEXCOORD_") and values.min() >= 0 and values.max() <= 1:
+        return builder.add_attribute(np.round(values * 65535).astype(np.uint16), 5123, normalized=True)
+    if name.startswith("COLOR_") and quantize is not None:
+        return builder.add_attribute(np.round(values.clip(0, 1) * 255).astype(np.uint8), 5121, normalized=True)
+    return builder.add_attribute(values.astype(np.float32), 5126)
+
+
+def _recompress_texture(data: bytes, max_edge: int) -> Tuple[bytes, str]:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha and img.convert("RGBA").getchannel("A").getextrema()[0] < 255:
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue(), "image/png"
+    out = io.BytesIO()
+    img.convert("RGB").save(out, format="JPEG", quality=TEXTURE_JPEG_QUALITY, optimize=True)
+    return out.getvalue(), "image/jpeg"
+
+
+def build_lod(data: bytes, ratio: float, max_texture: int, quantize: bool = True) -> Tuple[bytes, Dict[str, Any]]:
+    """Build one level of detail from a GLB; returns (glb bytes, info)"""
+    start = time.perf_counter()
+    gltf, binary = parse_glb(data)
+    if gltf.get("skins") or gltf.get("animations"):
+        raise UnsupportedGLB("skinned or animated models are not supported")
+
+    out = json.loads(json.dumps(gltf))
+    builder = _BufferBuilder()
+    vertices = triangles_total = 0
+    mesh_transforms: Dict[int, Tuple[np.ndarray, float]] = {}
+
+    for mesh_index, mesh in enumerate(gltf.get("meshes", [])):
+        primitives = []
+        decoded = []
+        for primitive in mesh["primitives"]:
+            if primitive.get("mode", 4) != 4 or primitive.get("targets"):
+                raise UnsupportedGLB("only plain triangle primitives are supported")
+            attributes = {name: read_accessor(gltf, binary, index) for name, index in primitive["attributes"].items()}
+            count = len(attributes["POSITION"])
+            if "indices" in primitive:
+                triangles = read_accessor(gltf, binary, primitive["indices"]).reshape(-1, 3).astype(np.int64)
+            else:
+                triangles = np.arange(count, dtype=np.int64).reshape(-1, 3)
+            if ratio < 1.0 and len(triangles):
+                attributes, triangles = decimate(attributes, triangles, ratio)
+            decoded.append((primitive, attributes, triangles))
+
+        transform = None
+        if quantize and decoded:
+            all_positions = np.concatenate([attrs["POSITION"] for _, attrs, _ in decoded])
+            low, high = all_positions.min(axis=0), all_positions.max(axis=0)
+            offset = (low + high) / 2
+            scale = float((high - low).max() / 2) or 1.0
+            transform = (offset, scale)
+            mesh_transforms[mesh_index] = transform
+
+        for primitive, attributes, triangles in decoded:
+            new_primitive = {k: v for k, v in primitive.items() if k not in ("attributes", "indices")}
+            new_primitive["attributes"] = {
+                name: _write_attribute(builder, name, values, transform) for name, values in attributes.items()
+            }
+            new_primitive["indices"] = builder.add_indices(triangles, len(attributes["POSITION"]))
+            primitives.append(new_primitive)
+            vertices += len(attributes["POSITION"])
+            triangles_total += len(triangles)
+        out["meshes"][mesh_index]["primitives"] = primitives
+
+    # quantised positions are dequantised by a child node carrying offset + uniform scale
+    if mesh_transforms:
+        nodes = out.setdefault("nodes", [])
+        for node in list(nodes):
+            mesh_index = node.get("mesh")
+            if mesh_index not in mesh_transforms:
+                continue
+            offset, scale = mesh_transforms[mesh_index]
+            child = {"mesh": mesh_index, "translation": offset.tolist(), "scale": [scale] * 3}
+            del node["mesh"]
+            node.setdefault("children", []).append(len(nodes))
+            nodes.append(child)
+        used = out.setdefault("extensionsUsed", [])
+        required = out.setdefault("extensionsRequired", [])
+        for extensions in (used, required):
+            if "KHR_mesh_quantization" not in extensions:
+                extensions.append("KHR_mesh_quantization")
+
+    texture_edge = 0
+    for image in out.get("images", []):
+        if "bufferView" not in image:
+            continue
+        encoded, mime_type = _recompress_texture(_read_view(gltf, binary, image["bufferView"]), max_texture)
+        texture_edge = max(texture_edge, max(Image.open(io.BytesIO(encoded)).size))
+        image["bufferView"] = builder.add_view(encoded)
+        image["mimeType"] = mime_type
+
+    out["bufferViews"] = builder.views
+    out["accessors"] = builder.accessors
+    packed = builder.binary()
+    out["buffers"] = [{"byteLength": len(packed) + (-len(packed) % 4)}]
+    glb = write_glb(out, packed)
+    return glb, {
+        "ratio": ratio,
+        "vertices": vertices,
+        "triangles": triangles_total,
+        "texture_size": texture_edge or None,
+        "bytes": len(glb),
+        "processing_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def build_lods(data: bytes, levels: List[Tuple[float, int]]) -> List[Tuple[bytes, Dict[str, Any]]]:
+    """Build every `(vertex ratio, max texture edge)` level, in the given order"""
+    return [build_lod(data, ratio, max_texture) for ratio, max_texture in levels]
+
+
+def parse_lod_levels(spec: str) -> List[Tuple[float, int]]:
+    """Parse "0.1:256,0.3:512,1.0:1024" into [(ratio, max texture edge), ...]"""
+    levels = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        ratio, _, texture = part.partition(":")
+        levels.append((float(ratio), int(texture or 1024)))
+    return levels
@@ -0,0 +1,271 @@
+"""Async client for the Gradio queue API (`queue/join` + `queue/data` SSE).
+
+Replaces the thread-blocking `gradio_client.Client`: predictions are awaited
+on the event loop, files are uploaded straight from memory (`GradioFile`)
+and output files are downloaded into memory, and every request goes through
+one pooled keep-alive `httpx.AsyncClient` per Space.
+"""
+import asyncio
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+SUPPORTED_PROTOCOLS = {"sse_v2", "sse_v2.1", "sse_v3"}
+# Deadline (seconds) for one queued prediction, from queue/join to completion
+GRADIO_JOB_TIMEOUT = float(os.getenv("GRADIO_JOB_TIMEOUT", "900"))
+
+
+class GradioAppError(Exception):
+    """The upstream Gradio app failed the prediction"""
+
+
+class GradioQueueFull(GradioAppError):
+    """The upstream queue rejected the job (HTTP 503)"""
+
+
+class GradioJobTimeout(GradioAppError):
+    """The job did not complete within the client's `job_timeout`"""
+
+
+class GradioPredictionError(GradioAppError):
+    """The app ran the job and raised (usually a problem with the inputs)"""
+
+
+@dataclass
+class GradioFile:
+    """In-memory file input; uploaded to the Space before the prediction"""
+    data: bytes
+    filename: str = "file"
+
+
+@dataclass
+class GradioStatus:
+    """Queue/progress update for a running prediction"""
+    stage: str
+    rank: Optional[int] = None
+    queue_size: Optional[int] = None
+    eta: Optional[float] = None
+    progress: Optional[float] = None
+
+
+def space_url(src: str) -> str:
+    """Turn a Hugging Face Space id ("owner/name") into its URL; URLs pass through"""
+    if src.startswith(("http://", "https://")):
+        return src if src.endswith("/") else src + "/"
+    subdomain = re.sub(r"[^a-z0-9]+", "-", src.lower())
+    return f"https://{subdomain}.hf.space/"
+
+
+def _is_file_data(value: Any) -> bool:
+    return isinstance(value, dict) and (
+        value.get("meta", {}).get("_type") == "gradio.FileData" or ("path" in value and "url" in value)
+    )
+
+
+class AsyncGradioClient:
+    def __init__(self, src: str, hf_token: Optional[str] = None, timeout: float = 100,
+                 max_connections: int = 20, job_timeout: float = GRADIO_JOB_TIMEOUT):
+        self.src = space_url(src)
+        self.timeout = timeout
+        self.job_timeout = job_timeout
+        headers = {"Authorization": f"Bearer {hf_token}"} if hf_token else {}
+        self.http = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True,
+        )
+        self.root: Optional[str] = None
+        self.config: Optional[Dict[str, Any]] = None
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        """Fetch the Space config and API info (once)"""
+        async with self._connect_lock:
+            if self.config is not None:
+                return
+            resp = await self.http.get(self.src + "config")
+            resp.raise_for_status()
+            config = resp.json()
+            protocol = config.get("protocol", "ws")
+            if protocol not in SUPPORTED_PROTOCOLS:
+                raise GradioAppError(f"{self.src} uses unsupported Gradio protocol {protocol!r}")
+            # Gradio 5+ serves the API under "/gradio_api"
+            prefix = config.get("api_prefix", "").strip("/")
+            self.root = self.src + (prefix + "/" if prefix else "")
+
+            resp = await self.http.get(self.root + "info", params={"serialize": "False"})
+            resp.raise_for_status()
+            named = resp.json().get("named_endpoints", {})
+
+            components = {c["id"]: c for c in config.get("components", [])}
+            for fn_index, dependency in enumerate(config["dependencies"]):
+                api_name = dependency.get("api_name")
+                if not isinstance(api_name, str):
+                    continue
+                api_name = "/" + api_name
+                self._endpoints[api_name] = {
+                    "fn_index": dependency.get("id", fn_index),
+                    "parameters": named.get(api_name, {}).get("parameters"),
+                    "state_inputs": [
+                        i for i, cid in enumerate(dependency["inputs"])
+                        if components.get(cid, {}).get("type") == "state"
+                    ],
+                }
+            self.config = config
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def _build_args(self, endpoint: Dict[str, Any], args: tuple, kwargs: Dict[str, Any]) -> List[Any]:
+        """Order keyword arguments by the endpoint's parameters, filling defaults"""
+        parameters = endpoint["parameters"]
+        data = list(args)
+        if parameters is not None:
+            missing = object()
+            data += [missing] * (len(parameters) - len(data))
+            names = {}
+            for index, param in enumerate(parameters):
+                if "parameter_name" in param:
+                    names[param["parameter_name"]] = index
+                if data[index] is missing and param.get("parameter_has_default"):
+                    data[index] = param.get("parameter_default")
+            for key, value in kwargs.items():
+                if key not in names:
+                    raise TypeError(f"Unknown parameter {key!r}")
+                data[names[key]] = value
+            unset = [p.get("parameter_name", str(i)) for i, p in enumerate(parameters) if data[i] is missing]
+            if unset:
+                raise TypeError(f"Missing parameters: {', '.join(unset)}")
+        elif kwargs:
+            raise TypeError("This endpoint does not accept keyword arguments")
+        for index in endpoint["state_inputs"]:
+            data.insert(index, None)
+        return data
+
+    async def upload(self, file: GradioFile) -> Dict[str, Any]:
+        """Upload in-memory bytes; returns the FileData payload for the input"""
+        resp = await self.http.post(self.root + "upload", files=[("files", (file.filename, file.data))])
+        resp.raise_for_status()
+        return {
+            "path": resp.json()[0],
+            "orig_name": file.filename,
+            "meta": {"_type": "gradio.FileData"},
+        }
+
+    async def _upload_inputs(self, value: Any) -> Any:
+        if isinstance(value, GradioFile):
+            return await self.upload(value)
+        if isinstance(value, list):
+            return list(await asyncio.gather(*(self._upload_inputs(v) for v in value)))
+        if isinstance(value, dict):
+            keys = list(value)
+            values = await asyncio.gather(*(self._upload_inputs(value[k]) for k in keys))
+            return dict(zip(keys, values))
+        return value
+
+    async def download(self, file_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch an output file into memory; adds `name` and `data` to the FileData"""
+        url = file_data.get("url") or self.root + "file=" + file_data["path"]
+        if not url.startswith(("http://", "https://")):
+            url = self.root + url.lstrip("/")
+        resp = await self.http.get(url)
+        resp.raise_for_status()
+        name = os.path.basename(file_data.get("orig_name") or file_data.get("path") or "output")
+        return {**file_data, "name": name, "data": resp.content}
+
+    async def _download_outputs(self, value: Any) -> Any:
+        if _is_file_data(value):
+            return await self.download(value)
+        if isinstance(value, list):
+            return list(await asyncio.gather(*(self._download_outputs(v) for v in value)))
+        if isinstance(value, dict):
+            keys = list(value)
+            values = await asyncio.gather(*(self._download_outputs(value[k]) for k in keys))
+            return dict(zip(keys, values))
+        return value
+
+    async def predict(self, *args, api_name: str, session_hash: Optional[str] = None,
+                      on_status: Optional[Callable[[GradioStatus], None]] = None,
+                      download_files: bool = True, **kwargs) -> Any:
+        """Run `api_name` through the Space queue and return its output.
+
+        `GradioFile` inputs are uploaded first; output files are downloaded
+        into memory unless `download_files` is False.  Calls that share
+        `session_hash` share server-side session state.  A single output is
+        returned as-is, several as a tuple.
+        """
+        await self.connect()
+        endpoint = self._endpoints.get(api_name)
+        if endpoint is None:
+            raise GradioAppError(f"{self.src} has no endpoint {api_name}")
+        data = await self._upload_inputs(self._build_args(endpoint, args, kwargs))
+        session_hash = session_hash or uuid.uuid4().hex
+
+        resp = await self.http.post(self.root + "queue/join", json={
+            "data": data,
+            "fn_index": endpoint["fn_index"],
+            "session_hash": session_hash,
+            "event_data": None,
+            "trigger_id": None,
+        })
+        if resp.status_code == 503:
+            raise GradioQueueFull(f"{self.src} queue is full")
+        resp.raise_for_status()
+        event_id = resp.json()["event_id"]
+
+        try:
+            output = await asyncio.wait_for(self._await_event(session_hash, event_id, on_status), self.job_timeout)
+        except asyncio.TimeoutError:
+            raise GradioJobTimeout(f"{self.src} job did not finish within {self.job_timeout:.0f}s")
+        if download_files:
+            output = await self._download_outputs(output)
+        return output[0] if len(output) == 1 else tuple(output)
+
+    async def _await_event(self, session_hash: str, event_id: str,
+                           on_status: Optional[Callable[[GradioStatus], None]]) -> List[Any]:
+        # no read timeout on the event stream only: it stays open for the whole
+        # job, and the overall deadline is enforced by `predict`
+        async with self.http.stream("GET", self.root + "queue/data", params={"session_hash": session_hash},
+                                    timeout=httpx.Timeout(self.timeout, read=None)) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                msg = json.loads(line[5:])
+                kind = msg.get("msg")
+                if kind == "heartbeat":
+                    continue
+                if kind == "unexpected_error" or msg.get("message") == "server_stopped":
+                    raise GradioAppError(msg.get("message") or "Gradio server error")
+                if kind == "close_stream":
+                    break
+                if msg.get("event_id") != event_id:
+                    continue
+                if kind == "process_completed":
+                    result = msg.get("output") or {}
+                    if not msg.get("success", True) or "error" in result:
+                        raise GradioPredictionError(result.get("error") or "The upstream Gradio app raised an exception")
+                    return result.get("data", [])
+                if on_status is not None and kind in ("estimation", "process_starts", "progress"):
+                    progress = None
+                    units = msg.get("progress_data") or []
+                    if units:
+                        unit = units[0]
+                        progress = unit.get("progress")
+                        if progress is None and unit.get("index") is not None and unit.get("length"):
+                            progress = unit["index"] / unit["length"]
+                    on_status(GradioStatus(
+                        stage=kind,
+                        rank=msg.get("rank"),
+                        queue_size=msg.get("queue_size"),
+                        eta=msg.get("rank_eta") or msg.get("eta"),
+                        progress=progress,
+                    ))
+        raise GradioAppError(f"{self.src} closed the event stream before the job completed")
@@ -0,0 +1,192 @@
+"""Pool of Gradio backends serving the same Space API.
+
+Each backend is one `AsyncGradioClient` (pooled keep-alive connections) that
+runs at most `max_in_flight` predictions at once.  Requests go to the healthy
+backend with the lowest expected wait, `(in_flight + 1) * latency_ewma`; a busy or
+unreachable backend is put on a short back-off and the call fails over to the
+next one.  Errors another backend would repeat (the app rejecting the inputs,
+a job timeout) are raised straight away, and one deadline covers every
+attempt.  A background task probes every backend's `/config` so dead
+instances are skipped before a request ever reaches them.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from utils.gradio_async import (
+    AsyncGradioClient, GradioStatus, GradioAppError, GradioJobTimeout, GradioPredictionError, GRADIO_JOB_TIMEOUT
+)
+
+# weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+MAX_BACKOFF_SECONDS = 60
+# app errors that mean "this instance is busy", not "these inputs are bad"
+_BUSY_ERROR = re.compile(r"quota|busy|too many|capacity|overloaded|try again", re.IGNORECASE)
+
+
+class GradioBackendsUnavailable(RuntimeError):
+    """Raised when every backend failed (or none is configured)"""
+
+
+def _should_fail_over(error: Exception) -> bool:
+    """Whether another backend might succeed where this one raised `error`"""
+    if isinstance(error, GradioJobTimeout):
+        return False
+    if isinstance(error, GradioPredictionError):
+        return bool(_BUSY_ERROR.search(str(error)))
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    # queue full, server errors/restarts, connection and transport failures
+    return isinstance(error, (GradioAppError, httpx.TransportError))
+
+
+class GradioBackend:
+    def __init__(self, url: str, max_in_flight: int = 2, client_kwargs: Optional[Dict[str, Any]] = None):
+        self.client = AsyncGradioClient(url, **(client_kwargs or {}))
+        self.url = self.client.src
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.healthy = True
+        self.failures = 0
+        self.backoff_until = 0.0
+        self.completed = 0
+        self.errors = 0
+
+    def available(self) -> bool:
+        return self.healthy and time.monotonic() >= self.backoff_until
+
+    def score(self, default_latency: float) -> float:
+        """Expected wait for one more request; lower is better"""
+        return (self.in_flight + 1) * (self.latency_ewma or default_latency)
+
+    def _record_failure(self):
+        self.errors += 1
+        self.failures += 1
+        self.backoff_until = time.monotonic() + min(2 ** self.failures, MAX_BACKOFF_SECONDS)
+
+    async def predict(self, *args, **kwargs) -> Any:
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                result = await self.client.predict(*args, **kwargs)
+        except Exception as e:
+            # a rejected input says nothing about the backend's health
+            if _should_fail_over(e) or isinstance(e, GradioJobTimeout):
+                self._record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+        elapsed = time.perf_counter() - start
+        self.latency_ewma = elapsed if self.latency_ewma is None else (
+            LATENCY_EWMA_ALPHA * elapsed + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+        )
+        self.failures = 0
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "backing_off": time.monotonic() < self.backoff_until,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency_ewma_s": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            "completed": self.completed,
+            "errors": self.errors,
+        }
+
+
+class GradioPool:
+    def __init__(self, name: str, urls: List[str], max_in_flight: int = 2,
+                 health_interval: float = 30, default_latency: float = 30,
+                 client_kwargs: Optional[Dict[str, Any]] = None, deadline: float = GRADIO_JOB_TIMEOUT):
+        self.name = name
+        self.backends = [GradioBackend(u, max_in_flight, client_kwargs) for u in urls if u]
+        self.health_interval = health_interval
+        self.default_latency = default_latency
+        self.deadline = deadline
+        self._health_task: Optional[asyncio.Task] = None
+        self.failovers = 0
+
+    async def start(self):
+        """Run an initial probe and start the periodic health checks"""
+        if self._health_task or not self.backends:
+            return
+        await self.check_health()
+        self._health_task = asyncio.create_task(self._health_loop())
+        print(f"[{self.name}-pool] {len(self.backends)} backend(s), "
+              f"{sum(b.healthy for b in self.backends)} healthy")
+
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*(b.client.aclose() for b in self.backends), return_exceptions=True)
+
+    async def check_health(self):
+        await asyncio.gather(*(self._probe(b) for b in self.backends))
+
+    async def _probe(self, backend: GradioBackend):
+        try:
+            resp = await backend.client.http.get(backend.url + "config", timeout=10)
+            healthy = resp.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != backend.healthy:
+            print(f"[{self.name}-pool] {backend.url} is now {'healthy' if healthy else 'unhealthy'}")
+        backend.healthy = healthy
+        if healthy:
+            backend.backoff_until = 0.0
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"[{self.name}-pool] health check failed: {e}")
+
+    def _ranked(self) -> List[GradioBackend]:
+        ranked = sorted(self.backends, key=lambda b: b.score(self.default_latency))
+        available = [b for b in ranked if b.available()]
+        # with nothing available still try everything rather than fail outright
+        return available or ranked
+
+    async def predict(self, *args, on_status: Optional[Callable[[GradioStatus], None]] = None, **kwargs) -> Any:
+        """Run a prediction on the least-loaded backend, failing over on busy or unreachable ones.
+
+        `on_status` is called with upstream `GradioStatus` updates (queue
+        rank, ETA, progress) while the job runs.  All attempts together are
+        bounded by `deadline`; running past it raises `GradioJobTimeout`.
+        """
+        if not self.backends:
+            raise GradioBackendsUnavailable(f"No {self.name} backends configured")
+        last_error: Optional[Exception] = None
+        try:
+            async with asyncio.timeout(self.deadline):
+                for attempt, backend in enumerate(self._ranked()):
+                    if attempt:
+                        self.failovers += 1
+                    try:
+                        return await backend.predict(*args, on_status=on_status, **kwargs)
+                    except Exception as e:
+                        print(f"[{self.name}-pool] {backend.url} failed: {e}")
+                        if not _should_fail_over(e):
+                            raise
+                        last_error = e
+        except TimeoutError:
+            raise GradioJobTimeout(f"{self.name} prediction did not finish within {self.deadline:.0f}s")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self.failovers,
+            "backends": [b.stats() for b in self.backends],
+        }
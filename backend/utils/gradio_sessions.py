@@ -0,0 +1,99 @@
+"""Checkout/return pool of isolated sessions on one stateful Gradio Space.
+
+Some Spaces keep per-session state between calls (TRELLIS stores the
+generated model that `/extract_glb` reads), so two jobs must never
+interleave in one session.  The pool hands out at most `size` sessions at a
+time; every checkout gets a fresh session hash unless the caller resumes a
+known one, and a resumed hash is held by one caller at a time.  Callers
+beyond `size` wait, up to `checkout_timeout`, then get
+`GradioSessionPoolExhausted`.
+"""
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from utils.gradio_async import AsyncGradioClient, GradioFile
+
+
+class GradioSessionPoolExhausted(RuntimeError):
+    """No session became free within the checkout timeout"""
+
+
+class GradioSession:
+    """One checked-out session; every call carries its session hash"""
+
+    def __init__(self, client: AsyncGradioClient, session_hash: str):
+        self.client = client
+        self.session_hash = session_hash
+
+    async def predict(self, *args, **kwargs) -> Any:
+        return await self.client.predict(*args, session_hash=self.session_hash, **kwargs)
+
+    async def upload(self, file: GradioFile) -> Dict[str, Any]:
+        return await self.client.upload(file)
+
+
+class GradioSessionPool:
+    def __init__(self, client: AsyncGradioClient, size: int = 2, checkout_timeout: Optional[float] = None):
+        self.client = client
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self._slots = asyncio.Semaphore(size)
+        self._in_use: Set[str] = set()
+        self._released = asyncio.Condition()
+        self.waiting = 0
+        self._counters = {"checkouts": 0, "resumed": 0, "timeouts": 0}
+        self._wait_total = 0.0
+
+    @asynccontextmanager
+    async def session(self, session_hash: Optional[str] = None) -> AsyncIterator[GradioSession]:
+        """Check out a new session, or resume `session_hash`; returned on exit"""
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._checkout(session_hash), self.checkout_timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise GradioSessionPoolExhausted(
+                f"no {self.client.src} session free after {self.checkout_timeout}s"
+            )
+        finally:
+            self.waiting -= 1
+        self._wait_total += time.perf_counter() - start
+        self._counters["checkouts"] += 1
+        if session_hash:
+            self._counters["resumed"] += 1
+        else:
+            session_hash = uuid.uuid4().hex
+            self._in_use.add(session_hash)
+        try:
+            yield GradioSession(self.client, session_hash)
+        finally:
+            async with self._released:
+                self._in_use.discard(session_hash)
+                self._released.notify_all()
+            self._slots.release()
+
+    async def _checkout(self, session_hash: Optional[str]):
+        await self._slots.acquire()
+        if not session_hash:
+            return
+        try:
+            async with self._released:
+                await self._released.wait_for(lambda: session_hash not in self._in_use)
+                self._in_use.add(session_hash)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        checkouts = self._counters["checkouts"]
+        return {
+            "size": self.size,
+            "checked_out": len(self._in_use),
+            "waiting": self.waiting,
+            **self._counters,
+            "avg_wait_ms": round(self._wait_total / checkouts * 1000, 1) if checkouts else None,
+        }
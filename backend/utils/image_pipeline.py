@@ -0,0 +1,190 @@
+"""CPU image normalisation run on a process pool.
+
+Phone uploads (HEIC/PNG/JPEG, up to 10 MB) are much larger than anything the
+downstream consumers need: the try-on model, Roboflow and TRELLIS all work at
+roughly 1024 px.  Every upload is therefore decoded once, rotated according to
+its EXIF orientation, stripped of metadata, downscaled to the consumer's
+maximum edge and re-encoded before it is stored or forwarded.
+
+Decoding and resizing are CPU bound, so the work runs in a
+``ProcessPoolExecutor`` and never blocks the event loop.
+"""
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# HEIC/HEIF support is optional; without the plugin such images are passed
+# through untouched.
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pillow_heif = None
+
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Per-consumer output profiles: maximum edge in pixels, encoder and quality.
+IMAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Gradio virtual try-on model (person + garment)
+    "tryon": {"max_edge": 1024, "format": "JPEG", "quality": 90},
+    # Roboflow clothing classifier
+    "classify": {"max_edge": 640, "format": "JPEG", "quality": 85},
+    # Images kept in Cloudinary for display in the UI
+    "storage": {"max_edge": 2048, "format": "WEBP", "quality": 85},
+    # Pollinations reference image
+    "avatar_reference": {"max_edge": 1024, "format": "JPEG", "quality": 90},
+    # TRELLIS image-to-3D input
+    "trellis": {"max_edge": 1024, "format": "JPEG", "quality": 95},
+}
+
+_FORMAT_INFO = {
+    "JPEG": ("image/jpeg", ".jpg"),
+    "WEBP": ("image/webp", ".webp"),
+    "PNG": ("image/png", ".png"),
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Aggregated counters reported through /metrics
+_stats: Dict[str, Any] = {
+    "images": 0,
+    "skipped": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "stage_ms": {"decode": 0.0, "orient": 0.0, "resize": 0.0, "encode": 0.0, "total": 0.0},
+}
+
+
+def _normalize(data: bytes, max_edge: int, fmt: str, quality: int) -> Tuple[bytes, Dict[str, Any]]:
+    """Decode, orient, strip, downscale and re-encode an image (runs in a worker process)."""
+    timings = {}
+
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    timings["decode"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    img = ImageOps.exif_transpose(img)
+    timings["orient"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    original_size = img.size
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    timings["resize"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if fmt == "JPEG" and img.mode != "RGB":
+        # JPEG has no alpha channel; flatten transparent images onto white
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+    out = io.BytesIO()
+    # no exif/icc arguments are passed, so metadata is dropped on re-encode
+    save_kwargs = {"quality": quality}
+    if fmt == "JPEG":
+        save_kwargs["optimize"] = True
+    img.save(out, format=fmt, **save_kwargs)
+    timings["encode"] = (time.perf_counter() - start) * 1000
+
+    return out.getvalue(), {
+        "original_size": original_size,
+        "size": img.size,
+        "timings_ms": timings,
+    }
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_PIPELINE_WORKERS)
+    return _executor
+
+
+async def normalize_image(data: bytes, profile: str) -> Tuple[bytes, Dict[str, Any]]:
+    """Normalise `data` for the given consumer profile.
+
+    Returns ``(bytes, info)`` where `info` holds the output content type,
+    file extension, byte counts and per-stage timings.  Images that cannot be
+    decoded (e.g. HEIC without ``pillow-heif``) are returned unchanged with
+    ``info["skipped"]`` set, so callers can always use the returned bytes.
+    """
+    settings = IMAGE_PROFILES[profile]
+    fmt = settings["format"]
+    content_type, extension = _FORMAT_INFO[fmt]
+
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        out, details = await loop.run_in_executor(
+            _get_executor(), _normalize, data, settings["max_edge"], fmt, settings["quality"]
+        )
+    except Exception as e:
+        print(f"[image-pipeline] profile={profile} skipped: {e}")
+        _stats["skipped"] += 1
+        return data, {"profile": profile, "skipped": str(e), "bytes_in": len(data), "bytes_out": len(data)}
+    total_ms = (time.perf_counter() - start) * 1000
+
+    timings = details["timings_ms"]
+    timings["total"] = total_ms
+    _stats["images"] += 1
+    _stats["bytes_in"] += len(data)
+    _stats["bytes_out"] += len(out)
+    for stage, ms in timings.items():
+        _stats["stage_ms"][stage] += ms
+
+    info = {
+        "profile": profile,
+        "content_type": content_type,
+        "extension": extension,
+        "width": details["size"][0],
+        "height": details["size"][1],
+        "bytes_in": len(data),
+        "bytes_out": len(out),
+        "bytes_saved": len(data) - len(out),
+        "timings_ms": {k: round(v, 1) for k, v in timings.items()},
+    }
+    print(
+        f"[image-pipeline] profile={profile} {details['original_size']} -> {details['size']} "
+        f"{len(data)} -> {len(out)} bytes "
+        + " ".join(f"{k}={v:.1f}ms" for k, v in timings.items())
+    )
+    return out, info
+
+
+async def run_in_pipeline(fn: Callable[..., Any], *args) -> Any:
+    """Run another CPU-bound function (e.g. GLB post-processing) on the worker processes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), fn, *args)
+
+
+def get_pipeline_stats() -> Dict[str, Any]:
+    """Return aggregated byte savings and per-stage timings since startup."""
+    images = _stats["images"]
+    return {
+        "images": images,
+        "skipped": _stats["skipped"],
+        "bytes_in": _stats["bytes_in"],
+        "bytes_out": _stats["bytes_out"],
+        "bytes_saved": _stats["bytes_in"] - _stats["bytes_out"],
+        "stage_ms_total": {k: round(v, 1) for k, v in _stats["stage_ms"].items()},
+        "stage_ms_avg": {k: round(v / images, 1) if images else 0.0 for k, v in _stats["stage_ms"].items()},
+    }
+
+
+def shutdown_image_pipeline():
+    """Stop the worker processes (called from the app lifespan)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
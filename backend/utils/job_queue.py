@@ -0,0 +1,137 @@
+"""Bounded asyncio worker pool for long-running upstream jobs.
+
+Handlers enqueue a coroutine factory and return immediately; a fixed number
+of worker tasks drain the queue, so at most `workers` jobs talk to the
+upstream service at once and a full queue is reported to the caller instead
+of piling up requests.  Jobs carry a priority (lower runs first), so
+background work never delays interactive jobs that are waiting.
+"""
+import asyncio
+import itertools
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class JobQueueFull(Exception):
+    """Raised by `JobQueue.submit` when no more jobs can be queued"""
+
+
+class JobQueue:
+    def __init__(self, name: str, workers: int = 2, max_queued: int = 100):
+        self.name = name
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._busy_seconds = 0.0
+        # job id -> (priority, seq) for jobs waiting for a worker
+        self._pending: Dict[str, tuple] = {}
+        # job id -> callback for waiting jobs that asked to hear about a drop
+        self._on_drop: Dict[str, Callable[[], None]] = {}
+        self._seq = itertools.count()
+
+    async def start(self):
+        """Start the worker tasks (called from the app lifespan)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"[{self.name}-queue] started {self.workers} workers")
+
+    async def stop(self):
+        """Cancel the workers; jobs still queued are dropped (and told so)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        dropped, self._on_drop = self._on_drop, {}
+        self._pending.clear()
+        for job_id, on_drop in dropped.items():
+            try:
+                on_drop()
+            except Exception as e:
+                print(f"[{self.name}-queue] drop callback for {job_id} failed: {e}")
+
+    def submit(self, job_id: str, job: Callable[[], Awaitable[Any]], priority: int = PRIORITY_INTERACTIVE,
+               on_drop: Optional[Callable[[], None]] = None):
+        """Queue `job` (a zero-argument coroutine factory) for execution.
+
+        `on_drop` is called if the queue stops before the job has started,
+        so callers waiting on the job are not left hanging.
+        """
+        if self._queue is None:
+            raise RuntimeError(f"{self.name} queue is not running")
+        order = (priority, next(self._seq))
+        try:
+            self._queue.put_nowait((*order, job_id, job))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self.name} queue is full ({self.max_queued} jobs waiting)")
+        self._pending[job_id] = order
+        if on_drop is not None:
+            self._on_drop[job_id] = on_drop
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job, or None once it has started"""
+        order = self._pending.get(job_id)
+        if order is None:
+            return None
+        return 1 + sum(1 for other in self._pending.values() if other < order)
+
+    def idle(self) -> bool:
+        """True when nothing is waiting and at least one worker is free"""
+        return self._queue is not None and self._queue.empty() and self._running < self.workers
+
+    def average_seconds(self) -> Optional[float]:
+        finished = self._completed + self._failed
+        return self._busy_seconds / finished if finished else None
+
+    def eta(self, job_id: str) -> Optional[float]:
+        """Rough seconds until `job_id` finishes, from the average job duration"""
+        average = self.average_seconds()
+        if average is None:
+            return None
+        position = self.position(job_id)
+        if position is None:
+            return average
+        return ((position - 1) // self.workers + 1) * average
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job_id, job = await self._queue.get()
+            self._pending.pop(job_id, None)
+            self._on_drop.pop(job_id, None)
+            self._running += 1
+            start = time.perf_counter()
+            try:
+                await job()
+                self._completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # jobs record their own failure state; this is a last-resort log
+                self._failed += 1
+                print(f"[{self.name}-queue] job {job_id} failed: {e}")
+                traceback.print_exc()
+            finally:
+                self._running -= 1
+                self._busy_seconds += time.perf_counter() - start
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "busy_seconds": round(self._busy_seconds, 1),
+            "average_seconds": round(self.average_seconds(), 1) if self.average_seconds() is not None else None,
+        }
@@ -0,0 +1,77 @@
+"""Incremental parser for the top-level fields of a JSON object arriving in pieces.
+
+LLMs stream their JSON answer token by token (often wrapped in prose or a
+```json fence).  `JsonFieldStream.feed` takes the next piece of text and
+returns the `(key, value)` pairs of the first top-level object that became
+complete with it, so each field can be shown before the rest is generated.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class JsonFieldStream:
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0          # 0 until the opening brace of the top-level object
+        self._in_string = False
+        self._escaped = False
+        self._key: Optional[str] = None
+        self._token_start: Optional[int] = None   # start of the current key or value
+        self._expect_key = True
+
+    def feed(self, piece: str) -> List[Tuple[str, Any]]:
+        """Add `piece`; returns the fields completed by it, in order"""
+        self.text += piece
+        fields: List[Tuple[str, Any]] = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = self._loads(text[self._token_start:self._pos + 1])
+                        self._token_start = None
+            elif self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._token_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+            elif char == "]" or (char == "}" and self._depth > 1):
+                self._depth -= 1
+            elif self._depth == 1 and char == ":" and self._expect_key:
+                self._expect_key = False
+                self._token_start = self._pos + 1
+            elif self._depth == 1 and char in ",}":
+                if not self._expect_key and self._key is not None:
+                    value = self._loads(text[self._token_start:self._pos].strip())
+                    if value is not _INVALID:
+                        fields.append((self._key, value))
+                self._key = None
+                self._token_start = None
+                self._expect_key = True
+                if char == "}":
+                    self._depth = 0
+                    self.done = True
+            self._pos += 1
+        return fields
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _INVALID
+
+
+_INVALID = object()
@@ -0,0 +1,68 @@
+"""In-process publish/subscribe for job progress events.
+
+Workers `publish` small dicts (`{"stage": ..., ...}`) under a job id; any
+number of subscribers (SSE connections) receive them in order.  The latest
+event per job is kept for a while so a subscriber that connects late starts
+from the current state instead of waiting for the next transition.
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from utils.cache import LRUCache
+
+TERMINAL_STAGES = {"done", "failed"}
+
+
+class ProgressBroker:
+    def __init__(self, keep_seconds: float = 600, max_jobs: int = 4096):
+        self._last = LRUCache(maxsize=max_jobs, ttl=keep_seconds)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def publish(self, key: str, event: Dict[str, Any]):
+        event = {**event, "ts": round(time.time(), 3)}
+        self._last.set(key, event)
+        for queue in self._subscribers.get(key, ()):
+            queue.put_nowait(event)
+
+    def last(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._last.get(key)
+
+    async def subscribe(self, key: str, timeout: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events for `key` until a terminal stage.
+
+        With `timeout`, `None` is yielded whenever no event arrived for that
+        many seconds so the caller can send keep-alives or refresh state.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(key, set()).add(queue)
+        try:
+            last = self._last.get(key)
+            if last:
+                yield last
+                if last.get("stage") in TERMINAL_STAGES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.get("stage") in TERMINAL_STAGES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[key]
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """Format `event` as one Server-Sent Events message named after its stage"""
+    return f"event: {event.get('stage', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+SSE_KEEPALIVE = ": keep-alive\n\n"
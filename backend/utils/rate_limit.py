@@ -0,0 +1,45 @@
+"""Async token-bucket rate limiter for calls to rate-limited upstream APIs.
+
+`acquire` reserves a token and sleeps until it is due, so callers start in
+reservation order and at most `rate` calls start per `period` seconds once
+the initial `burst` has been spent.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class RateLimiter:
+    def __init__(self, rate: float, period: float = 60.0, burst: Optional[int] = None):
+        self.per_second = rate / period
+        self.burst = max(1, burst if burst is not None else int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token (possibly going into debt); returns the seconds until it is due"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.per_second)
+        self._updated = now
+        self._tokens -= 1
+        return -self._tokens / self.per_second if self._tokens < 0 else 0.0
+
+    async def acquire(self):
+        delay = self._reserve() if self.per_second > 0 else 0.0
+        self.acquired += 1
+        if delay > 0:
+            self.delayed += 1
+            self.wait_seconds += delay
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "per_minute": round(self.per_second * 60, 2),
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "wait_seconds": round(self.wait_seconds, 1),
+        }
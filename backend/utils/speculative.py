@@ -0,0 +1,111 @@
+"""Per-user speculative background work on a `JobQueue`.
+
+A scheduling run pulls job factories from an async generator (which decides
+what is worth doing, e.g. skips anything already cached) and submits them
+one at a time at background priority, only while the queue is idle.  Each
+user has a rolling budget of jobs, and a new run for the same user cancels
+the previous one.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, Optional
+
+from utils.job_queue import JobQueue, JobQueueFull, PRIORITY_BACKGROUND
+
+
+class _Run:
+    def __init__(self):
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class SpeculativeScheduler:
+    def __init__(self, name: str, queue: JobQueue, budget: int = 10,
+                 window_seconds: float = 3600, idle_poll_seconds: float = 1.0):
+        self.name = name
+        self.queue = queue
+        self.budget = budget
+        self.window_seconds = window_seconds
+        self.idle_poll_seconds = idle_poll_seconds
+        self._runs: Dict[str, _Run] = {}
+        self._spent: Dict[str, Deque[float]] = {}
+        self._counters = {"runs": 0, "submitted": 0, "completed": 0, "failed": 0,
+                          "cancelled": 0, "budget_exhausted": 0}
+
+    def remaining_budget(self, user: str) -> int:
+        spent = self._spent.setdefault(user, deque())
+        cutoff = time.monotonic() - self.window_seconds
+        while spent and spent[0] < cutoff:
+            spent.popleft()
+        return self.budget - len(spent)
+
+    def schedule(self, user: str, jobs: AsyncGenerator[Callable[[], Awaitable[Any]], None]):
+        """Start a run for `user`, replacing (cancelling) any run in progress"""
+        self.cancel(user)
+        run = _Run()
+        run.task = asyncio.create_task(self._run(user, run, jobs))
+        self._runs[user] = run
+        self._counters["runs"] += 1
+
+    def cancel(self, user: str) -> bool:
+        run = self._runs.pop(user, None)
+        if run is None:
+            return False
+        # a job already handed to the queue turns into a no-op
+        run.cancelled = True
+        run.task.cancel()
+        self._counters["cancelled"] += 1
+        return True
+
+    async def stop(self):
+        runs = list(self._runs.values())
+        for user in list(self._runs):
+            self.cancel(user)
+        await asyncio.gather(*(r.task for r in runs), return_exceptions=True)
+
+    async def _run(self, user: str, run: _Run, jobs: AsyncGenerator[Callable[[], Awaitable[Any]], None]):
+        loop = asyncio.get_running_loop()
+        try:
+            index = 0
+            while True:
+                if self.remaining_budget(user) <= 0:
+                    self._counters["budget_exhausted"] += 1
+                    break
+                try:
+                    job = await jobs.__anext__()
+                except StopAsyncIteration:
+                    break
+                # only use capacity interactive requests are not waiting for
+                while not self.queue.idle():
+                    await asyncio.sleep(self.idle_poll_seconds)
+
+                finished = loop.create_future()
+
+                async def wrapped(job=job, finished=finished):
+                    try:
+                        if not run.cancelled:
+                            await job()
+                            self._counters["completed"] += 1
+                    except Exception as e:
+                        self._counters["failed"] += 1
+                        print(f"[{self.name}] speculative job for {user} failed: {e}")
+                    finally:
+                        if not finished.done():
+                            finished.set_result(None)
+
+                try:
+                    self.queue.submit(f"{self.name}:{user}:{index}", wrapped, priority=PRIORITY_BACKGROUND)
+                except JobQueueFull:
+                    break
+                self._spent[user].append(time.monotonic())
+                self._counters["submitted"] += 1
+                index += 1
+                await finished
+        finally:
+            if self._runs.get(user) is run:
+                del self._runs[user]
+            await jobs.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "active_runs": len(self._runs)}
@@ -0,0 +1,85 @@
+"""Upload ingestion with size enforcement at ingress.
+
+Starlette parses (and spools to disk) the whole multipart body before a
+handler runs, so a per-file check inside the handler cannot stop an
+oversize upload from being received.  `UploadLimitMiddleware` enforces the
+request-level limit before that: a declared Content-Length over the limit is
+answered with 413 without reading the body, and streamed bodies are cut off
+as soon as the limit is crossed.  `read_upload` then checks each file against
+its own limit and reads it into a single buffer.
+"""
+import os
+from typing import Optional, Set
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+MAX_IMAGE_SIZE_MB = 10
+MAX_IMAGE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024
+# whole multipart request (several images, e.g. a try-on batch)
+UPLOAD_MAX_REQUEST_MB = int(os.getenv("UPLOAD_MAX_REQUEST_MB", "64"))
+
+ALLOWED_IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+
+class UploadLimitMiddleware:
+    """Reject multipart requests larger than `max_bytes` before they are parsed"""
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_MB * 1024 * 1024):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            return await self.app(scope, receive, send)
+
+        detail = f"Request body exceeds {self.max_bytes // (1024 * 1024)}MB upload limit"
+        try:
+            declared = int(headers.get(b"content-length", b"-1"))
+        except ValueError:
+            declared = -1
+        if declared > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail}, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # raised inside the body parser; FastAPI passes HTTPException through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(
+    upload: UploadFile,
+    field: str = "file",
+    max_bytes: int = MAX_IMAGE_BYTES,
+    allowed_types: Optional[Set[str]] = None,
+) -> bytes:
+    """Read `upload` into one buffer, failing fast on bad content type or size.
+
+    Raises HTTP 400 for a disallowed content type and HTTP 413 when the file
+    is larger than `max_bytes` (known from the parser for spooled parts,
+    otherwise found without reading past the limit).
+    """
+    if allowed_types is not None and upload.content_type not in allowed_types:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type for {field}: {upload.content_type}")
+
+    limit_detail = f"Image exceeds {max_bytes // (1024 * 1024)}MB size limit for {field}"
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=limit_detail)
+
+    data = await upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise HTTPException(status_code=413, detail=limit_detail)
+    return data
@@ -0,0 +1,115 @@
+"""Lazily created upstream clients.
+
+Routers register a factory (and optionally an async warm-up) per upstream
+instead of building clients at import time, so `import main` neither pays for
+heavy SDK imports nor waits on network handshakes.  The app lifespan warms
+every client in the background; `/metrics` reports how long each one took.
+Clients that hold connections can register an async `close`, called on
+shutdown.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class Upstream:
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 warm: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                 close: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        self.name = name
+        self.factory = factory
+        self.warm = warm
+        self.close = close
+        self.client: Any = None
+        self.init_ms: Optional[float] = None
+        self.warm_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._warm_lock: Optional[asyncio.Lock] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "created": self.client is not None,
+            "init_ms": self.init_ms,
+            "warmed": self.warm_ms is not None or (self.warm is None and self.client is not None),
+            "warm_ms": self.warm_ms,
+            "error": self.error,
+        }
+
+
+class UpstreamRegistry:
+    def __init__(self):
+        self._upstreams: Dict[str, Upstream] = {}
+        self.boot: Dict[str, Optional[float]] = {"import_ms": None, "startup_ms": None, "warm_ms": None}
+
+    def register(self, name: str, factory: Callable[[], Any],
+                 warm: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                 close: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """Register `factory` (called on first use), an optional async `warm(client)`
+        and an optional async `close(client)`"""
+        self._upstreams[name] = Upstream(name, factory, warm, close)
+
+    def get(self, name: str) -> Any:
+        """Return the client for `name`, creating it on first use"""
+        upstream = self._upstreams[name]
+        if upstream.client is None:
+            start = time.perf_counter()
+            try:
+                upstream.client = upstream.factory()
+            except Exception as e:
+                upstream.error = str(e)
+                raise
+            upstream.init_ms = round((time.perf_counter() - start) * 1000, 1)
+            upstream.error = None
+            print(f"[upstreams] {name} created in {upstream.init_ms} ms")
+        return upstream.client
+
+    async def ensure(self, name: str) -> Any:
+        """Create (in a thread, since SDK imports block) and warm the client once"""
+        upstream = self._upstreams[name]
+        if upstream._warm_lock is None:
+            upstream._warm_lock = asyncio.Lock()
+        async with upstream._warm_lock:
+            client = upstream.client
+            if client is None:
+                client = await asyncio.to_thread(self.get, name)
+            if upstream.warm is not None and upstream.warm_ms is None:
+                start = time.perf_counter()
+                try:
+                    await upstream.warm(client)
+                except Exception as e:
+                    upstream.error = str(e)
+                    raise
+                upstream.warm_ms = round((time.perf_counter() - start) * 1000, 1)
+                print(f"[upstreams] {name} warmed in {upstream.warm_ms} ms")
+            return client
+
+    async def warm_all(self):
+        """Warm every registered upstream concurrently; failures are only logged"""
+        start = time.perf_counter()
+        names = list(self._upstreams)
+        results = await asyncio.gather(*(self.ensure(n) for n in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"[upstreams] warming {name} failed: {result}")
+        self.boot["warm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def close_all(self):
+        """Close every created client that registered a `close`; failures are only logged"""
+        for name, upstream in self._upstreams.items():
+            if upstream.client is None or upstream.close is None:
+                continue
+            try:
+                await upstream.close(upstream.client)
+            except Exception as e:
+                print(f"[upstreams] closing {name} failed: {e}")
+            upstream.client = None
+            upstream.warm_ms = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "boot": self.boot,
+            "clients": {name: u.stats() for name, u in self._upstreams.items()},
+        }
+
+
+upstreams = UpstreamRegistry()
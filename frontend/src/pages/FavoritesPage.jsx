@@ -210,7 +210,7 @@ const FavoritesPage = ({ isDarkMode }) => {
                                 }}
                               >
                                 <img
-                                  src={item.image_url}
+                                  src={item.display_url || item.image_url}
                                   alt={item.name}
                                   style={{
                                     borderRadius: 14,
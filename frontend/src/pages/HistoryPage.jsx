@@ -26,7 +26,7 @@ const HistoryPage = ({ isDarkMode }) => {
         // Convert backend data to match the existing format
         const formattedSessions = data.map(session => ({
           id: session.id,
-          resultImage: session.result_image_url,
+          resultImage: session.display_urls?.result || session.result_image_url,
           text: session.result_text,
           timestamp: new Date(session.created_at).toLocaleString("en-IN"),
           completed_at: session.completed_at
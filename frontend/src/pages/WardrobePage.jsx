@@ -277,7 +277,8 @@ const WardrobePage = ({ isDarkMode }) => {
             setWardrobeFavorites((prev) => prev.filter((f) => f.id !== record.id));
           }
         } else {
-          const favObj = { ...item };
+          // store the original image URL, not the list rendition
+          const { display_url: _displayUrl, ...favObj } = item;
           const created = await favoritesService.create('wardrobe', favObj);
           setWardrobeFavorites((prev) => [created, ...prev]);
         }
@@ -326,7 +327,7 @@ const WardrobePage = ({ isDarkMode }) => {
           >
             <div style={{ width: '100%', height: 180, background: isDarkMode ? '#23272f' : '#f3f4f6', display: 'flex', alignItems: 'center', justifyContent: 'center', borderTopLeftRadius: 16, borderTopRightRadius: 16, overflow: 'hidden' }}>
               <img
-                src={item.image_url}
+                src={item.display_url || item.image_url}
                 alt={item.name}
                 style={{ maxHeight: 170, maxWidth: '80%', objectFit: 'contain', borderRadius: 10, boxShadow: isDarkMode ? '0 1px 8px #23272f' : '0 1px 8px #e5e7eb' }}
               />
@@ -83,11 +83,17 @@ export const authService = {
 
 // Avatar Services
 export const avatarService = {
-  generateAvatar: async (prompt, file) => {
+  // options.seed regenerates a previous result; options.referenceUrl reuses an uploaded photo
+  generateAvatar: async (prompt, file, options = {}) => {
     const formData = new FormData();
     formData.append('prompt', prompt);
     if (file) {
       formData.append('file', file);
+    } else if (options.referenceUrl) {
+      formData.append('reference_url', options.referenceUrl);
+    }
+    if (options.seed) {
+      formData.append('seed', options.seed);
     }
     const response = await api.post('/api/avatar', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
@@ -98,14 +104,41 @@ export const avatarService = {
 
 // 3D/Video Generation Services
 export const threeDService = {
-  // full pipeline: video + glb
-  generate: async (file, includeGlb = true) => {
+  // full pipeline: video + glb; queues a job and polls it until it finishes
+  generate: async (file, includeGlb = true, { intervalMs = 3000, timeoutMs = 900000 } = {}) => {
     const formData = new FormData();
     formData.append('file', file);
     const query = includeGlb ? '' : '?include_glb=false';
     const response = await api.post(`/generate-3d${query}`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
+    if (response.data.status === 'done') {
+      // every stage was cached
+      return response.data;
+    }
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+      const job = await threeDService.getJob(response.data.job_id);
+      if (job.status === 'done') {
+        return job;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || '3D generation failed');
+      }
+    }
+    throw new Error('3D generation timed out');
+  },
+
+  // job record: status, stage, video_preview, glb_url, timings_ms, cached_stages
+  getJob: async (jobId) => {
+    const response = await api.get(`/generate-3d/jobs/${jobId}`);
+    return response.data;
+  },
+
+  // LOD manifest: { original, levels: [{ level, url, bytes, triangles, texture_size }] }, coarse first
+  getLods: async (jobId) => {
+    const response = await api.get(`/generate-3d/jobs/${jobId}/lods`);
     return response.data;
   },
 
@@ -185,6 +218,65 @@ export const advisorService = {
     return response.data;
   },
 
+  // Same as analyzeOutfit over Server-Sent Events; onEvent receives every
+  // event (generating, field, done, failed) so each field can be shown as it arrives
+  analyzeOutfitStream: async (payload, onEvent = () => {}) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_BASE_URL}/api/outfit-advisor/analyze/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify(payload),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Outfit analysis failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const data = message
+          .split('\n')
+          .filter((line) => line.startsWith('data:'))
+          .map((line) => line.slice(5).trim())
+          .join('\n');
+        if (!data) continue; // keep-alive comment
+        const event = JSON.parse(data);
+        onEvent(event);
+        if (event.stage === 'done') {
+          const { stage, ...result } = event;
+          return result;
+        }
+        if (event.stage === 'failed') {
+          const { error } = event;
+          throw new Error(typeof error === 'string' ? error : 'Outfit analysis failed');
+        }
+      }
+    }
+    throw new Error('Outfit analysis stream ended unexpectedly');
+  },
+
+  // Evaluate many wardrobe items (all of them when itemIds is empty) as a background job
+  startWardrobeBatch: async (itemIds = []) => {
+    const response = await api.post('/api/outfit-advisor/batch', { item_ids: itemIds });
+    return response.data;
+  },
+
+  // Batch job state: status, completed/total and the per-item results so far
+  getWardrobeBatch: async (jobId) => {
+    const response = await api.get(`/api/outfit-advisor/batch/${jobId}`);
+    return response.data;
+  },
+
   // List saved analyses
   listResults: async (skip = 0, limit = 50) => {
     const response = await api.get('/api/outfit-advisor', { params: { skip, limit } });
@@ -203,24 +295,111 @@ export const advisorService = {
     return response.data;
   },
 
-  // Upload an outfit image specifically for Outfit Advisor
+  // Upload an outfit image specifically for Outfit Advisor (direct to storage)
   uploadImage: async (file) => {
+    const asset = await uploadService.directUpload(file, 'outfit_advisor');
+    return { image_url: asset.image_url };
+  },
+};
+
+// Direct uploads: the file goes straight to storage with signed parameters
+// issued by the API, then the finished upload is registered with the API.
+export const uploadService = {
+  directUpload: async (file, kind) => {
+    const signResp = await api.post('/api/uploads/sign', { kind, filename: file.name });
+    const { upload_url, api_key, timestamp, folder, public_id, allowed_formats, signature } = signResp.data;
+
     const form = new FormData();
     form.append('file', file);
-    const response = await api.post('/api/outfit-advisor/upload', form, { headers: { 'Content-Type': 'multipart/form-data' } });
+    form.append('api_key', api_key);
+    form.append('timestamp', timestamp);
+    form.append('folder', folder);
+    form.append('public_id', public_id);
+    form.append('allowed_formats', allowed_formats);
+    form.append('signature', signature);
+    const uploadResp = await axios.post(upload_url, form);
+
+    const { public_id: storedId, version, signature: resultSignature, format, bytes, width, height } = uploadResp.data;
+    const response = await api.post('/api/uploads/complete', {
+      public_id: storedId,
+      version,
+      signature: resultSignature,
+      format,
+      bytes,
+      width,
+      height,
+    });
     return response.data;
   },
 };
 // Try-On Services
 export const tryOnService = {
-  // Perform virtual try-on
-  tryOn: async (formData) => {
+  // Perform virtual try-on: queue the job, then poll the session until it finishes
+  tryOn: async (formData, { intervalMs = 2000, timeoutMs = 300000 } = {}) => {
     const response = await api.post('/api/try-on', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
-    return response.data;
+    const sessionId = response.data.session_id;
+    if (response.data.status === 'done') {
+      // deterministic cache hit: the result is already available
+      return response.data;
+    }
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+      const session = await tryOnService.getSession(sessionId);
+      if (session.status === 'done') {
+        return { image: session.result_image_url, text: session.text, session_id: sessionId };
+      }
+      if (session.status === 'failed') {
+        throw new Error(session.error || 'Virtual try-on failed');
+      }
+    }
+    throw new Error('Virtual try-on timed out');
+  },
+
+  // Perform virtual try-on over Server-Sent Events; onEvent receives every
+  // progress event (uploading, queued, generating, storing, done, failed)
+  streamTryOn: async (formData, onEvent = () => {}) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_BASE_URL}/api/try-on/stream`, {
+      method: 'POST',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      body: formData,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Virtual try-on failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const data = message
+          .split('\n')
+          .filter((line) => line.startsWith('data:'))
+          .map((line) => line.slice(5).trim())
+          .join('\n');
+        if (!data) continue; // keep-alive comment
+        const event = JSON.parse(data);
+        onEvent(event);
+        if (event.stage === 'done') {
+          return { image: event.image, text: event.text, session_id: event.session_id };
+        }
+        if (event.stage === 'failed') {
+          throw new Error(event.error || 'Virtual try-on failed');
+        }
+      }
+    }
+    throw new Error('Virtual try-on stream ended unexpectedly');
   },
 
   // Create try-on session
@@ -283,6 +462,38 @@ export const styleFeedService = {
     const response = await api.get('/api/stylefeed');
     return response.data;
   },
+
+  // Resolve many card images at once; onResult gets each
+  // { index, prompt, model, image_url | error } as soon as it is ready
+  generateImages: async (images, onResult = () => {}) => {
+    const response = await fetch(`${API_BASE_URL}/api/images/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ images }),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Image batch failed (${response.status})`);
+    }
+    const results = new Array(images.length);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let newline;
+      while ((newline = buffer.indexOf('\n')) !== -1) {
+        const line = buffer.slice(0, newline).trim();
+        buffer = buffer.slice(newline + 1);
+        if (!line) continue;
+        const result = JSON.parse(line);
+        results[result.index] = result;
+        onResult(result);
+      }
+    }
+    return results;
+  },
 };
 
 // Utility functions